@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import Column, String, DateTime, ForeignKey, Numeric
+from sqlalchemy import Column, String, DateTime, ForeignKey, Numeric, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 
@@ -23,6 +23,24 @@ class Account(Base):
     user = relationship("User", back_populates="accounts")
     categories = relationship("Category", back_populates="account", cascade="all, delete-orphan")
     expenses = relationship("Expense", back_populates="account", cascade="all, delete-orphan")
+    rollups = relationship("ExpenseRollup", back_populates="account", cascade="all, delete-orphan")
+    opening_balance = relationship("AccountOpeningBalance", uselist=False, cascade="all, delete-orphan")
+
+    __table_args__ = (
+        Index("ix_accounts_user_id_created_at", "user_id", "created_at"),
+    )
 
     def __repr__(self):
         return f"<Account(name={self.name}, balance={self.balance})>"
+
+
+class AccountOpeningBalance(Base):
+    """
+    Balance the account would have with no expenses. Reconciliation expects
+    balance == opening_balance - sum(expenses.amount).
+    """
+    __tablename__ = "account_opening_balances"
+
+    account_id = Column(String(36), ForeignKey("accounts.id", ondelete="CASCADE"), primary_key=True)
+    amount = Column(Numeric(precision=12, scale=2), nullable=False)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
@@ -1,15 +1,19 @@
 import logging
-from decimal import Decimal
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import asc
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from sqlalchemy import asc, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from .schema import AccountCreate, AccountResponse, AccountType, AccountUpdate, BalanceResponse
 from .models import Account
+from .utils import set_opening_balance
 from ..user.utils import get_current_user
-from ..user.models import User
+from ..user.schema import UserPrincipal
 from ..categories.utils import create_default_categories_for_account
-from core.db import get_db
+from ..notifications.utils import publish_balance_change
+from core.cache import bump_account_versions, bump_user_versions
+from core.db import get_async_db, get_read_db, get_versioned_read_db
+from core.responses import ORJSONResponse, response_columns, rows_to_dicts, sparse_fields, is_not_modified, \
+    not_modified, get_user_listing_validators
 
 router = APIRouter(prefix="/accounts", tags=["Account"])
 
@@ -18,56 +22,68 @@ logger = logging.getLogger(__name__)
 
 @router.post("/", status_code=status.HTTP_201_CREATED)
 async def add_account(account_data: AccountCreate,
-                      current_user: User = Depends(get_current_user),
-                      db: Session = Depends(get_db)) -> AccountResponse:
+                      current_user: UserPrincipal = Depends(get_current_user),
+                      db: AsyncSession = Depends(get_async_db)) -> AccountResponse:
     try:
         new_account = Account(
             user_id=current_user.id,
-            **account_data.model_dump()
+            **account_data.model_dump(exclude={"user_id"})
         )
 
         db.add(new_account)
-        db.flush()
+        await db.flush()
+        await set_opening_balance(db, new_account.id, new_account.balance)
 
         if new_account.account_type == AccountType.SPENDING:
-            create_default_categories_for_account(current_user.id, new_account.id, db)
+            await create_default_categories_for_account(current_user.id, new_account.id, db)
 
-        db.commit()
+        await db.commit()
+        await bump_user_versions(current_user.id, "accounts", "categories")
+        await db.refresh(new_account)
 
         logger.info(f"Account '{new_account.name}' added for user {current_user.username}")
         return AccountResponse.model_validate(new_account)
     except Exception as e:
-        db.rollback()
         logger.exception(f"Failed to add account for user {current_user.username}: {e}")
+        await db.rollback()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to add account")
 
 
 @router.get("/", status_code=status.HTTP_200_OK)
-async def get_accounts(current_user: User = Depends(get_current_user),
-                       db: Session = Depends(get_db)) -> list[AccountResponse]:
+async def get_accounts(request: Request,
+                       fields: tuple[str, ...] = Depends(sparse_fields(AccountResponse)),
+                       current_user: UserPrincipal = Depends(get_current_user),
+                       db: AsyncSession = Depends(get_versioned_read_db)) -> list[AccountResponse]:
+    # Read before the query, so the ETag can only be older than the rows it is sent with
+    validators = await get_user_listing_validators(current_user.id, "accounts", fields)
+    if is_not_modified(request, validators):
+        logger.info(f"Accounts not modified for user {current_user.username}")
+        return not_modified(validators)
+
     try:
-        accounts = db.query(Account).filter(Account.user_id == current_user.id).order_by(
-            asc(Account.created_at)).all()
+        result = await db.execute(select(*response_columns(Account, AccountResponse, fields)).filter(
+            Account.user_id == current_user.id).order_by(asc(Account.created_at)))
+        accounts = rows_to_dicts(result)
         if not accounts:
             logger.info(f"No accounts found for user {current_user.username}")
-            return []
-
-        logger.info(f"Retrieved {len(accounts)} accounts for user {current_user.username}")
-        return [AccountResponse.model_validate(account) for account in accounts]
+        else:
+            logger.info(f"Retrieved {len(accounts)} accounts for user {current_user.username}")
+        return ORJSONResponse(accounts, headers=validators)
     except Exception as e:
         logger.exception(f"Failed to retrieve accounts for user {current_user.username}: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to retrieve accounts")
 
 
 @router.get("/{account_id}", status_code=status.HTTP_200_OK)
-async def get_account(account_id: int,
-                      current_user: User = Depends(get_current_user),
-                      db: Session = Depends(get_db)) -> AccountResponse:
+async def get_account(account_id: str,
+                      current_user: UserPrincipal = Depends(get_current_user),
+                      db: AsyncSession = Depends(get_async_db)) -> AccountResponse:
     try:
-        account = db.query(Account).filter(
+        result = await db.execute(select(Account).filter(
             Account.id == account_id,
             Account.user_id == current_user.id
-        ).first()
+        ))
+        account = result.scalars().first()
 
         if not account:
             logger.warning(f"Account with ID {account_id} not found for user {current_user.username}")
@@ -75,6 +91,8 @@ async def get_account(account_id: int,
 
         logger.info(f"Retrieved account '{account.name}' for user {current_user.username}")
         return AccountResponse.model_validate(account)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception(f"Failed to retrieve account with ID {account_id} for user {current_user.username}: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to retrieve account")
@@ -83,63 +101,77 @@ async def get_account(account_id: int,
 @router.put("/{account_id}", status_code=status.HTTP_200_OK)
 async def update_account(account_id: str,
                          account_data: AccountUpdate,
-                         current_user: User = Depends(get_current_user),
-                         db: Session = Depends(get_db)) -> AccountResponse:
+                         current_user: UserPrincipal = Depends(get_current_user),
+                         db: AsyncSession = Depends(get_async_db)) -> AccountResponse:
     update_data = account_data.model_dump(exclude_unset=True)
 
     try:
-        account = db.query(Account).filter(
+        result = await db.execute(select(Account).filter(
             Account.id == account_id,
-            Account.user_id == current_user.id).first()
+            Account.user_id == current_user.id))
+        account = result.scalars().first()
 
         if not account:
             logger.warning(f"Account with ID {account_id} not found for user {current_user.username}")
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Account not found")
 
+        old_balance = account.balance
         for key, value in update_data.items():
             setattr(account, key, value)
 
-        db.commit()
+        if update_data.get("balance") is not None:
+            await set_opening_balance(db, account.id, update_data["balance"])
+
+        await db.commit()
+        await bump_account_versions(account.id)
+        await bump_user_versions(current_user.id, "accounts")
+        await db.refresh(account)
+        await publish_balance_change(current_user.id, account.id, account.balance, account.balance - old_balance,
+                                     "account.update")
 
         logger.info(f"Account '{account.name}' updated for user {current_user.username}")
         return AccountResponse.model_validate(account)
     except Exception as e:
-        db.rollback()
         logger.exception(f"Failed to update account with ID {account_id} for user {current_user.username}: {e}")
+        await db.rollback()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to update account")
 
 
 @router.delete("/{account_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_account(account_id: str, current_user: User = Depends(get_current_user),
-                         db: Session = Depends(get_db)):
+async def delete_account(account_id: str, current_user: UserPrincipal = Depends(get_current_user),
+                         db: AsyncSession = Depends(get_async_db)):
     try:
-        account = db.query(Account).filter(
+        result = await db.execute(select(Account).filter(
             Account.id == account_id,
-            Account.user_id == current_user.id).first()
+            Account.user_id == current_user.id))
+        account = result.scalars().first()
 
         if not account:
             logger.warning(f"Account with ID {account_id} not found for user {current_user.username}")
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Account not found")
 
-        db.delete(account)
-        db.commit()
+        await db.delete(account)
+        await db.commit()
+        await bump_account_versions(account.id)
+        await bump_user_versions(current_user.id, "accounts", "categories")
 
         logger.info(f"Account '{account.name}' deleted for user {current_user.username}")
     except Exception as e:
-        db.rollback()
         logger.exception(f"Failed to delete account with ID {account_id} for user {current_user.username}: {e}")
+        await db.rollback()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to delete account")
 
 
 @router.get("/{account_id}/balance", status_code=status.HTTP_200_OK)
 async def get_account_balance(account_id: str,
-                              current_user: User = Depends(get_current_user),
-                              db: Session = Depends(get_db)) -> Decimal:
+                              current_user: UserPrincipal = Depends(get_current_user),
+                              db: AsyncSession = Depends(get_read_db)) -> BalanceResponse:
     try:
-        account = db.query(Account).filter(
+        result = await db.execute(select(Account).filter(
             Account.id == account_id,
             Account.user_id == current_user.id
-        ).first()
+        ))
+        account = result.scalars().first()
 
         if not account:
             logger.warning(f"Account with ID {account_id} not found for user {current_user.username}")
@@ -33,7 +33,6 @@ class AccountUpdate(BaseModel):
 
 class AccountResponse(AccountBase):
     id: str
-    account_id: str
     created_at: datetime
     updated_at: datetime
 
@@ -0,0 +1,97 @@
+import logging
+from decimal import Decimal
+from typing import Optional
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .models import Account, AccountOpeningBalance
+from ..expenses.models import Expense
+from core.db import dialect_insert
+
+logger = logging.getLogger(__name__)
+
+CENT = Decimal("0.01")
+
+
+async def adjust_account_balance(db: AsyncSession, account_id: str, delta: Decimal,
+                                 user_id: Optional[str] = None) -> Optional[Decimal]:
+    """
+    Adds `delta` to the balance with a single UPDATE ... RETURNING, so concurrent writers never overwrite
+    each other. Returns the new balance, or None when no account (owned by `user_id`, if given) matched.
+    """
+    stmt = (update(Account)
+            .where(Account.id == account_id)
+            .values(balance=Account.balance + delta)
+            .returning(Account.balance)
+            .execution_options(synchronize_session=False))
+    if user_id is not None:
+        stmt = stmt.where(Account.user_id == user_id)
+
+    balance = (await db.execute(stmt)).scalar_one_or_none()
+    return balance.quantize(CENT) if balance is not None else None
+
+
+def _spent_by_account():
+    return (select(Expense.account_id, func.sum(Expense.amount).label("spent"))
+            .group_by(Expense.account_id)
+            .subquery())
+
+
+async def set_opening_balance(db: AsyncSession, account_id: str, balance: Decimal):
+    """
+    Records `balance` as the account's current balance, i.e. the opening balance plus everything spent so far.
+    """
+    spent = select(func.coalesce(func.sum(Expense.amount), 0)).filter(Expense.account_id == account_id)
+    stmt = dialect_insert(db)(AccountOpeningBalance).values(account_id=account_id,
+                                                            amount=balance + spent.scalar_subquery())
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[AccountOpeningBalance.account_id],
+        set_={"amount": stmt.excluded.amount, "updated_at": func.now()},
+    ))
+
+
+async def reconcile_balances(db: AsyncSession, account_id: Optional[str] = None,
+                             fix: bool = False) -> tuple[list[dict], list[str]]:
+    """
+    Recomputes every balance from its opening balance and the expenses table in one grouped query.
+    Returns the accounts whose stored balance drifted, and the accounts that have no opening balance yet.
+    With `fix`, drifted balances are overwritten with the recomputed value and missing opening balances
+    are adopted from the current balance.
+    """
+    spent = _spent_by_account()
+    expected = (AccountOpeningBalance.amount - func.coalesce(spent.c.spent, 0)).label("expected")
+    query = (select(Account.id, Account.balance, AccountOpeningBalance.amount, expected)
+             .outerjoin(AccountOpeningBalance, AccountOpeningBalance.account_id == Account.id)
+             .outerjoin(spent, spent.c.account_id == Account.id)
+             .order_by(Account.id))
+    if account_id is not None:
+        query = query.filter(Account.id == account_id)
+
+    drifts, missing = [], []
+    for row_account_id, balance, opening, recomputed in (await db.execute(query)).all():
+        if opening is None:
+            missing.append(row_account_id)
+            continue
+
+        balance, recomputed = Decimal(balance).quantize(CENT), Decimal(recomputed).quantize(CENT)
+        if balance != recomputed:
+            drifts.append({"account_id": row_account_id, "balance": balance, "expected": recomputed,
+                           "drift": balance - recomputed})
+
+    if fix and drifts:
+        spent_total = (select(func.coalesce(func.sum(Expense.amount), 0))
+                       .filter(Expense.account_id == Account.id).scalar_subquery())
+        opening = (select(AccountOpeningBalance.amount)
+                   .filter(AccountOpeningBalance.account_id == Account.id).scalar_subquery())
+        await db.execute(update(Account)
+                         .where(Account.id.in_([drift["account_id"] for drift in drifts]))
+                         .values(balance=opening - spent_total)
+                         .execution_options(synchronize_session=False))
+    if fix and missing:
+        adopted = (select(Account.id, Account.balance + func.coalesce(spent.c.spent, 0))
+                   .outerjoin(spent, spent.c.account_id == Account.id)
+                   .filter(Account.id.in_(missing)))
+        await db.execute(dialect_insert(db)(AccountOpeningBalance).from_select(["account_id", "amount"], adopted))
+
+    return drifts, missing
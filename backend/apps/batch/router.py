@@ -0,0 +1,57 @@
+import logging
+from typing import Annotated
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+
+from .schema import BatchRequest, BatchResponse
+from .utils import NOT_RUN, call_operation, resolve_path
+from ..user.utils import get_current_user, oauth2_scheme, resolved_principal
+from ..user.schema import UserPrincipal
+from core.db import batch_transaction
+from core.responses import ORJSONResponse
+
+router = APIRouter(prefix="/batch", tags=["Batch"])
+
+logger = logging.getLogger(__name__)
+
+
+@router.post("", status_code=status.HTTP_200_OK)
+async def run_batch(batch_request: BatchRequest,
+                    request: Request,
+                    token: Annotated[str, Depends(oauth2_scheme)],
+                    current_user: UserPrincipal = Depends(get_current_user)) -> BatchResponse:
+    """
+    Runs the operations in order against the other endpoints, in one database transaction that is committed
+    once at the end. Atomic batches stop at the first operation answering 4xx/5xx and roll everything back;
+    otherwise only the failed operations are rolled back and the rest are committed.
+    """
+    root_path = request.scope.get("root_path", "")
+    if any(resolve_path(root_path, operation.path)[0].removeprefix(root_path).startswith(router.prefix)
+           for operation in batch_request.operations):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Batches cannot be nested")
+
+    results, failed = [], False
+    try:
+        with resolved_principal(token, current_user):
+            async with batch_transaction() as batch:
+                for operation in batch_request.operations:
+                    if failed and batch_request.atomic:
+                        results.append(NOT_RUN)
+                        continue
+
+                    result = await call_operation(request.app, request.scope, operation, f"Bearer {token}")
+                    await batch.end_operation()
+                    results.append(result)
+                    failed = failed or result["status"] >= status.HTTP_400_BAD_REQUEST
+
+                committed = not (failed and batch_request.atomic)
+                if committed:
+                    await batch.commit()
+                else:
+                    await batch.rollback()
+    except Exception as e:
+        logger.exception(f"Failed to run batch for user {current_user.username}: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to run batch")
+
+    logger.info(f"Batch of {len(results)} operations {'committed' if committed else 'rolled back'} "
+                f"for user {current_user.username}")
+    return ORJSONResponse({"committed": committed, "results": results})
@@ -0,0 +1,41 @@
+from enum import Enum
+from typing import Any, Optional
+
+from pydantic import BaseModel, Field, field_validator
+
+from core.settings import BATCH_MAX_OPERATIONS
+
+
+class BatchMethod(str, Enum):
+    POST = "POST"
+    PUT = "PUT"
+    PATCH = "PATCH"
+    DELETE = "DELETE"
+
+
+class BatchOperation(BaseModel):
+    method: BatchMethod
+    path: str = Field(description="Endpoint path with an optional query string, e.g. /expenses/ or /api/expenses/")
+    body: Optional[Any] = None
+
+    @field_validator("path")
+    @classmethod
+    def check_path(cls, path: str) -> str:
+        if not path.startswith("/"):
+            raise ValueError("path must start with /")
+        return path
+
+
+class BatchRequest(BaseModel):
+    operations: list[BatchOperation] = Field(min_length=1, max_length=BATCH_MAX_OPERATIONS)
+    atomic: bool = Field(True, description="Roll back every operation when one fails, instead of only that one")
+
+
+class BatchOperationResult(BaseModel):
+    status: int
+    body: Optional[Any] = None
+
+
+class BatchResponse(BaseModel):
+    committed: bool
+    results: list[BatchOperationResult]
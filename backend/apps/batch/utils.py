@@ -0,0 +1,93 @@
+import asyncio
+import logging
+from urllib.parse import urlsplit
+
+import orjson
+from fastapi import status
+
+from core.responses import dumps
+from .schema import BatchOperation
+
+logger = logging.getLogger(__name__)
+
+NOT_RUN = {"status": status.HTTP_424_FAILED_DEPENDENCY, "body": {"detail": "Not run, an earlier operation failed"}}
+
+
+def _decode_body(headers: dict, body: bytes):
+    if not body:
+        return None
+    if headers.get(b"content-type", b"").split(b";")[0].strip() == b"application/json":
+        return orjson.loads(body)
+    return body.decode("utf-8", errors="replace")
+
+
+def resolve_path(root_path: str, operation_path: str) -> tuple[str, str]:
+    """
+    The full path and query string of an operation, which may name its path with or without the API's root.
+    """
+    url = urlsplit(operation_path)
+    if root_path and (url.path == root_path or url.path.startswith(f"{root_path}/")):
+        return url.path, url.query
+    return f"{root_path}{url.path}", url.query
+
+
+async def call_operation(app, parent_scope: dict, operation: BatchOperation, authorization: str) -> dict:
+    """
+    Runs one operation through the API app in-process, as if it had been sent with the batch's
+    credentials, and returns its status and decoded body.
+    """
+    root_path = parent_scope.get("root_path", "")
+    path, query = resolve_path(root_path, operation.path)
+    content = dumps(operation.body) if operation.body is not None else b""
+
+    scope = {
+        "type": "http",
+        "asgi": parent_scope.get("asgi", {"version": "3.0"}),
+        "http_version": parent_scope.get("http_version", "1.1"),
+        "method": operation.method.value,
+        "scheme": parent_scope.get("scheme", "http"),
+        "server": parent_scope.get("server"),
+        "client": parent_scope.get("client"),
+        "root_path": root_path,
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "headers": [
+            (b"host", dict(parent_scope.get("headers", [])).get(b"host", b"localhost")),
+            (b"authorization", authorization.encode()),
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(content)).encode()),
+        ],
+    }
+
+    response_complete = asyncio.Event()
+    request_sent = False
+    response = {"status": status.HTTP_500_INTERNAL_SERVER_ERROR, "headers": {}, "body": []}
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": content, "more_body": False}
+        await response_complete.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = dict(message.get("headers", []))
+        elif message["type"] == "http.response.body":
+            response["body"].append(message.get("body", b""))
+            if not message.get("more_body", False):
+                response_complete.set()
+
+    try:
+        await app(scope, receive, send)
+    except Exception as e:
+        # The app has already answered 500 by the time an unhandled error reaches here
+        logger.exception(f"Batch operation {operation.method.value} {operation.path} failed: {e}")
+        return {"status": status.HTTP_500_INTERNAL_SERVER_ERROR, "body": {"detail": "Internal Server Error"}}
+    finally:
+        response_complete.set()
+
+    return {"status": response["status"], "body": _decode_body(response["headers"], b"".join(response["body"]))}
@@ -1,10 +1,21 @@
 import uuid
-from sqlalchemy import Column, String, Boolean, DateTime, Integer, ForeignKey
+from sqlalchemy import Column, String, Boolean, DateTime, Integer, ForeignKey, Index, event
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 
 from core.db import Base
 
+DEFAULT_CATEGORIES = [
+    {"name": "Groceries", "description": "Food and household items", "color": "#FF5733", "icon": "shopping-cart"},
+    {"name": "Rent", "description": "Monthly housing expenses", "color": "#33FF57", "icon": "home"},
+    {"name": "Utilities", "description": "Electricity, water, gas bills", "color": "#3357FF", "icon": "bolt"},
+    {"name": "Transportation", "description": "Public transport and fuel costs", "color": "#FF33A1", "icon": "car"},
+    {"name": "Entertainment", "description": "Movies, games, and leisure activities", "color": "#A133FF",
+     "icon": "gamepad"},
+    {"name": "Health & Fitness", "description": "Gym memberships and health expenses", "color": "#33FFF5",
+     "icon": "dumbbell"},
+]
+
 
 class Category(Base):
     __tablename__ = "categories"
@@ -24,5 +35,32 @@ class Category(Base):
     account = relationship("Account", back_populates="categories")
     expenses = relationship("Expense", back_populates="category")
 
+    __table_args__ = (
+        Index("ix_categories_user_id_created_at", "user_id", "created_at"),
+    )
+
     def __repr__(self):
         return f"<Category(name={self.name}, is_active={self.is_active})>"
+
+
+class CategoryTemplate(Base):
+    """
+    Categories every new spending account starts with, stored once and copied per account.
+    """
+    __tablename__ = "category_templates"
+
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    name = Column(String(50), nullable=False, unique=True)
+    description = Column(String(255), nullable=True)
+    color = Column(String(7), nullable=True)
+    icon = Column(String(50), nullable=True)
+    position = Column(Integer, nullable=False, default=0, index=True)
+
+    def __repr__(self):
+        return f"<CategoryTemplate(name={self.name}, position={self.position})>"
+
+
+@event.listens_for(CategoryTemplate.__table__, "after_create")
+def _seed_category_templates(target, connection, **kw):
+    connection.execute(target.insert(), [{"id": str(uuid.uuid4()), "position": position, **category}
+                                         for position, category in enumerate(DEFAULT_CATEGORIES)])
@@ -1,13 +1,18 @@
 import logging
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import func, asc
-from sqlalchemy.orm import Session
-
-from core.db import get_db
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from sqlalchemy import func, asc, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.cache import bump_account_versions, bump_user_versions
+from core.db import get_async_db, get_versioned_read_db
+from core.responses import ORJSONResponse, response_columns, rows_to_dicts, sparse_fields, is_not_modified, \
+    not_modified, get_user_listing_validators
 from .schema import CategoryCreate, CategoryResponse
 from .models import Category
 from ..user.utils import get_current_user
-from ..user.models import User
+from ..expenses.models import Expense
+from ..expenses.utils import rebuild_rollups
+from ..user.schema import UserPrincipal
 
 router = APIRouter(prefix="/categories", tags=["Categories"])
 
@@ -16,13 +21,14 @@ logger = logging.getLogger(__name__)
 
 @router.post("/", status_code=status.HTTP_201_CREATED)
 async def add_category(category_data: CategoryCreate,
-                       current_user: User = Depends(get_current_user),
-                       db: Session = Depends(get_db)) -> CategoryResponse:
+                       current_user: UserPrincipal = Depends(get_current_user),
+                       db: AsyncSession = Depends(get_async_db)) -> CategoryResponse:
     try:
-        existing_category = db.query(Category).filter(
+        result = await db.execute(select(Category).filter(
             Category.user_id == current_user.id,
             func.lower(Category.name) == func.lower(category_data.name.strip())
-        ).first()
+        ))
+        existing_category = result.scalars().first()
 
         if existing_category:
             logger.warning(f"Category '{category_data.name}' already exists for user {current_user.username}")
@@ -34,29 +40,38 @@ async def add_category(category_data: CategoryCreate,
         )
 
         db.add(new_category)
-        db.commit()
+        await db.commit()
+        await bump_user_versions(current_user.id, "categories")
+        await db.refresh(new_category)
 
         logger.info(f"Category '{new_category.name}' added for user {current_user.username}")
         return CategoryResponse.model_validate(new_category)
     except Exception as e:
-        db.rollback()
         logger.exception(f"Failed to add category for user {current_user.username}: {e}")
+        await db.rollback()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to add category")
 
 
 @router.get("/", status_code=status.HTTP_200_OK)
 async def get_categories(
-        current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)) -> list[CategoryResponse]:
+        request: Request,
+        fields: tuple[str, ...] = Depends(sparse_fields(CategoryResponse)),
+        current_user: UserPrincipal = Depends(get_current_user),
+        db: AsyncSession = Depends(get_versioned_read_db)) -> list[CategoryResponse]:
+    validators = await get_user_listing_validators(current_user.id, "categories", fields)
+    if is_not_modified(request, validators):
+        logger.info(f"Categories not modified for user {current_user.username}")
+        return not_modified(validators)
+
     try:
-        categories = db.query(Category).filter(Category.user_id == current_user.id).order_by(
-            asc(Category.created_at)).all()
+        result = await db.execute(select(*response_columns(Category, CategoryResponse, fields)).filter(
+            Category.user_id == current_user.id).order_by(asc(Category.created_at)))
+        categories = rows_to_dicts(result)
         if not categories:
             logger.info(f"No categories found for user {current_user.username}")
-            return []
-
-        logger.info(f"Retrieved {len(categories)} categories for user {current_user.username}")
-        return [CategoryResponse.model_validate(category) for category in categories]
+        else:
+            logger.info(f"Retrieved {len(categories)} categories for user {current_user.username}")
+        return ORJSONResponse(categories, headers=validators)
     except Exception as e:
         logger.exception(f"Failed to retrieve categories for user {current_user.username}: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to retrieve categories")
@@ -65,15 +80,16 @@ async def get_categories(
 @router.put("/{category_id}", status_code=status.HTTP_200_OK)
 async def update_category(category_id: str,
                           category_data: CategoryCreate,
-                          current_user: User = Depends(get_current_user),
-                          db: Session = Depends(get_db)) -> CategoryResponse:
+                          current_user: UserPrincipal = Depends(get_current_user),
+                          db: AsyncSession = Depends(get_async_db)) -> CategoryResponse:
     update_data = category_data.model_dump(exclude_unset=True)
 
     try:
-        category = db.query(Category).filter(
+        result = await db.execute(select(Category).filter(
             Category.id == category_id,
             Category.user_id == current_user.id
-        ).first()
+        ))
+        category = result.scalars().first()
 
         if not category:
             logger.warning(f"Category with ID {category_id} not found for user {current_user.username}")
@@ -82,34 +98,49 @@ async def update_category(category_id: str,
         for key, value in update_data.items():
             setattr(category, key, value)
 
-        db.commit()
+        await db.commit()
+        await bump_user_versions(current_user.id, "categories")
+        await db.refresh(category)
 
         logger.info(f"Category '{category.name}' updated for user {current_user.username}")
         return CategoryResponse.model_validate(category)
     except Exception as e:
-        db.rollback()
         logger.exception(f"Failed to update category for user {current_user.username}: {e}")
+        await db.rollback()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to update category")
 
 
 @router.delete("/{category_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_category(category_id: str, current_user: User = Depends(get_current_user),
-                          db: Session = Depends(get_db)):
+async def delete_category(category_id: str, current_user: UserPrincipal = Depends(get_current_user),
+                          db: AsyncSession = Depends(get_async_db)):
     try:
-        category = db.query(Category).filter(
+        result = await db.execute(select(Category).filter(
             Category.id == category_id,
             Category.user_id == current_user.id
-        ).first()
+        ))
+        category = result.scalars().first()
 
         if not category:
             logger.warning(f"Category with ID {category_id} not found for user {current_user.username}")
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Category not found")
 
-        db.delete(category)
-        db.commit()
+        # Expenses in any account may use the category, not only the one it was created for
+        result = await db.execute(select(Expense.account_id).filter(Expense.category_id == category.id).distinct())
+        account_ids = set(result.scalars().all()) | {category.account_id}
+
+        await db.delete(category)
+        await db.flush()
+        # Its expenses are now uncategorized, so their spend moves to the uncategorized rollups
+        for account_id in account_ids:
+            await rebuild_rollups(db, account_id)
+        await db.commit()
+        await bump_account_versions(*account_ids)
+        await bump_user_versions(current_user.id, "categories")
 
         logger.info(f"Category '{category.name}' deleted for user {current_user.username}")
+    except HTTPException:
+        raise
     except Exception as e:
-        db.rollback()
         logger.exception(f"Failed to delete category for user {current_user.username}: {e}")
+        await db.rollback()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to delete category")
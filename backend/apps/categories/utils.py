@@ -1,35 +1,32 @@
 import logging
-from sqlalchemy.orm import Session
-from .models import Category
+from sqlalchemy import String, cast, func, insert, literal, literal_column, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from .models import Category, CategoryTemplate
 
 logger = logging.getLogger(__name__)
 
-DEFAULT_CATEGORIES = [
-    {"name": "Groceries", "description": "Food and household items", "color": "#FF5733", "icon": "shopping-cart"},
-    {"name": "Rent", "description": "Monthly housing expenses", "color": "#33FF57", "icon": "home"},
-    {"name": "Utilities", "description": "Electricity, water, gas bills", "color": "#3357FF", "icon": "bolt"},
-    {"name": "Transportation", "description": "Public transport and fuel costs", "color": "#FF33A1", "icon": "car"},
-    {"name": "Entertainment", "description": "Movies, games, and leisure activities", "color": "#A133FF",
-     "icon": "gamepad"},
-    {"name": "Health & Fitness", "description": "Gym memberships and health expenses", "color": "#33FFF5",
-     "icon": "dumbbell"},
-]
+# SQLite has no UUID function, so 16 random bytes are formatted as a version 4 UUID
+_SQLITE_UUID4 = ("lower(hex(randomblob(4)) || '-' || hex(randomblob(2)) || '-4' || substr(hex(randomblob(2)), 2) "
+                 "|| '-' || substr('89ab', 1 + (random() & 3), 1) || substr(hex(randomblob(2)), 2) || '-' "
+                 "|| hex(randomblob(6)))")
 
 
-def create_default_categories_for_account(user_id: str, account_id: str, db: Session):
-    try:
-        for category in DEFAULT_CATEGORIES:
-            new_category = Category(
-                user_id=user_id,
-                account_id=account_id,
-                name=category["name"],
-                description=category["description"],
-                color=category["color"],
-                icon=category["icon"]
-            )
-            db.add(new_category)
-        db.commit()
+def random_uuid_expr(db: AsyncSession):
+    if db.bind.dialect.name == "postgresql":
+        return cast(func.gen_random_uuid(), String)
+    return literal_column(_SQLITE_UUID4)
 
-        logger.info(f"Default categories created for user {user_id}")
-    except Exception as e:
-        logger.error(f"Failed to create default categories for user {user_id}: {e}")
+
+async def create_default_categories_for_account(user_id: str, account_id: str, db: AsyncSession) -> int:
+    """
+    Copies the category templates to the account with a single INSERT ... SELECT, in the caller's transaction.
+    """
+    result = await db.execute(insert(Category).from_select(
+        ["id", "user_id", "account_id", "name", "description", "color", "icon"],
+        select(random_uuid_expr(db), literal(user_id), literal(account_id), CategoryTemplate.name,
+               CategoryTemplate.description, CategoryTemplate.color, CategoryTemplate.icon)
+        .order_by(CategoryTemplate.position)
+    ))
+
+    logger.info(f"Default categories created for user {user_id}")
+    return result.rowcount
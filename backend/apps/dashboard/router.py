@@ -0,0 +1,51 @@
+import logging
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from .schema import DashboardAccount, DashboardResponse
+from .utils import latest_expenses_query, attach_dashboard_relationships
+from ..user.models import User
+from ..user.utils import get_current_user
+from ..user.schema import UserPrincipal
+from core.db import get_read_db
+from core.responses import ORJSONResponse
+from core.settings import DASHBOARD_EXPENSES_PER_ACCOUNT
+
+router = APIRouter(prefix="/dashboard", tags=["Dashboard"])
+
+logger = logging.getLogger(__name__)
+
+
+@router.get("", status_code=status.HTTP_200_OK)
+async def get_dashboard(expenses_per_account: int = Query(DASHBOARD_EXPENSES_PER_ACCOUNT, ge=0, le=100),
+                        current_user: UserPrincipal = Depends(get_current_user),
+                        db: AsyncSession = Depends(get_read_db)) -> DashboardResponse:
+    """
+    The user, their accounts with balances and categories, and each account's latest expenses, in four
+    queries however many accounts there are.
+    """
+    try:
+        result = await db.execute(select(User).options(selectinload(User.accounts), selectinload(User.categories))
+                                  .filter(User.id == current_user.id))
+        user = result.scalars().first()
+        if user is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+
+        accounts = sorted(user.accounts, key=lambda account: (account.created_at, account.id))
+        expenses = []
+        if accounts and expenses_per_account:
+            result = await db.execute(latest_expenses_query(db, user.id, expenses_per_account))
+            expenses = result.scalars().all()
+        attach_dashboard_relationships(accounts, user.categories, expenses)
+
+        dashboard = DashboardResponse(user=UserPrincipal.model_validate(user),
+                                      accounts=[DashboardAccount.model_validate(account) for account in accounts])
+        logger.info(f"Retrieved dashboard with {len(accounts)} accounts for user {current_user.username}")
+        return ORJSONResponse(dashboard)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"Failed to retrieve dashboard for user {current_user.username}: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to retrieve dashboard")
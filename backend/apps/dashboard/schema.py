@@ -0,0 +1,16 @@
+from pydantic import BaseModel, Field
+
+from ..user.schema import UserPrincipal
+from ..accounts.schema import AccountResponse
+from ..categories.schema import CategoryResponse
+from ..expenses.schema import ExpenseResponse
+
+
+class DashboardAccount(AccountResponse):
+    categories: list[CategoryResponse] = []
+    latest_expenses: list[ExpenseResponse] = Field([], validation_alias="expenses")
+
+
+class DashboardResponse(BaseModel):
+    user: UserPrincipal
+    accounts: list[DashboardAccount]
@@ -0,0 +1,44 @@
+from collections import defaultdict
+
+from sqlalchemy import select, true
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from sqlalchemy.orm.attributes import set_committed_value
+
+from ..accounts.models import Account
+from ..expenses.models import Expense
+
+
+def latest_expenses_query(db: AsyncSession, user_id: str, per_account: int):
+    """
+    The latest per_account expenses of every account of the user, in one statement. Each account reads
+    only per_account entries of the (account_id, timestamp, id) index, through a correlated subquery on
+    SQLite and a LATERAL join elsewhere; ranking with row_number() would read all of an account's expenses.
+    """
+    if db.bind.dialect.name == "sqlite":
+        ranked = aliased(Expense)
+        latest_ids = (select(ranked.id).filter(ranked.account_id == Account.id)
+                      .order_by(ranked.timestamp.desc(), ranked.id.desc()).limit(per_account).correlate(Account))
+        return (select(Expense).select_from(Account).join(Expense, Expense.id.in_(latest_ids))
+                .filter(Account.user_id == user_id))
+
+    latest = (select(Expense).filter(Expense.account_id == Account.id)
+              .order_by(Expense.timestamp.desc(), Expense.id.desc()).limit(per_account).lateral())
+    latest_expense = aliased(Expense, latest)
+    return select(latest_expense).select_from(Account).join(latest, true()).filter(Account.user_id == user_id)
+
+
+def attach_dashboard_relationships(accounts: list[Account], categories: list, expenses: list[Expense]):
+    """
+    Populates Account.categories and Account.expenses from rows loaded for all accounts at once, without
+    the lazy loads that touching either relationship would otherwise emit.
+    """
+    categories_by_account, expenses_by_account = defaultdict(list), defaultdict(list)
+    for category in sorted(categories, key=lambda category: (category.created_at, category.id)):
+        categories_by_account[category.account_id].append(category)
+    for expense in sorted(expenses, key=lambda expense: (expense.timestamp, expense.id), reverse=True):
+        expenses_by_account[expense.account_id].append(expense)
+
+    for account in accounts:
+        set_committed_value(account, "categories", categories_by_account[account.id])
+        set_committed_value(account, "expenses", expenses_by_account[account.id])
@@ -1,6 +1,6 @@
 import uuid
-from sqlalchemy import Column, String, DateTime, ForeignKey, Numeric, Date
-from sqlalchemy.sql import func
+from sqlalchemy import Column, String, DateTime, ForeignKey, Numeric, Date, Index, Integer, event
+from sqlalchemy.sql import func, table, column
 from sqlalchemy.orm import relationship
 
 from core.db import Base
@@ -10,7 +10,7 @@ class Expense(Base):
     __tablename__ = "expenses"
 
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()), index=True)
-    account_id = Column(String(36), ForeignKey("accounts.id"), nullable=False, index=True)
+    account_id = Column(String(36), ForeignKey("accounts.id"), nullable=False)
     category_id = Column(String(36), ForeignKey("categories.id", ondelete="SET NULL"), nullable=True, index=True)
     amount = Column(Numeric(precision=10, scale=2), nullable=False)
     name = Column(String(50), nullable=False)
@@ -21,3 +21,106 @@ class Expense(Base):
 
     account = relationship("Account", back_populates="expenses")
     category = relationship("Category", back_populates="expenses")
+
+    __table_args__ = (
+        # Leads with account_id, so it also serves every plain account_id lookup
+        Index("ix_expenses_account_id_timestamp_id", "account_id", "timestamp", "id"),
+        Index("ix_expenses_account_id_category_id_timestamp_id", "account_id", "category_id", "timestamp", "id"),
+    )
+
+
+class ExpenseRollup(Base):
+    """
+    Running spend per account, category and calendar month, maintained alongside every expense write.
+    Uncategorized expenses are rolled up under an empty category_id so the key stays NOT NULL.
+    """
+    __tablename__ = "expense_rollups"
+
+    account_id = Column(String(36), ForeignKey("accounts.id", ondelete="CASCADE"), primary_key=True)
+    category_id = Column(String(36), primary_key=True, default="")
+    year_month = Column(String(7), primary_key=True)
+    total = Column(Numeric(precision=12, scale=2), nullable=False, default=0)
+    count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+    account = relationship("Account", back_populates="rollups")
+
+    __table_args__ = (
+        # The summary reads an account's rollups month by month, which the primary key can't order
+        Index("ix_expense_rollups_account_id_year_month", "account_id", "year_month", "category_id"),
+    )
+
+
+# Full-text index over expense names and descriptions, kept in sync by triggers. account_id is indexed too (with
+# zero rank weight), so a search intersects the account's postings with the query terms instead of ranking matches
+# from every account. The FTS5 table is contentless and keyed by expense_search_keys.id: an INTEGER PRIMARY KEY
+# survives VACUUM, where the implicit rowid of the TEXT-keyed expenses table may be renumbered.
+expense_search = table("expenses_fts", column("rowid"), column("rank"))
+expense_search_keys = table("expense_search_keys", column("id"), column("expense_id"))
+
+EXPENSE_SEARCH_KEY = "(SELECT id FROM expense_search_keys WHERE expense_id = {}.id)"
+
+EXPENSE_SEARCH_DDL = (
+    "CREATE TABLE expense_search_keys (id INTEGER PRIMARY KEY, expense_id VARCHAR(36) NOT NULL UNIQUE)",
+    """CREATE VIRTUAL TABLE expenses_fts USING fts5(
+        name, description, account_id, content='',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3')""",
+    "INSERT INTO expenses_fts(expenses_fts, rank) VALUES ('rank', 'bm25(10.0, 5.0, 0.0)')",
+    f"""CREATE TRIGGER expenses_fts_ai AFTER INSERT ON expenses BEGIN
+        INSERT INTO expense_search_keys(expense_id) VALUES (new.id);
+        INSERT INTO expenses_fts(rowid, name, description, account_id)
+        VALUES ({EXPENSE_SEARCH_KEY.format("new")}, new.name, new.description, new.account_id);
+    END""",
+    f"""CREATE TRIGGER expenses_fts_ad AFTER DELETE ON expenses BEGIN
+        INSERT INTO expenses_fts(expenses_fts, rowid, name, description, account_id)
+        VALUES ('delete', {EXPENSE_SEARCH_KEY.format("old")}, old.name, old.description, old.account_id);
+        DELETE FROM expense_search_keys WHERE expense_id = old.id;
+    END""",
+    f"""CREATE TRIGGER expenses_fts_au AFTER UPDATE OF name, description, account_id ON expenses BEGIN
+        INSERT INTO expenses_fts(expenses_fts, rowid, name, description, account_id)
+        VALUES ('delete', {EXPENSE_SEARCH_KEY.format("old")}, old.name, old.description, old.account_id);
+        INSERT INTO expenses_fts(rowid, name, description, account_id)
+        VALUES ({EXPENSE_SEARCH_KEY.format("new")}, new.name, new.description, new.account_id);
+    END""",
+)
+
+# Contentless tables can't 'rebuild' from a content table, so reindexing starts from empty keys and index
+EXPENSE_SEARCH_REBUILD = (
+    "INSERT INTO expenses_fts(expenses_fts) VALUES ('delete-all')",
+    "DELETE FROM expense_search_keys",
+    "INSERT INTO expense_search_keys(expense_id) SELECT id FROM expenses",
+    """INSERT INTO expenses_fts(rowid, name, description, account_id)
+        SELECT expense_search_keys.id, expenses.name, expenses.description, expenses.account_id
+        FROM expense_search_keys JOIN expenses ON expenses.id = expense_search_keys.expense_id""",
+)
+
+# Earlier versions indexed the expenses rowid through an external-content table
+LEGACY_EXPENSE_SEARCH_DROP = (
+    "DROP TRIGGER IF EXISTS expenses_fts_ai",
+    "DROP TRIGGER IF EXISTS expenses_fts_ad",
+    "DROP TRIGGER IF EXISTS expenses_fts_au",
+    "DROP TABLE IF EXISTS expenses_fts",
+)
+
+
+def create_expense_search_index(connection, rebuild: bool = False) -> bool:
+    """
+    Creates the FTS5 table and its triggers if they are missing, indexing existing expenses.
+    Returns False on databases other than SQLite, where search falls back to LIKE matching.
+    """
+    if connection.dialect.name != "sqlite":
+        return False
+
+    exists = connection.exec_driver_sql("SELECT 1 FROM sqlite_master WHERE name = 'expense_search_keys'").first()
+    if not exists:
+        for statement in LEGACY_EXPENSE_SEARCH_DROP + EXPENSE_SEARCH_DDL:
+            connection.exec_driver_sql(statement)
+    if rebuild or not exists:
+        for statement in EXPENSE_SEARCH_REBUILD:
+            connection.exec_driver_sql(statement)
+    return True
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _create_expense_search_index(target, connection, **kw):
+    create_expense_search_index(connection)
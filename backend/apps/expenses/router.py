@@ -1,16 +1,33 @@
 import logging
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import desc, asc
-from sqlalchemy.orm import Session
-
-from .models import Expense
+from collections import defaultdict
+from decimal import Decimal
+from typing import Annotated, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import Response, StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy import desc, asc, func, select, insert, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .models import Expense, ExpenseRollup, expense_search, expense_search_keys
 from .schema import ExpenseCreate, ExpenseUpdate, ExpenseResponse, ExpenseResponseWithBalance, ExpenseQueryParams, \
-    ExpensePaginatedResponse
-from .utils import build_expense_filters
+    ExpensePaginatedResponse, ExpenseSummaryItem, ExpenseSummaryResponse, ExpenseBulkError, ExpenseBulkResponse, \
+    ExpenseExportParams, ExpenseSearchParams, ExpenseSearchResponse, ExpenseFilters, ExpenseAnalyticsResponse
+from .utils import build_expense_filters, build_keyset_filter, encode_cursor, apply_rollup_delta, iter_bulk_rows, \
+    BulkFormatError, BULK_CONTENT_TYPES, EXPORT_COLUMNS, EXPORT_MEDIA_TYPES, export_header, serialize_export_rows, \
+    get_listing_cache_key, get_cached_listing, set_cached_listing, build_search_match, build_search_like, \
+    get_listing_validators, epoch_day, epoch_day_expr, cents_expr, to_analytics_columns, compute_expense_analytics
 from ..user.utils import get_current_user
-from ..user.models import User
+from ..user.schema import UserPrincipal
 from ..accounts.models import Account
-from core.db import get_db
+from ..categories.models import Category
+from ..accounts.utils import adjust_account_balance
+from ..notifications.utils import publish_balance_change
+from core.cache import bump_account_versions, bump_user_versions
+from core.db import get_async_db, get_read_db, get_versioned_read_db, AsyncSessionLocal
+from core.responses import ORJSONResponse, dumps, response_columns, rows_to_dicts, sparse_fields, is_not_modified, \
+    not_modified
+from core.settings import EXPENSE_BULK_CHUNK_SIZE, EXPENSE_BULK_MAX_ERRORS, EXPENSE_EXPORT_BATCH_SIZE, \
+    EXPENSE_ANALYTICS_MAX_DAYS
 
 router = APIRouter(prefix="/expenses", tags=["Expense"])
 
@@ -19,15 +36,13 @@ logger = logging.getLogger(__name__)
 
 @router.post("/", status_code=status.HTTP_201_CREATED)
 async def add_expense(expense_data: ExpenseCreate,
-                      current_user: User = Depends(get_current_user),
-                      db: Session = Depends(get_db)) -> ExpenseResponseWithBalance:
+                      current_user: UserPrincipal = Depends(get_current_user),
+                      db: AsyncSession = Depends(get_async_db)) -> ExpenseResponseWithBalance:
     try:
-        account = db.query(Account).filter(
-            Account.id == expense_data.account_id,
-            Account.user_id == current_user.id
-        ).first()
+        balance = await adjust_account_balance(db, expense_data.account_id, -expense_data.amount,
+                                               user_id=current_user.id)
 
-        if not account:
+        if balance is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Account not found or doesn't belong to user"
@@ -37,78 +52,407 @@ async def add_expense(expense_data: ExpenseCreate,
             **expense_data.model_dump()
         )
 
-        account.balance -= expense_data.amount
-
         db.add(new_expense)
-        db.add(account)
-        db.flush()
-        db.commit()
+        await apply_rollup_delta(db, new_expense.account_id, new_expense.category_id, new_expense.timestamp,
+                                 new_expense.amount, 1)
+        await db.flush()
+        await db.commit()
+        await bump_account_versions(new_expense.account_id)
+        # Expenses move account balances, which the account listing shows
+        await bump_user_versions(current_user.id, "accounts")
+        await db.refresh(new_expense)
+
+        await publish_balance_change(current_user.id, new_expense.account_id, balance, -new_expense.amount,
+                                     "expense.create")
 
         logger.info(f"Expense '{new_expense.description}' added for user {current_user.username}. "
-                    f"Account '{account.name}' balance updated to {account.balance}")
-
-        if account.balance < 0:
-            pass  #TODO Implement socketIO to notify user about negative balance
+                    f"Account {new_expense.account_id} balance updated to {balance}")
 
         return ExpenseResponseWithBalance.model_validate({
             **new_expense.__dict__,
-            "account_balance": account.balance
+            "balance": balance
         })
+    except HTTPException:
+        await db.rollback()
+        raise
     except Exception as e:
-        db.rollback()
         logger.exception(f"Failed to add expense for user {current_user.username}: {e}")
+        await db.rollback()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to add expense")
 
-# TODO Implement caching with cachetools or Redis
+
+@router.post("/bulk", status_code=status.HTTP_200_OK)
+async def add_expenses_bulk(request: Request,
+                            current_user: UserPrincipal = Depends(get_current_user),
+                            db: AsyncSession = Depends(get_async_db)) -> ExpenseBulkResponse:
+    content_type = request.headers.get("content-type", "application/json").split(";")[0].strip().lower()
+    body_format = BULK_CONTENT_TYPES.get(content_type)
+    if body_format is None:
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                            detail=f"Unsupported content type, expected one of {', '.join(BULK_CONTENT_TYPES)}")
+
+    result = await db.execute(select(Account.id).filter(Account.user_id == current_user.id))
+    account_ids = set(result.scalars().all())
+    result = await db.execute(select(Category.id).filter(Category.user_id == current_user.id))
+    category_ids = set(result.scalars().all())
+
+    # Only the first EXPENSE_BULK_MAX_ERRORS rejections are reported in full, the rest are only counted
+    errors: list[ExpenseBulkError] = []
+    failed = 0
+    balance_deltas: dict[str, Decimal] = defaultdict(Decimal)
+    rollup_deltas: dict[tuple, list] = defaultdict(lambda: [Decimal("0"), 0])
+    inserted = 0
+    chunk: list[dict] = []
+
+    def reject(index: int, messages: list[str]):
+        nonlocal failed
+        failed += 1
+        if len(errors) < EXPENSE_BULK_MAX_ERRORS:
+            errors.append(ExpenseBulkError(index=index, errors=messages))
+
+    async def flush_chunk():
+        nonlocal inserted
+        if chunk:
+            await db.execute(insert(Expense), chunk)
+            inserted += len(chunk)
+            chunk.clear()
+
+    try:
+        async for index, row in iter_bulk_rows(request.stream(), body_format):
+            if isinstance(row, BulkFormatError):
+                reject(index, [str(row)])
+                continue
+            try:
+                expense = ExpenseCreate.model_validate(row)
+            except ValidationError as e:
+                reject(index, [
+                    f"{'.'.join(str(part) for part in error['loc']) or 'row'}: {error['msg']}" for error in e.errors()
+                ])
+                continue
+
+            if expense.account_id not in account_ids:
+                reject(index, ["account_id: Account not found or doesn't belong to user"])
+                continue
+            if expense.category_id is not None and expense.category_id not in category_ids:
+                reject(index, ["category_id: Category not found or doesn't belong to user"])
+                continue
+
+            chunk.append(expense.model_dump())
+            balance_deltas[expense.account_id] += expense.amount
+            totals = rollup_deltas[(expense.account_id, expense.category_id, expense.timestamp.replace(day=1))]
+            totals[0] += expense.amount
+            totals[1] += 1
+
+            if len(chunk) >= EXPENSE_BULK_CHUNK_SIZE:
+                await flush_chunk()
+        await flush_chunk()
+
+        balances = {}
+        for account_id, amount in balance_deltas.items():
+            balances[account_id] = await adjust_account_balance(db, account_id, -amount)
+        for (account_id, category_id, month), (amount, count) in rollup_deltas.items():
+            await apply_rollup_delta(db, account_id, category_id, month, amount, count)
+
+        await db.commit()
+        await bump_account_versions(*balance_deltas.keys())
+        await bump_user_versions(current_user.id, "accounts")
+        for account_id, amount in balance_deltas.items():
+            await publish_balance_change(current_user.id, account_id, balances[account_id], -amount, "expense.bulk")
+    except BulkFormatError as e:
+        await db.rollback()
+        logger.warning(f"Rejected bulk expense upload for user {current_user.username}: {e}")
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        logger.exception(f"Failed to bulk add expenses for user {current_user.username}: {e}")
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to add expenses")
+
+    logger.info(f"Bulk added {inserted} expenses for user {current_user.username} "
+                f"({failed} rejected, {len(balance_deltas)} accounts updated)")
+    return ExpenseBulkResponse(inserted=inserted, failed=failed, errors=errors)
+
+
 @router.get("/", status_code=status.HTTP_200_OK)
-async def get_expenses(query_data: ExpenseQueryParams, current_user: User = Depends(get_current_user),
-                       db: Session = Depends(get_db)) -> ExpensePaginatedResponse:
+async def get_expenses(request: Request,
+                       query_data: ExpenseQueryParams,
+                       fields: tuple[str, ...] = Depends(sparse_fields(ExpenseResponse)),
+                       current_user: UserPrincipal = Depends(get_current_user),
+                       db: AsyncSession = Depends(get_versioned_read_db)) -> ExpensePaginatedResponse:
+    validators = await get_listing_validators(current_user.id, query_data, fields)
+    if is_not_modified(request, validators):
+        logger.info(f"Expenses not modified for user {current_user.username}")
+        return not_modified(validators)
+
+    cache_key = await get_listing_cache_key(current_user.id, query_data, fields)
+    cached = await get_cached_listing(cache_key)
+    if cached is not None:
+        logger.info(f"Served cached expenses for user {current_user.username}")
+        return Response(content=cached, media_type="application/json", headers=validators)
+
     expense_filters = build_expense_filters(query_data.filters)
     per_page = max(query_data.per_page, 1)
-    skip = (query_data.page - 1) * per_page
-    sort_expr = desc(Expense.timestamp) if query_data.sort_order == "desc" else asc(Expense.timestamp)
+    descending = query_data.sort_order == "desc"
+
+    try:
+        keyset_filter, backwards = build_keyset_filter(query_data.cursor, query_data.sort_order)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+    order = desc if descending != backwards else asc
+    # timestamp and id are always read, the cursors are built from them
+    columns = response_columns(Expense, ExpenseResponse, {*fields, "timestamp", "id"})
+    stmt = select(*columns).filter(*expense_filters).order_by(order(Expense.timestamp), order(Expense.id))
+    if keyset_filter is not None:
+        stmt = stmt.filter(keyset_filter)
+    else:
+        stmt = stmt.offset((query_data.page - 1) * per_page)
 
     try:
-        expenses = (db.query(Expense)
-                    .filter(*expense_filters)
-                    .order_by(sort_expr)
-                    .offset(skip)
-                    .limit(per_page).all())
+        result = await db.execute(stmt.limit(per_page + 1))
+        expenses = result.all()
 
-        total = db.query(Expense).filter(*expense_filters).count()
+        has_more = len(expenses) > per_page
+        expenses = expenses[:per_page]
+        if backwards:
+            expenses.reverse()
+
+        total = None
+        if query_data.include_total:
+            total = await db.scalar(select(func.count()).select_from(Expense).filter(*expense_filters))
         filtered = len(expenses)
 
+        next_cursor = prev_cursor = None
         if not expenses:
             logger.info(f"No expenses found for user {current_user.username} with filters: {expense_filters}")
-            return ExpensePaginatedResponse(items=[], total=total, filtered=filtered)
-
-        logger.info(
-            f"Retrieved {len(expenses)} expenses for user {current_user.username} with filters: {expense_filters}")
-        return ExpensePaginatedResponse(
-            items=[ExpenseResponse.model_validate(expense) for expense in expenses],
-            total=total,
-            filtered=filtered
-        )
+        else:
+            has_next = has_more if not backwards else True
+            has_prev = has_more if backwards else (keyset_filter is not None or query_data.page > 1)
+            next_cursor = encode_cursor(expenses[-1], "next") if has_next else None
+            prev_cursor = encode_cursor(expenses[0], "prev") if has_prev else None
+
+            logger.info(
+                f"Retrieved {len(expenses)} expenses for user {current_user.username} with filters: {expense_filters}")
+
+        # Serialized straight from the selected columns, in the shape of ExpensePaginatedResponse
+        payload = dumps({
+            "items": rows_to_dicts(expenses, fields),
+            "total": total,
+            "filtered": filtered,
+            "next_cursor": next_cursor,
+            "prev_cursor": prev_cursor,
+        })
+        await set_cached_listing(cache_key, payload)
+        return Response(content=payload, media_type="application/json", headers=validators)
     except Exception as e:
         logger.exception(f"Failed to retrieve expenses for user {current_user.username}: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to retrieve expenses")
 
 
+@router.get("/summary", status_code=status.HTTP_200_OK)
+async def get_expense_summary(account_id: str,
+                              start_month: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$"),
+                              end_month: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$"),
+                              current_user: UserPrincipal = Depends(get_current_user),
+                              db: AsyncSession = Depends(get_async_db)) -> ExpenseSummaryResponse:
+    try:
+        result = await db.execute(select(Account.id).filter(
+            Account.id == account_id,
+            Account.user_id == current_user.id
+        ))
+        if result.scalar() is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Account not found")
+
+        stmt = select(ExpenseRollup).filter(ExpenseRollup.account_id == account_id, ExpenseRollup.count > 0)
+        if start_month is not None:
+            stmt = stmt.filter(ExpenseRollup.year_month >= start_month)
+        if end_month is not None:
+            stmt = stmt.filter(ExpenseRollup.year_month <= end_month)
+        result = await db.execute(stmt.order_by(ExpenseRollup.year_month, ExpenseRollup.category_id))
+        rollups = result.scalars().all()
+
+        by_category, by_month = {}, {}
+        for rollup in rollups:
+            for key, buckets in ((rollup.category_id or None, by_category), (rollup.year_month, by_month)):
+                total, count = buckets.get(key, (Decimal("0"), 0))
+                buckets[key] = (total + rollup.total, count + rollup.count)
+
+        logger.info(f"Retrieved expense summary ({len(rollups)} rollups) for user {current_user.username}")
+        return ExpenseSummaryResponse(
+            account_id=account_id,
+            total=sum((rollup.total for rollup in rollups), Decimal("0")),
+            count=sum(rollup.count for rollup in rollups),
+            items=[ExpenseSummaryItem(category_id=rollup.category_id or None, year_month=rollup.year_month,
+                                      total=rollup.total, count=rollup.count) for rollup in rollups],
+            by_category=[ExpenseSummaryItem(category_id=key, total=total, count=count)
+                         for key, (total, count) in by_category.items()],
+            by_month=[ExpenseSummaryItem(year_month=key, total=total, count=count)
+                      for key, (total, count) in by_month.items()],
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"Failed to retrieve expense summary for user {current_user.username}: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                            detail="Failed to retrieve expense summary")
+
+
+@router.get("/analytics", status_code=status.HTTP_200_OK)
+async def get_expense_analytics(params: Annotated[ExpenseFilters, Query()],
+                                current_user: UserPrincipal = Depends(get_current_user),
+                                db: AsyncSession = Depends(get_read_db)) -> ExpenseAnalyticsResponse:
+    if params.start_date and params.end_date and params.start_date > params.end_date:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="start_date is after end_date")
+
+    try:
+        result = await db.execute(select(Account.id).filter(
+            Account.id == params.account_id,
+            Account.user_id == current_user.id
+        ))
+        if result.scalar() is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Account not found")
+
+        start_date, end_date = params.start_date, params.end_date
+        if start_date is None or end_date is None:
+            # Open ends are bounded by the first/last matching expense. Separate MIN and MAX subqueries each
+            # resolve from the (account_id, timestamp) index, so the range is checked before any row is loaded.
+            expense_filters = build_expense_filters(params)
+            result = await db.execute(select(
+                select(func.min(Expense.timestamp)).filter(*expense_filters).scalar_subquery(),
+                select(func.max(Expense.timestamp)).filter(*expense_filters).scalar_subquery()))
+            first_date, last_date = result.one()
+            start_date, end_date = start_date or first_date, end_date or last_date
+
+        if start_date is None or end_date is None:
+            logger.info(f"No expenses to analyse for user {current_user.username}")
+            return ORJSONResponse({"account_id": params.account_id, "start_date": params.start_date,
+                                   "end_date": params.end_date, "total": Decimal("0.00"), "count": 0,
+                                   "daily": [], "weekly": [], "monthly": [], "by_category": []})
+
+        start_day, end_day = epoch_day(start_date), epoch_day(end_date)
+        if end_day - start_day + 1 > EXPENSE_ANALYTICS_MAX_DAYS:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail=f"Analytics cover at most {EXPENSE_ANALYTICS_MAX_DAYS} days, "
+                                       f"narrow start_date/end_date")
+
+        # One columnar query, unordered: grouping by category happens in NumPy
+        result = await db.execute(
+            select(epoch_day_expr(db), cents_expr(), Expense.category_id).filter(*build_expense_filters(params)))
+        days, cents, category_codes, category_ids = to_analytics_columns(result.all())
+
+        analytics = compute_expense_analytics(days, cents, category_codes, category_ids, start_day, end_day)
+        logger.info(f"Computed expense analytics over {len(cents)} expenses for user {current_user.username}")
+        return ORJSONResponse({"account_id": params.account_id, **analytics})
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"Failed to compute expense analytics for user {current_user.username}: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                            detail="Failed to compute expense analytics")
+
+
+@router.get("/export", status_code=status.HTTP_200_OK)
+async def export_expenses(filters: Annotated[ExpenseExportParams, Query()],
+                          current_user: UserPrincipal = Depends(get_current_user),
+                          db: AsyncSession = Depends(get_async_db)) -> StreamingResponse:
+    result = await db.execute(select(Account.id).filter(
+        Account.id == filters.account_id,
+        Account.user_id == current_user.id
+    ))
+    if result.scalar() is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Account not found")
+
+    stmt = (select(*EXPORT_COLUMNS)
+            .filter(*build_expense_filters(filters))
+            .order_by(asc(Expense.timestamp), asc(Expense.id))
+            .execution_options(stream_results=True, yield_per=EXPENSE_EXPORT_BATCH_SIZE))
+    export_format = filters.format
+    username = current_user.username
+
+    async def stream_rows():
+        # The request's session is closed before the body is sent, so the export holds its own
+        exported = 0
+        try:
+            yield export_header(export_format)
+            async with AsyncSessionLocal() as export_db:
+                result = await export_db.stream(stmt)
+                async for rows in result.partitions():
+                    exported += len(rows)
+                    yield serialize_export_rows(rows, export_format)
+            logger.info(f"Exported {exported} expenses for user {username}")
+        except Exception as e:
+            logger.exception(f"Failed to export expenses for user {username} after {exported} rows: {e}")
+            raise
+
+    return StreamingResponse(
+        stream_rows(),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="expenses.{export_format}"'},
+    )
+
+
+@router.get("/search", status_code=status.HTTP_200_OK)
+async def search_expenses(params: Annotated[ExpenseSearchParams, Query()],
+                          current_user: UserPrincipal = Depends(get_current_user),
+                          db: AsyncSession = Depends(get_read_db)) -> ExpenseSearchResponse:
+    try:
+        result = await db.execute(select(Account.id).filter(
+            Account.id == params.account_id,
+            Account.user_id == current_user.id
+        ))
+        if result.scalar() is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Account not found")
+
+        stmt = select(Expense).filter(*build_expense_filters(params))
+        if db.bind.dialect.name == "sqlite":
+            match = build_search_match(params.q, params.account_id)
+            stmt = (stmt.join(expense_search_keys, expense_search_keys.c.expense_id == Expense.id)
+                    .join(expense_search, expense_search.c.rowid == expense_search_keys.c.id)
+                    .filter(text("expenses_fts MATCH :match").bindparams(match=match))
+                    .order_by(expense_search.c.rank, desc(Expense.timestamp)))
+        else:
+            conditions = build_search_like(params.q)
+            match = conditions or None
+            stmt = stmt.filter(*conditions).order_by(desc(Expense.timestamp), desc(Expense.id))
+
+        expenses = []
+        if match is not None:
+            result = await db.execute(stmt.offset(params.offset).limit(params.limit + 1))
+            expenses = result.scalars().all()
+
+        logger.info(f"Found {min(len(expenses), params.limit)} expenses matching '{params.q}' "
+                    f"for user {current_user.username}")
+        return ExpenseSearchResponse(
+            items=[ExpenseResponse.model_validate(expense) for expense in expenses[:params.limit]],
+            q=params.q,
+            limit=params.limit,
+            offset=params.offset,
+            has_more=len(expenses) > params.limit,
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"Failed to search expenses for user {current_user.username}: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to search expenses")
+
+
 @router.get("/{expense_id}", status_code=status.HTTP_200_OK)
-async def get_expense(expense_id: int, current_user: User = Depends(get_current_user),
-                      db: Session = Depends(get_db)) -> ExpenseResponse:
+async def get_expense(expense_id: str, current_user: UserPrincipal = Depends(get_current_user),
+                      db: AsyncSession = Depends(get_async_db)) -> ExpenseResponse:
     try:
-        expense = db.query(Expense).filter(
+        result = await db.execute(select(Expense).join(Account).filter(
             Expense.id == expense_id,
-            Expense.user_id == current_user.id
-        ).first()
+            Account.user_id == current_user.id
+        ))
+        expense = result.scalars().first()
 
         if not expense:
             logger.warning(f"Expense with ID {expense_id} not found for user {current_user.username}")
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Expense not found")
 
-        logger.info(f"Retrieved expense '{expense.description}' for user {current_user.username}")
+        logger.info(f"Retrieved expense '{expense.name}' for user {current_user.username}")
         return ExpenseResponse.model_validate(expense)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception(f"Failed to retrieve expense with ID {expense_id} for user {current_user.username}: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to retrieve expense")
@@ -116,18 +460,19 @@ async def get_expense(expense_id: int, current_user: User = Depends(get_current_
 
 @router.put("/{expense_id}", status_code=status.HTTP_200_OK)
 async def update_expense(
-        expense_id: int,
+        expense_id: str,
         expense_data: ExpenseUpdate,
-        current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        current_user: UserPrincipal = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db)
 ) -> ExpenseResponseWithBalance:
     update_data = expense_data.model_dump(exclude_unset=True)
 
     try:
-        expense = db.query(Expense).join(Account).filter(
+        result = await db.execute(select(Expense).join(Account).filter(
             Expense.id == expense_id,
             Account.user_id == current_user.id
-        ).first()
+        ))
+        expense = result.scalars().first()
 
         if not expense:
             logger.warning(f"Expense with ID {expense_id} not found for user {current_user.username}")
@@ -136,58 +481,61 @@ async def update_expense(
                 detail="Expense not found or access denied"
             )
 
-        old_account = db.query(Account).filter(Account.id == expense.account_id).first()
-
+        old_account_id = expense.account_id
         old_amount = expense.amount
         new_amount = update_data.get("amount", old_amount)
 
-        account_changed = update_data["account_id"] != expense.account_id
+        account_changed = update_data["account_id"] != old_account_id
 
         if account_changed:
-            new_account = db.query(Account).filter(
-                Account.id == update_data["account_id"],
-                Account.user_id == current_user.id
-            ).first()
+            balance = await adjust_account_balance(db, update_data["account_id"], -new_amount,
+                                                   user_id=current_user.id)
 
-            if not new_account:
+            if balance is None:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail="New account not found or doesn't belong to user"
                 )
 
-            old_account.balance += old_amount
-            new_account.balance -= new_amount
-
-            db.add(old_account)
-            db.add(new_account)
-
-            final_account = new_account
+            old_account_balance = await adjust_account_balance(db, old_account_id, old_amount)
         else:
-            balance_difference = new_amount - old_amount
-            old_account.balance -= balance_difference
-
-            db.add(old_account)
+            balance = await adjust_account_balance(db, old_account_id, old_amount - new_amount)
 
-            final_account = old_account
+        await apply_rollup_delta(db, expense.account_id, expense.category_id, expense.timestamp, -old_amount, -1)
 
         for key, value in update_data.items():
             setattr(expense, key, value)
 
+        await apply_rollup_delta(db, expense.account_id, expense.category_id, expense.timestamp, expense.amount, 1)
+
         db.add(expense)
-        db.commit()
+        await db.commit()
+        await bump_account_versions(old_account_id, expense.account_id)
+        await bump_user_versions(current_user.id, "accounts")
+        if account_changed:
+            await publish_balance_change(current_user.id, old_account_id, old_account_balance, old_amount,
+                                         "expense.update")
+            await publish_balance_change(current_user.id, expense.account_id, balance, -new_amount, "expense.update")
+        else:
+            await publish_balance_change(current_user.id, expense.account_id, balance, old_amount - new_amount,
+                                         "expense.update")
+        await db.refresh(expense)
 
         logger.info(
             f"Expense '{expense.description}' (ID: {expense_id}) updated for user {current_user.username}. "
-            f"Account '{final_account.name}' balance updated to {final_account.balance}"
+            f"Account {expense.account_id} balance updated to {balance}"
         )
 
         return ExpenseResponseWithBalance.model_validate({
             **expense.__dict__,
-            "account_balance": final_account.balance
+            "balance": balance
         })
+    except HTTPException:
+        await db.rollback()
+        raise
     except Exception as e:
-        db.rollback()
         logger.exception(f"Failed to update expense with ID {expense_id} for user {current_user.username}: {e}")
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to update expense"
@@ -195,36 +543,35 @@ async def update_expense(
 
 
 @router.delete("/{expense_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_expense(expense_id: int, current_user: User = Depends(get_current_user),
-                         db: Session = Depends(get_db)):
+async def delete_expense(expense_id: str, current_user: UserPrincipal = Depends(get_current_user),
+                         db: AsyncSession = Depends(get_async_db)):
     try:
-        expense = db.query(Expense).filter(Expense.id == expense_id).first()
+        result = await db.execute(select(Expense).join(Account).filter(
+            Expense.id == expense_id,
+            Account.user_id == current_user.id
+        ))
+        expense = result.scalars().first()
 
         if not expense:
             logger.warning(f"Expense with ID {expense_id} not found for user {current_user.username}")
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Expense not found")
 
-        account = db.query(Account).filter(
-            Account.id == expense.account_id,
-            Account.user_id == current_user.id
-        ).first()
-
-        if not account:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Account not found or doesn't belong to user"
-            )
-
-        account.balance += expense.amount
+        balance = await adjust_account_balance(db, expense.account_id, expense.amount)
 
-        db.delete(expense)
-        db.add(account)
-        db.commit()
+        await apply_rollup_delta(db, expense.account_id, expense.category_id, expense.timestamp, -expense.amount, -1)
+        await db.delete(expense)
+        await db.commit()
+        await bump_account_versions(expense.account_id)
+        await bump_user_versions(current_user.id, "accounts")
+        await publish_balance_change(current_user.id, expense.account_id, balance, expense.amount, "expense.delete")
 
         logger.info(f"Expense '{expense.description}' deleted for user {current_user.username}. "
-                    f"Account '{account.name}' balance updated to {account.balance}")
+                    f"Account {expense.account_id} balance updated to {balance}")
+    except HTTPException:
+        await db.rollback()
+        raise
     except Exception as e:
-        db.rollback()
         logger.exception(f"Failed to delete expense with ID {expense_id} for user {current_user.username}: {e}")
+        await db.rollback()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                             detail="Failed to delete expense")
@@ -1,7 +1,7 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from decimal import Decimal
 from datetime import date, datetime
-from typing import Optional
+from typing import Literal, Optional
 
 
 class ExpenseBase(BaseModel):
@@ -49,16 +49,101 @@ class ExpenseFilters(BaseModel):
     max_amount: Optional[Decimal] = None
 
 
+class ExpenseExportParams(ExpenseFilters):
+    format: Literal["csv", "ndjson"] = "csv"
+
+
+class ExpenseSearchParams(ExpenseFilters):
+    q: str = Field(min_length=1, max_length=200)
+    limit: int = Field(20, ge=1, le=100)
+    offset: int = Field(0, ge=0)
+
+
 class ExpenseQueryParams(BaseModel):
     page: int = 1
     per_page: int = 10
     sort_order: Optional[str] = "desc"
+    cursor: Optional[str] = None
+    include_total: bool = False
     filters: ExpenseFilters
 
 
 class ExpensePaginatedResponse(BaseModel):
     items: list[ExpenseResponse]
-    total: int
+    total: Optional[int] = None
     filtered: int
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
 
     model_config = {"from_attributes": True}
+
+
+class ExpenseSummaryItem(BaseModel):
+    category_id: Optional[str] = None
+    year_month: Optional[str] = None
+    total: Decimal
+    count: int
+
+
+class ExpenseSummaryResponse(BaseModel):
+    account_id: str
+    total: Decimal
+    count: int
+    items: list[ExpenseSummaryItem]
+    by_category: list[ExpenseSummaryItem]
+    by_month: list[ExpenseSummaryItem]
+
+
+class ExpenseBulkError(BaseModel):
+    index: int
+    errors: list[str]
+
+
+class ExpenseBulkResponse(BaseModel):
+    inserted: int
+    failed: int
+    errors: list[ExpenseBulkError]
+
+
+class ExpenseSearchResponse(BaseModel):
+    items: list[ExpenseResponse]
+    q: str
+    limit: int
+    offset: int
+    has_more: bool
+
+
+class ExpenseSeriesPoint(BaseModel):
+    period: date
+    total: Decimal
+    count: int
+
+
+class ExpenseDailyPoint(ExpenseSeriesPoint):
+    rolling_7d: Decimal
+    rolling_30d: Decimal
+
+
+class ExpenseCategoryStats(BaseModel):
+    category_id: Optional[str] = None
+    count: int
+    total: Decimal
+    mean: Decimal
+    p50: Decimal
+    p90: Decimal
+    p95: Decimal
+    p99: Decimal
+    outlier_threshold: Decimal
+    outliers: int
+
+
+class ExpenseAnalyticsResponse(BaseModel):
+    account_id: str
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    total: Decimal
+    count: int
+    daily: list[ExpenseDailyPoint]
+    weekly: list[ExpenseSeriesPoint]
+    monthly: list[ExpenseSeriesPoint]
+    by_category: list[ExpenseCategoryStats]
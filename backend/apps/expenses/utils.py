@@ -1,21 +1,521 @@
-from .schema import ExpenseFilters
-from .models import Expense
+import io
+import re
+import csv
+import json
+import base64
+import codecs
+import hashlib
+import logging
+from collections import deque
+from datetime import date, datetime
+from decimal import Decimal
+from typing import AsyncIterator, Iterable, Optional
+
+import numpy as np
+from sqlalchemy import tuple_, func, select, delete, or_, cast, literal, Integer
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.cache import get_cache, account_version_key, response_caching_enabled
+from core.db import dialect_insert
+from core.responses import get_validators
+from core.settings import EXPENSE_BULK_MAX_ROW_SIZE
+from .schema import ExpenseFilters, ExpenseQueryParams
+from .models import Expense, ExpenseRollup
+
+logger = logging.getLogger(__name__)
 
 
 def build_expense_filters(filters: ExpenseFilters) -> list:
     expense_filters = [Expense.account_id == filters.account_id]
 
     field_mapping = {
-        "category_id": Expense.category_id == filters.category_id,
-        "name": Expense.name == filters.name,
-        "start_date": Expense.expense_date >= filters.start_date,
-        "end_date": Expense.expense_date <= filters.end_date,
-        "min_amount": Expense.amount >= filters.min_amount,
-        "max_amount": Expense.amount <= filters.max_amount
+        "category_id": lambda value: Expense.category_id == value,
+        "name": lambda value: Expense.name == value,
+        "start_date": lambda value: Expense.timestamp >= value,
+        "end_date": lambda value: Expense.timestamp <= value,
+        "min_amount": lambda value: Expense.amount >= value,
+        "max_amount": lambda value: Expense.amount <= value
     }
 
     for field, condition in field_mapping.items():
-        if getattr(filters, field) is not None:
-            expense_filters.append(condition)
+        value = getattr(filters, field)
+        if value is not None:
+            expense_filters.append(condition(value))
 
     return expense_filters
+
+
+_SEARCH_TERMS = re.compile(r'"([^"]*)"|([^\s"]+)')
+
+
+def parse_search_terms(q: str) -> list[tuple[str, bool]]:
+    """
+    Splits a search box query into (text, is_phrase) terms: "quoted text" is a phrase, anything else a word.
+    Terms without a single word character can't match anything and are dropped.
+    """
+    terms = []
+    for phrase, word in _SEARCH_TERMS.findall(q):
+        text = " ".join(phrase.split()) if phrase else word
+        if re.search(r"\w", text):
+            terms.append((text, bool(phrase)))
+    return terms
+
+
+def build_search_match(q: str, account_id: str) -> Optional[str]:
+    """
+    Turns a search box query into an FTS5 MATCH expression scoped to one account: words become prefix
+    queries on name and description, quoted text an exact phrase, and all terms must match. Every term is
+    quoted, so FTS5 operators and column filters typed by the user are matched literally.
+    """
+    terms = [f'{{name description}}: "{text}"' + ("" if is_phrase else "*")
+             for text, is_phrase in parse_search_terms(q)]
+    if not terms:
+        return None
+    return f'account_id: "{account_id.replace(chr(34), chr(34) * 2)}" ' + " ".join(terms)
+
+
+def build_search_like(q: str) -> list:
+    """
+    LIKE-based equivalent of build_search_match for databases without FTS5.
+    """
+    conditions = []
+    for text, _ in parse_search_terms(q):
+        pattern = "%" + text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        conditions.append(or_(Expense.name.ilike(pattern, escape="\\"),
+                              Expense.description.ilike(pattern, escape="\\")))
+    return conditions
+
+
+def encode_cursor(expense: Expense, direction: str) -> str:
+    payload = {"ts": expense.timestamp.isoformat(), "id": expense.id, "dir": direction}
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[date, str, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        direction = payload["dir"]
+        if direction not in ("next", "prev"):
+            raise ValueError(f"Unknown cursor direction {direction!r}")
+        return date.fromisoformat(payload["ts"]), str(payload["id"]), direction
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def build_keyset_filter(cursor: Optional[str], sort_order: str):
+    """
+    Returns the (timestamp, id) seek condition for a cursor and whether the page has to be read
+    backwards. Without a cursor there is nothing to seek past.
+    """
+    if cursor is None:
+        return None, False
+
+    timestamp, expense_id, direction = decode_cursor(cursor)
+    descending = sort_order == "desc"
+    # Walking "prev" over a descending listing is an ascending seek, and vice versa
+    backwards = direction == "prev"
+    key, bound = tuple_(Expense.timestamp, Expense.id), tuple_(timestamp, expense_id)
+    if descending != backwards:
+        return key < bound, backwards
+    return key > bound, backwards
+
+
+def to_year_month(timestamp: date) -> str:
+    return f"{timestamp.year:04d}-{timestamp.month:02d}"
+
+
+def _year_month_expr(db: AsyncSession):
+    if db.bind.dialect.name == "postgresql":
+        return func.to_char(Expense.timestamp, "YYYY-MM")
+    return func.strftime("%Y-%m", Expense.timestamp)
+
+
+async def apply_rollup_delta(db: AsyncSession, account_id: str, category_id: Optional[str], timestamp: date,
+                             amount: Decimal, count: int):
+    """
+    Adds amount/count to the (account, category, month) rollup inside the caller's transaction.
+    """
+    insert = dialect_insert(db)
+    stmt = insert(ExpenseRollup).values(
+        account_id=account_id,
+        category_id=category_id or "",
+        year_month=to_year_month(timestamp),
+        total=amount,
+        count=count,
+    )
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[ExpenseRollup.account_id, ExpenseRollup.category_id, ExpenseRollup.year_month],
+        set_={
+            "total": ExpenseRollup.total + stmt.excluded.total,
+            "count": ExpenseRollup.count + stmt.excluded.count,
+            "updated_at": func.now(),
+        },
+    ))
+
+
+async def rebuild_rollups(db: AsyncSession, account_id: Optional[str] = None) -> int:
+    """
+    Recomputes rollups from the expenses table, for one account or for all of them.
+    """
+    year_month = _year_month_expr(db)
+    grouped = (select(Expense.account_id,
+                      func.coalesce(Expense.category_id, ""),
+                      year_month,
+                      func.sum(Expense.amount),
+                      func.count())
+               .group_by(Expense.account_id, Expense.category_id, year_month))
+    clear = delete(ExpenseRollup)
+    if account_id is not None:
+        grouped = grouped.filter(Expense.account_id == account_id)
+        clear = clear.filter(ExpenseRollup.account_id == account_id)
+
+    await db.execute(clear)
+    result = await db.execute(dialect_insert(db)(ExpenseRollup).from_select(
+        ["account_id", "category_id", "year_month", "total", "count"], grouped))
+    return result.rowcount
+
+
+UNIX_EPOCH = date(1970, 1, 1)
+ROLLING_WINDOWS = (7, 30)
+PERCENTILES = (50, 90, 95, 99)
+
+
+def epoch_day_expr(db: AsyncSession):
+    """
+    Expense.timestamp as whole days since 1970-01-01, so the database hands back plain integers.
+    """
+    if db.bind.dialect.name == "postgresql":
+        return Expense.timestamp - literal(UNIX_EPOCH)
+    return cast(func.julianday(Expense.timestamp) - 2440587.5, Integer)
+
+
+def cents_expr():
+    # Integer cents instead of Numeric, which would be converted to a Decimal per row
+    return cast(func.round(Expense.amount * 100), Integer)
+
+
+def epoch_day(day: date) -> int:
+    return (day - UNIX_EPOCH).days
+
+
+def to_analytics_columns(rows: list) -> tuple[np.ndarray, np.ndarray, np.ndarray, list]:
+    """
+    (epoch day, cents, category_id) rows as column arrays. Categories come back as integer codes into the
+    returned list of category ids, so they can be grouped without comparing strings (or None).
+    """
+    # fromiter per column avoids unpacking a million rows as arguments to zip()
+    days = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    cents = np.fromiter((row[1] for row in rows), dtype=np.int64, count=len(rows))
+    codes: dict = {}
+    category_codes = np.fromiter((codes.setdefault(row[2], len(codes)) for row in rows), dtype=np.int64,
+                                 count=len(rows))
+    return days, cents, category_codes, list(codes)
+
+
+def _money(cents: np.ndarray) -> list[Decimal]:
+    return [Decimal(value).scaleb(-2) for value in np.rint(cents).astype(np.int64).tolist()]
+
+
+def _series(starts: np.ndarray, totals: np.ndarray, counts: np.ndarray) -> list[dict]:
+    return [{"period": period, "total": total, "count": count}
+            for period, total, count in zip(starts.astype("datetime64[D]").tolist(), _money(totals),
+                                            counts.tolist())]
+
+
+def _category_stats(cents: np.ndarray, category_codes: np.ndarray, category_ids: list) -> list[dict]:
+    # After a stable sort by code each category is one contiguous slice of cents
+    order = np.argsort(category_codes, kind="stable")
+    cents, category_codes = cents[order], category_codes[order]
+    boundaries = np.flatnonzero(category_codes[1:] != category_codes[:-1]) + 1
+    starts, stops = np.concatenate(([0], boundaries)), np.concatenate((boundaries, [len(cents)]))
+
+    stats = []
+    for start, stop in zip(starts.tolist(), stops.tolist()):
+        group = cents[start:stop]
+        q25, q75, *percentiles = np.percentile(group, (25, 75) + PERCENTILES)
+        # Tukey's upper fence: expenses above it are unusually large for their category
+        fence = q75 + 1.5 * (q75 - q25)
+        total, mean, threshold, *percentiles = _money(np.array([group.sum(), group.mean(), fence, *percentiles]))
+        stats.append({
+            "category_id": category_ids[category_codes[start]],
+            "count": stop - start,
+            "total": total,
+            "mean": mean,
+            **{f"p{percentile}": value for percentile, value in zip(PERCENTILES, percentiles)},
+            "outlier_threshold": threshold,
+            "outliers": int(np.count_nonzero(group > fence)),
+        })
+    stats.sort(key=lambda item: item["total"], reverse=True)
+    return stats
+
+
+def compute_expense_analytics(days: np.ndarray, cents: np.ndarray, category_codes: np.ndarray,
+                              category_ids: list, start_day: int, end_day: int) -> dict:
+    """
+    Spend series and per-category stats from the columns of to_analytics_columns(). Every day from
+    start_day to end_day gets a point, including days without expenses. Rolling averages are trailing means
+    of daily spend over the days in range, weeks start on Monday and months on the 1st.
+    """
+    day_numbers = np.arange(start_day, end_day + 1)
+    offsets = days - start_day
+    daily_cents = np.bincount(offsets, weights=cents, minlength=len(day_numbers))
+    daily_counts = np.bincount(offsets, minlength=len(day_numbers))
+
+    cumulative = np.concatenate(([0.0], np.cumsum(daily_cents)))
+    position = np.arange(1, len(day_numbers) + 1)
+    rolling = [_money((cumulative[position] - cumulative[np.maximum(position - window, 0)])
+                      / np.minimum(position, window))
+               for window in ROLLING_WINDOWS]
+
+    # Day 0 was a Thursday, so shifting by 3 makes every week number start on a Monday
+    weeks = (day_numbers + 3) // 7
+    week_index = weeks - weeks[0]
+    week_starts = np.unique(weeks) * 7 - 3
+    months = day_numbers.astype("datetime64[D]").astype("datetime64[M]")
+    month_index = (months - months[0]).astype(np.int64)
+    month_starts = np.unique(months)
+
+    daily = _series(day_numbers, daily_cents, daily_counts)
+    for point, rolling_7d, rolling_30d in zip(daily, *rolling):
+        point["rolling_7d"], point["rolling_30d"] = rolling_7d, rolling_30d
+
+    return {
+        "start_date": day_numbers[0].astype("datetime64[D]").item(),
+        "end_date": day_numbers[-1].astype("datetime64[D]").item(),
+        "total": _money(np.array([cents.sum()]))[0],
+        "count": len(cents),
+        "daily": daily,
+        "weekly": _series(week_starts, np.bincount(week_index, weights=daily_cents),
+                          np.bincount(week_index, weights=daily_counts).astype(np.int64)),
+        "monthly": _series(month_starts, np.bincount(month_index, weights=daily_cents),
+                           np.bincount(month_index, weights=daily_counts).astype(np.int64)),
+        "by_category": _category_stats(cents, category_codes, category_ids) if len(cents) else [],
+    }
+
+
+BULK_CONTENT_TYPES = {
+    "application/json": "json",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+    "text/csv": "csv",
+}
+
+
+class BulkFormatError(ValueError):
+    pass
+
+
+async def _iter_text(stream: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    async for chunk in stream:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+async def _iter_lines(stream: AsyncIterator[bytes], keepends: bool = False) -> AsyncIterator[str]:
+    buffer = ""
+    async for text in _iter_text(stream):
+        buffer += text
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line + "\n" if keepends else line
+    if buffer:
+        yield buffer
+
+
+class _LineFeed:
+    """
+    Lines pushed as they arrive, pulled by a csv.reader. Running dry only ends the reader's current
+    iteration, so the same reader keeps its state and resumes once more lines are pushed.
+    """
+
+    def __init__(self):
+        self._lines: deque[str] = deque()
+
+    def push(self, line: str):
+        self._lines.append(line)
+
+    def __bool__(self) -> bool:
+        return bool(self._lines)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if not self._lines:
+            raise StopIteration
+        return self._lines.popleft()
+
+
+async def _iter_csv_rows(stream: AsyncIterator[bytes]) -> AsyncIterator[list]:
+    feed = _LineFeed()
+    reader = csv.reader(feed)
+    quotes = 0
+    async for line in _iter_lines(stream, keepends=True):
+        feed.push(line)
+        # An odd number of quotes so far means a quoted field continues on the next line
+        quotes += line.count('"')
+        if quotes % 2:
+            continue
+        quotes = 0
+        for values in reader:
+            yield values
+
+    if feed:
+        raise BulkFormatError("Unterminated quoted field at the end of the CSV body")
+
+
+async def _iter_json_array(stream: AsyncIterator[bytes]) -> AsyncIterator[object]:
+    decoder = json.JSONDecoder()
+    buffer, started, finished = "", False, False
+    async for text in _iter_text(stream):
+        buffer += text
+        position = 0
+        while True:
+            while position < len(buffer) and (buffer[position].isspace() or (started and buffer[position] == ",")):
+                position += 1
+            if position >= len(buffer):
+                break
+            if not started:
+                if buffer[position] != "[":
+                    raise BulkFormatError("Expected a JSON array of expenses")
+                started, position = True, position + 1
+                continue
+            if buffer[position] == "]":
+                finished, position = True, len(buffer)
+                break
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError as e:
+                # The object may continue in the next chunk, but each retry decodes it from its start again,
+                # so give up once it is larger than any genuine expense
+                if len(buffer) - position > EXPENSE_BULK_MAX_ROW_SIZE:
+                    raise BulkFormatError(f"Malformed JSON array element: {e.msg}")
+                break
+            yield item
+        buffer = buffer[position:]
+
+    if not finished:
+        raise BulkFormatError("Truncated or malformed JSON array")
+
+
+async def iter_bulk_rows(stream: AsyncIterator[bytes], body_format: str) -> AsyncIterator[tuple[int, object]]:
+    """
+    Yields (index, raw row) pairs from a request body as it arrives. NDJSON lines that are not valid JSON
+    are yielded as BulkFormatError instances so they can be reported per row.
+    """
+    index = 0
+    async for row in _iter_bulk_items(stream, body_format):
+        yield index, row
+        index += 1
+
+
+async def _iter_bulk_items(stream: AsyncIterator[bytes], body_format: str) -> AsyncIterator[object]:
+    if body_format == "json":
+        async for item in _iter_json_array(stream):
+            yield item
+    elif body_format == "ndjson":
+        async for line in _iter_lines(stream):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                yield BulkFormatError(f"Invalid JSON: {e.msg}")
+    elif body_format == "csv":
+        header = None
+        async for values in _iter_csv_rows(stream):
+            if not any(value.strip() for value in values):
+                continue
+            if header is None:
+                header = [column.strip() for column in values]
+                continue
+            yield {column: value for column, value in zip(header, values) if value != ""}
+    else:
+        raise BulkFormatError(f"Unsupported body format {body_format!r}")
+
+
+EXPORT_COLUMNS = (
+    Expense.id, Expense.account_id, Expense.category_id, Expense.name, Expense.amount, Expense.description,
+    Expense.timestamp, Expense.created_at, Expense.updated_at,
+)
+EXPORT_MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+def _export_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def export_header(export_format: str) -> str:
+    if export_format == "csv":
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow([column.key for column in EXPORT_COLUMNS])
+        return buffer.getvalue()
+    return ""
+
+
+def serialize_export_rows(rows: Iterable, export_format: str) -> str:
+    buffer = io.StringIO()
+    if export_format == "csv":
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow(["" if value is None else _export_value(value) for value in row])
+    else:
+        keys = [column.key for column in EXPORT_COLUMNS]
+        for row in rows:
+            buffer.write(json.dumps({key: _export_value(value) for key, value in zip(keys, row)}))
+            buffer.write("\n")
+    return buffer.getvalue()
+
+
+async def get_listing_validators(user_id: str, query_data: ExpenseQueryParams,
+                                 fields: Iterable[str] = ()) -> Optional[dict]:
+    return await get_validators([account_version_key(query_data.filters.account_id)],
+                                variant=f"{user_id}|{query_data.model_dump_json()}|{','.join(fields)}")
+
+
+async def get_listing_cache_key(user_id: str, query_data: ExpenseQueryParams,
+                                fields: Iterable[str] = ()) -> Optional[str]:
+    """
+    Cache key for one expense listing and field selection. It embeds the account's current version, so any
+    mutation that bumps the version makes previously cached pages unreachable instead of stale.
+    """
+    if not response_caching_enabled():
+        return None
+    try:
+        version = await get_cache().get_version(account_version_key(query_data.filters.account_id))
+    except Exception as e:
+        logger.warning(f"Expense listing cache unavailable: {e}")
+        return None
+
+    digest = hashlib.sha256(f"{query_data.model_dump_json()}|{','.join(fields)}".encode()).hexdigest()
+    return f"expenses:{user_id}:{query_data.filters.account_id}:{version}:{digest}"
+
+
+async def get_cached_listing(key: Optional[str]) -> Optional[bytes]:
+    if key is None:
+        return None
+    try:
+        return await get_cache().get(key)
+    except Exception as e:
+        logger.warning(f"Failed to read expense listing cache: {e}")
+        return None
+
+
+async def set_cached_listing(key: Optional[str], payload: bytes):
+    if key is None:
+        return
+    try:
+        await get_cache().set(key, payload)
+    except Exception as e:
+        logger.warning(f"Failed to write expense listing cache: {e}")
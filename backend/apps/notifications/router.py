@@ -0,0 +1,70 @@
+import logging
+from typing import Optional
+from fastapi import APIRouter, Depends, Query, WebSocket, status
+from sqlalchemy import asc, select
+
+from .schema import AccountBalance, BalanceSnapshot, NotificationTicket
+from .utils import hub, forward_messages, create_ticket, redeem_ticket
+from ..accounts.models import Account
+from ..user.utils import get_current_user, get_user_from_token
+from ..user.schema import UserPrincipal
+from core.db import AsyncSessionLocal
+from core.responses import dumps
+from core.settings import NOTIFY_TICKET_TTL_SECONDS
+
+router = APIRouter(prefix="/notifications", tags=["Notifications"])
+
+logger = logging.getLogger(__name__)
+
+
+@router.post("/ticket", status_code=status.HTTP_201_CREATED)
+async def create_notification_ticket(current_user: UserPrincipal = Depends(get_current_user)) -> NotificationTicket:
+    """
+    Issues a ticket for /notifications/ws?ticket=. Browsers cannot set headers on a WebSocket, and a query
+    string is logged, so the URL carries this short-lived single-use ticket instead of the access token.
+    """
+    logger.info(f"Issued a notification ticket for user {current_user.username}")
+    return NotificationTicket(ticket=create_ticket(current_user), expires_in=NOTIFY_TICKET_TTL_SECONDS)
+
+
+@router.websocket("/ws")
+async def notifications(websocket: WebSocket, ticket: Optional[str] = Query(None)):
+    """
+    Pushes the user's balance changes and balance alerts as JSON text messages, starting with the current
+    balance of every account. Authenticate with ?ticket= from POST /notifications/ticket or, for clients
+    that can set headers, an Authorization header. Clients that fall behind are closed with 1013 and should
+    reconnect.
+    """
+    authorization = websocket.headers.get("authorization", "")
+    token = authorization[7:] if authorization.lower().startswith("bearer ") else None
+
+    # The session is only held while authenticating and reading balances, not for the whole connection
+    async with AsyncSessionLocal() as db:
+        if ticket:
+            principal = await redeem_ticket(ticket, db)
+        else:
+            principal = await get_user_from_token(token, db) if token else None
+        if principal is None:
+            logger.warning("Rejected notification connection with invalid credentials")
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+
+        # Subscribe before reading, so no change committed in between is missed
+        subscription = hub.subscribe(principal.id)
+        try:
+            result = await db.execute(select(Account.id, Account.balance).filter(
+                Account.user_id == principal.id).order_by(asc(Account.created_at)))
+            snapshot = BalanceSnapshot(accounts=[AccountBalance(account_id=account_id, balance=balance)
+                                                 for account_id, balance in result])
+        except Exception:
+            hub.unsubscribe(subscription)
+            raise
+
+    try:
+        await websocket.accept()
+        await websocket.send_text(dumps(snapshot).decode())
+        logger.info(f"Notification connection opened for user {principal.username}")
+        await forward_messages(websocket, subscription)
+    finally:
+        hub.unsubscribe(subscription)
+        logger.info(f"Notification connection closed for user {principal.username}")
@@ -0,0 +1,34 @@
+from pydantic import BaseModel
+from decimal import Decimal
+from typing import Literal
+
+
+class NotificationTicket(BaseModel):
+    ticket: str
+    expires_in: int
+
+
+class AccountBalance(BaseModel):
+    account_id: str
+    balance: Decimal
+
+
+class BalanceSnapshot(BaseModel):
+    type: Literal["balances"] = "balances"
+    accounts: list[AccountBalance]
+
+
+class BalanceChanged(BaseModel):
+    type: Literal["balance"] = "balance"
+    account_id: str
+    balance: Decimal
+    delta: Decimal
+    source: str
+
+
+class BalanceAlert(BaseModel):
+    type: Literal["alert"] = "alert"
+    alert: Literal["negative_balance", "low_balance"]
+    account_id: str
+    balance: Decimal
+    threshold: Decimal
@@ -0,0 +1,130 @@
+import logging
+import secrets
+from datetime import timedelta
+from decimal import Decimal
+from typing import Optional
+
+import anyio
+from fastapi import WebSocket, status
+from jose import jwt
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.cache import TTLCache
+from core.db import defer_until_commit
+from core.pubsub import PubSubHub, Subscription
+from core.responses import dumps
+from core.settings import NOTIFY_QUEUE_SIZE, NOTIFY_TICKET_TTL_SECONDS, BALANCE_LOW_THRESHOLD, SECRET_KEY, ALGORITHM
+from .schema import BalanceAlert, BalanceChanged
+from ..accounts.utils import CENT
+from ..user.models import User
+from ..user.schema import UserPrincipal
+from ..user.utils import create_access_token
+
+logger = logging.getLogger(__name__)
+
+hub = PubSubHub(queue_size=NOTIFY_QUEUE_SIZE)
+
+TICKET_AUDIENCE = "notifications"
+_redeemed_tickets = TTLCache(maxsize=100_000, ttl=NOTIFY_TICKET_TTL_SECONDS)
+
+
+def create_ticket(principal: UserPrincipal) -> str:
+    """
+    A single-use token that only opens a notification connection and expires after NOTIFY_TICKET_TTL_SECONDS.
+    It ends up in the WebSocket URL, and from there in access logs, so it must not be an access token.
+    """
+    return create_access_token({"sub": principal.email, "aud": TICKET_AUDIENCE, "jti": secrets.token_urlsafe(16)},
+                               expires_delta=timedelta(seconds=NOTIFY_TICKET_TTL_SECONDS))
+
+
+async def redeem_ticket(ticket: str, db: AsyncSession) -> Optional[UserPrincipal]:
+    # Access tokens have no audience, and tickets are rejected by get_current_user for having one
+    try:
+        payload = jwt.decode(ticket, SECRET_KEY, algorithms=[ALGORITHM], audience=TICKET_AUDIENCE,
+                             options={"require_aud": True, "require_jti": True})
+    except jwt.JWTError as e:
+        logger.warning(f"Rejected notification ticket: {e}")
+        return None
+
+    # Single use is enforced per process, which is enough for a ticket that expires within seconds
+    if _redeemed_tickets.get(payload["jti"]) is not None:
+        logger.warning("Rejected a notification ticket that was already used")
+        return None
+    _redeemed_tickets.set(payload["jti"], True)
+
+    result = await db.execute(select(User).filter(User.email == payload.get("sub")))
+    user = result.scalars().first()
+    return UserPrincipal.model_validate(user) if user is not None else None
+
+
+def _balance_alerts(account_id: str, balance: Decimal, previous: Decimal) -> list[BalanceAlert]:
+    # Alerts fire when the balance crosses a threshold, not on every change while it stays below
+    thresholds = [("negative_balance", Decimal("0.00"))]
+    if BALANCE_LOW_THRESHOLD is not None:
+        thresholds.append(("low_balance", BALANCE_LOW_THRESHOLD))
+    return [BalanceAlert(alert=alert, account_id=account_id, balance=balance, threshold=threshold)
+            for alert, threshold in thresholds if balance < threshold <= previous]
+
+
+async def publish_balance_change(user_id: str, account_id: str, balance: Optional[Decimal], delta: Decimal,
+                                 source: str):
+    """
+    Sends the account's new balance to the user's open connections, with an alert when the change took it
+    below zero or below BALANCE_LOW_THRESHOLD. Inside a batch it waits until the batch commits.
+    """
+    if defer_until_commit(publish_balance_change, user_id, account_id, balance, delta, source):
+        return
+    if balance is None or not delta:
+        return
+    delta = delta.quantize(CENT)
+
+    try:
+        alerts = _balance_alerts(account_id, balance, balance - delta)
+        for alert in alerts:
+            logger.info(f"Account {account_id} balance {balance} crossed {alert.alert} threshold {alert.threshold}")
+
+        if hub.has_subscribers(user_id):
+            hub.publish(user_id, dumps(BalanceChanged(account_id=account_id, balance=balance, delta=delta,
+                                                      source=source)).decode())
+            for alert in alerts:
+                hub.publish(user_id, dumps(alert).decode())
+    except Exception as e:
+        logger.error(f"Failed to publish balance change for account {account_id}: {e}")
+
+
+async def forward_messages(websocket: WebSocket, subscription: Subscription):
+    """
+    Sends the subscription's messages until the client disconnects or is dropped for falling behind.
+    """
+    async with anyio.create_task_group() as task_group:
+        async def send():
+            while True:
+                message = await subscription.get()
+                if message is None:
+                    await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER,
+                                          reason="Too many undelivered messages")
+                    break
+                await websocket.send_text(message)
+            task_group.cancel_scope.cancel()
+
+        async def receive():
+            # Messages from the client are ignored, reading is how a disconnect is noticed
+            while (await websocket.receive())["type"] != "websocket.disconnect":
+                pass
+            task_group.cancel_scope.cancel()
+
+        task_group.start_soon(send)
+        task_group.start_soon(receive)
+
+
+def collect_notification_stats() -> list:
+    stats = hub.stats()
+    return [
+        ("devotion_notification_subscribers", "gauge", "Open notification connections.",
+         [({}, stats["subscribers"])]),
+        ("devotion_notification_published_total", "counter", "Notification messages published.",
+         [({}, stats["published"])]),
+        ("devotion_notification_dropped_total", "counter", "Connections dropped for falling behind.",
+         [({}, stats["dropped"])]),
+    ]
@@ -2,12 +2,14 @@ import logging
 from sqlite3 import IntegrityError
 
 from fastapi import APIRouter, Depends, HTTPException, Body, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from core.db import get_db
-from .schema import UserCreate, Token, UserUpdateSchema, PasswordChangeSchema
+from core.db import get_async_db
+from .schema import UserCreate, Token, UserUpdateSchema, PasswordChangeSchema, UserPrincipal
 from .models import User
-from .utils import hash_password, authenticate_user, create_access_token, get_current_user
+from .utils import hash_password_async, authenticate_user, create_access_token, get_current_user, \
+    invalidate_user_principal
 
 router = APIRouter(prefix="/user", tags=["User"])
 
@@ -15,8 +17,9 @@ logger = logging.getLogger(__name__)
 
 
 @router.post("/register")
-async def create_user(user_data: UserCreate, db: Session = Depends(get_db)):
-    if db.query(User).filter(User.email == user_data.email).first():
+async def create_user(user_data: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(User).filter(User.email == user_data.email))
+    if result.scalars().first():
         logger.warning(f"User with email {user_data.email} already exists")
         raise HTTPException(status_code=400, detail="Email already exists")
 
@@ -24,7 +27,7 @@ async def create_user(user_data: UserCreate, db: Session = Depends(get_db)):
         new_user = User(
             username=user_data.username,
             email=user_data.email,
-            hashed_password=hash_password(user_data.password),
+            hashed_password=await hash_password_async(user_data.password),
             first_name=user_data.first_name,
             last_name=user_data.last_name,
             avatar=user_data.avatar,
@@ -32,13 +35,13 @@ async def create_user(user_data: UserCreate, db: Session = Depends(get_db)):
         )
 
         db.add(new_user)
-        db.commit()
+        await db.commit()
 
         logger.info(f"User {user_data.username} created successfully")
         return {"message": "User created successfully", "user_id": new_user.id}
     except IntegrityError as e:
-        db.rollback()
         logger.exception(f"Integrity error while creating user {user_data.username}: {e}")
+        await db.rollback()
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already exists")
 
 
@@ -46,9 +49,9 @@ async def create_user(user_data: UserCreate, db: Session = Depends(get_db)):
 async def login_using_password(
         email: str = Body(embed=True),
         password: str = Body(embed=True),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
-    user = authenticate_user(db, email, password)
+    user = await authenticate_user(db, email, password)
 
     if not user:
         logger.warning(f"Incorrect email or password for email: {email}")
@@ -77,7 +80,7 @@ async def login_using_password(
 
 
 @router.get("/me")
-async def read_current_user(current_user: User = Depends(get_current_user)):
+async def read_current_user(current_user: UserPrincipal = Depends(get_current_user)):
     logger.info(f"Current user: {current_user.username} with role {current_user.role}")
     return {
         "email": current_user.email,
@@ -87,24 +90,27 @@ async def read_current_user(current_user: User = Depends(get_current_user)):
 
 
 @router.delete("/me")
-async def delete_current_user(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def delete_current_user(current_user: UserPrincipal = Depends(get_current_user),
+                              db: AsyncSession = Depends(get_async_db)):
     user_id = current_user.id
 
     try:
-        db.delete(current_user)
-        db.commit()
+        user = await db.get(User, user_id)
+        await db.delete(user)
+        await db.commit()
+        invalidate_user_principal(user_id)
         logger.info(f"User {user_id} deleted successfully")
         return {"message": "Account deleted successfully"}
     except Exception as e:
-        db.rollback()
         logger.exception(f"Failed to delete user {user_id}: {e}")
+        await db.rollback()
         raise HTTPException(status_code=500, detail="Failed to delete user")
 
 
 @router.put("/me")
 async def update_current_user(user_data: UserUpdateSchema,
-                              current_user: User = Depends(get_current_user),
-                              db: Session = Depends(get_db)):
+                              current_user: UserPrincipal = Depends(get_current_user),
+                              db: AsyncSession = Depends(get_async_db)):
     update_data = user_data.model_dump(exclude_unset=True)
 
     if not update_data:
@@ -112,36 +118,44 @@ async def update_current_user(user_data: UserUpdateSchema,
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No update data provided")
 
     try:
+        user = await db.get(User, current_user.id)
         for key, value in update_data.items():
-            setattr(current_user, key, value)
+            setattr(user, key, value)
 
-        db.commit()
-        logger.info(f"User {current_user.username} updated successfully")
-        return {"message": "User updated successfully", "user": current_user}
+        await db.commit()
+        await db.refresh(user)
+        invalidate_user_principal(user.id)
+        logger.info(f"User {user.username} updated successfully")
+        return {"message": "User updated successfully", "user": UserPrincipal.model_validate(user)}
     except Exception as e:
-        db.rollback()
         logger.exception(f"Failed to update user {current_user.username}: {e}")
+        await db.rollback()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to update user")
 
 
 @router.put("/me/password")
 async def change_password(password_data: PasswordChangeSchema,
-                          current_user: User = Depends(get_current_user),
-                          db: Session = Depends(get_db)):
+                          current_user: UserPrincipal = Depends(get_current_user),
+                          db: AsyncSession = Depends(get_async_db)):
     try:
-        if not authenticate_user(db, current_user.email, password_data.current_password):
+        user = await authenticate_user(db, current_user.email, password_data.current_password)
+        if not user:
             logger.warning(f"Failed password change attempt for user {current_user.username}")
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Current password is incorrect")
 
         if password_data.current_password == password_data.new_password:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="New password must be different than the current password")
 
-        current_user.hashed_password = hash_password(password_data.new_password)
-        db.commit()
+        user.hashed_password = await hash_password_async(password_data.new_password)
+        await db.commit()
+        invalidate_user_principal(user.id)
 
         logger.info(f"Password changed successfully for user {current_user.username}")
         return {"message": "Password changed successfully"}
+    except HTTPException:
+        await db.rollback()
+        raise
     except Exception as e:
-        db.rollback()
         logger.exception(f"Failed to change password for user {current_user.username}: {e}")
+        await db.rollback()
         raise HTTPException(status_code=500, detail="Failed to change password")
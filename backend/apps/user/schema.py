@@ -11,6 +11,12 @@ class UserBase(BaseModel):
     role: Optional[str] = "user"
 
 
+class UserPrincipal(UserBase):
+    avatar: Optional[str] = None
+
+    model_config = {"from_attributes": True, "frozen": True}
+
+
 class UserCreate(BaseModel):
     username: str
     email: str
@@ -1,20 +1,38 @@
+import time
+import asyncio
 import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
 from typing import Annotated, Optional
 from datetime import timedelta, datetime, timezone
 from jose import jwt
 from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update, case
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import Depends, Request, Response, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 
-from core.settings import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
-from core.db import get_db
+from core.settings import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, AUTH_PRINCIPAL_CACHE_SIZE, \
+    AUTH_PRINCIPAL_CACHE_TTL_SECONDS, AUTH_BCRYPT_ROUNDS, AUTH_HASH_EXECUTOR, AUTH_HASH_WORKERS, \
+    AUTH_HASH_QUEUE_TIMEOUT_SECONDS, ACTIVITY_FLUSH_INTERVAL_SECONDS
+from core.cache import TTLCache
+from core.workers import BoundedExecutor, WorkerPoolBusy
+from core.db import get_async_db, get_batch
 from .models import User
-from core.db import SessionLocal
+from .schema import UserPrincipal
+from core.db import AsyncSessionLocal
 
 logger = logging.getLogger(__name__)
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=AUTH_BCRYPT_ROUNDS)
+password_executor = BoundedExecutor("password-hasher", kind=AUTH_HASH_EXECUTOR, max_workers=AUTH_HASH_WORKERS,
+                                    queue_timeout=AUTH_HASH_QUEUE_TIMEOUT_SECONDS)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
+principal_cache = TTLCache(maxsize=AUTH_PRINCIPAL_CACHE_SIZE, ttl=AUTH_PRINCIPAL_CACHE_TTL_SECONDS)
+_resolved_principal: ContextVar[Optional[tuple[str, UserPrincipal]]] = ContextVar("resolved_principal", default=None)
+# Per-user generations are stamped from one shared clock, so a lookup can snapshot the clock before it knows whose
+# token it is resolving and still tell afterwards whether that user was invalidated in the meantime.
+_principal_clock = 0
+_principal_generations: dict[str, int] = {}
 
 
 def hash_password(password: str) -> str:
@@ -25,25 +43,62 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
-def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
+def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+async def run_password_job(fn, *args):
     try:
-        user = db.query(User).filter(User.email == email).first()
+        return await password_executor.run(fn, *args)
+    except WorkerPoolBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many authentication requests, please retry",
+            headers={"Retry-After": "1"},
+        )
+
+
+async def hash_password_async(password: str) -> str:
+    return await run_password_job(hash_password, password)
+
+
+async def authenticate_user(db: AsyncSession, email: str, password: str) -> Optional[User]:
+    try:
+        result = await db.execute(select(User).filter(User.email == email))
+        user = result.scalars().first()
         if not user:
             logger.warning(f"User with email {email} not found.")
             return None
 
-        if not verify_password(password, user.hashed_password):
+        verified, new_hash = await run_password_job(verify_and_update_password, password, user.hashed_password)
+        if not verified:
             logger.warning(f"Password verification failed for user {email}.")
             return None
 
+        if new_hash:
+            await rehash_password(db, user, new_hash)
+
         logger.info(f"User {email} authenticated successfully.")
         return user
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error during user authentication: {e}")
         return None
 
 
+async def rehash_password(db: AsyncSession, user: User, new_hash: str):
+    try:
+        user.hashed_password = new_hash
+        await db.commit()
+        logger.info(f"Password hash for user {user.email} upgraded to {AUTH_BCRYPT_ROUNDS} rounds.")
+    except Exception as e:
+        logger.warning(f"Failed to upgrade password hash for user {user.id}: {e}")
+        await db.rollback()
+        await db.refresh(user)
+
+
 def create_access_token(data: dict, expires_delta=None) -> str:
     to_encode = data.copy()
     if expires_delta:
@@ -60,7 +115,17 @@ def create_access_token(data: dict, expires_delta=None) -> str:
         raise ValueError("Could not create access token") from e
 
 
-def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], db: Session = Depends(get_db)) -> User:
+async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)],
+                           db: AsyncSession = Depends(get_async_db)) -> UserPrincipal:
+    resolved = _resolved_principal.get()
+    if resolved is not None and resolved[0] == token:
+        return resolved[1]
+
+    principal = get_cached_principal(token)
+    if principal is not None:
+        return principal
+    started_at = _principal_clock
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
@@ -71,14 +136,18 @@ def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], db: Session
                 headers={"WWW-Authenticate": "Bearer"},
             )
 
-        user = db.query(User).filter(User.email == email).first()
+        result = await db.execute(select(User).filter(User.email == email))
+        user = result.scalars().first()
         if user is None:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="User not found",
                 headers={"WWW-Authenticate": "Bearer"},
             )
-        return user
+
+        principal = UserPrincipal.model_validate(user)
+        cache_principal(token, principal, payload.get("exp"), started_at)
+        return principal
     except jwt.JWTError as e:
         logger.error(f"JWT error: {e}")
         raise HTTPException(
@@ -88,10 +157,180 @@ def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], db: Session
         )
 
 
+@contextmanager
+def resolved_principal(token: str, principal: UserPrincipal):
+    """
+    Within the block, get_current_user returns principal for token without decoding or looking it up again.
+    """
+    reset_token = _resolved_principal.set((token, principal))
+    try:
+        yield
+    finally:
+        _resolved_principal.reset(reset_token)
+
+
+def get_cached_principal(token: str) -> Optional[UserPrincipal]:
+    entry = principal_cache.get(token)
+    if entry is None:
+        return None
+    principal, generation = entry
+    if generation != _principal_generations.get(principal.id, 0):
+        principal_cache.pop(token)
+        return None
+    return principal
+
+
+def cache_principal(token: str, principal: UserPrincipal, expires_at: Optional[int], started_at: int):
+    """
+    Caches principal unless its user was invalidated after started_at, i.e. while the lookup was in flight.
+    """
+    generation = _principal_generations.get(principal.id, 0)
+    if generation > started_at:
+        logger.debug(f"Skipped caching principal for user {principal.id}, invalidated during lookup")
+        return
+    ttl = None
+    if expires_at is not None:
+        ttl = expires_at - datetime.now(timezone.utc).timestamp()
+        if ttl <= 0:
+            return
+    principal_cache.set(token, (principal, generation), ttl=ttl)
+
+
+def invalidate_user_principal(user_id: str):
+    global _principal_clock
+    _principal_clock += 1
+    _principal_generations[user_id] = _principal_clock
+    dropped = principal_cache.discard_where(lambda entry: entry[0].id == user_id)
+    logger.debug(f"Dropped {dropped} cached principals for user {user_id}")
+
+
+def get_principal_cache_stats() -> dict:
+    return principal_cache.stats()
+
+
+def collect_principal_cache_stats() -> list:
+    stats = get_principal_cache_stats()
+    return [
+        ("devotion_auth_principal_cache_hits_total", "counter", "Tokens resolved from the principal cache.",
+         [({}, stats["hits"])]),
+        ("devotion_auth_principal_cache_misses_total", "counter", "Tokens decoded and looked up in the database.",
+         [({}, stats["misses"])]),
+        ("devotion_auth_principal_cache_entries", "gauge", "Principals currently cached.",
+         [({}, stats["size"])]),
+    ]
+
+
+class ActivityBuffer:
+    """
+    Write-behind buffer for users.last_activity. Requests only record a timestamp in memory; a background
+    task merges them per user and writes each batch as one bulk UPDATE ... CASE statement.
+    """
+    BATCH_SIZE = 500
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.flush_seconds_total = 0.0
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self._pending: dict[str, datetime] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, user_id: str, timestamp: datetime):
+        previous = self._pending.get(user_id)
+        if previous is None or timestamp > previous:
+            self._pending[user_id] = timestamp
+
+    async def flush(self) -> int:
+        if not self._pending:
+            return 0
+
+        pending, self._pending = self._pending, {}
+        items = list(pending.items())
+        started = time.perf_counter()
+        try:
+            async with AsyncSessionLocal() as db:
+                for offset in range(0, len(items), self.BATCH_SIZE):
+                    batch = dict(items[offset:offset + self.BATCH_SIZE])
+                    await db.execute(
+                        update(User)
+                        .where(User.id.in_(batch.keys()))
+                        .values(last_activity=case(batch, value=User.id))
+                        .execution_options(synchronize_session=False)
+                    )
+                await db.commit()
+        except Exception as e:
+            for user_id, timestamp in pending.items():
+                self.record(user_id, timestamp)
+            logger.warning(f"Failed to flush {len(pending)} last activity updates: {e}")
+            return 0
+
+        elapsed = time.perf_counter() - started
+        self.flushes += 1
+        self.flushed_rows += len(items)
+        self.flush_seconds_total += elapsed
+        self.last_flush_seconds = elapsed
+        self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+        logger.debug(f"Flushed last activity for {len(items)} users in {elapsed * 1000:.1f} ms")
+        return len(items)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "flushes": self.flushes,
+            "flushed_rows": self.flushed_rows,
+            "flush_seconds_total": self.flush_seconds_total,
+            "last_flush_seconds": self.last_flush_seconds,
+            "max_flush_seconds": self.max_flush_seconds,
+        }
+
+
+activity_buffer = ActivityBuffer(interval=ACTIVITY_FLUSH_INTERVAL_SECONDS)
+
+
+def collect_activity_stats() -> list:
+    stats = activity_buffer.stats()
+    return [
+        ("devotion_activity_pending", "gauge", "Users with a last activity update waiting to be flushed.",
+         [({}, stats["pending"])]),
+        ("devotion_activity_flushes_total", "counter", "Last activity flushes written.",
+         [({}, stats["flushes"])]),
+        ("devotion_activity_flushed_rows_total", "counter", "User rows updated by last activity flushes.",
+         [({}, stats["flushed_rows"])]),
+        ("devotion_activity_flush_seconds_total", "counter", "Time spent writing last activity flushes.",
+         [({}, stats["flush_seconds_total"])]),
+        ("devotion_activity_last_flush_seconds", "gauge", "Duration of the most recent flush.",
+         [({}, stats["last_flush_seconds"])]),
+        ("devotion_activity_max_flush_seconds", "gauge", "Slowest flush since startup.",
+         [({}, stats["max_flush_seconds"])]),
+    ]
+
+
 async def user_activity_middleware(request: Request, call_next):
     response: Response = await call_next(request)
 
-    if response.status_code != 200:
+    # Batch sub-requests are covered by the activity of the batch request itself
+    if response.status_code != 200 or get_batch() is not None:
         return response
 
     try:
@@ -104,37 +343,44 @@ async def user_activity_middleware(request: Request, call_next):
 
         if auth_header and last_activity_updated < datetime.now(timezone.utc) - timedelta(minutes=1):
             token = auth_header.split(" ")[1]
-            db = SessionLocal()
-            try:
-                user = get_user_from_token(token, db)
-                if user:
-                    user.last_activity = datetime.now(timezone.utc)
-                    db.commit()
-
-                    response.set_cookie(
-                        key="Last-Activity",
-                        value=str(int(datetime.now(timezone.utc).timestamp())),
-                        max_age=5 * 60,
-                        httponly=True,
-                    )
-            finally:
-                db.close()
-            logger.info("User's last activity updated successfully.")
+            async with AsyncSessionLocal() as db:
+                user = await get_user_from_token(token, db)
+            if user:
+                activity_buffer.record(user.id, datetime.now(timezone.utc))
+
+                response.set_cookie(
+                    key="Last-Activity",
+                    value=str(int(datetime.now(timezone.utc).timestamp())),
+                    max_age=5 * 60,
+                    httponly=True,
+                )
+                logger.debug(f"Queued last activity update for user {user.id}.")
     except Exception as e:
         logger.warning(f"Failed to update user's activity: {e}")
 
     return response
 
 
-def get_user_from_token(token: str, db: Session):
+async def get_user_from_token(token: str, db: AsyncSession) -> Optional[UserPrincipal]:
+    principal = get_cached_principal(token)
+    if principal is not None:
+        return principal
+    started_at = _principal_clock
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
         if email is None:
             return None
 
-        user = db.query(User).filter(User.email == email).first()
-        return user
+        result = await db.execute(select(User).filter(User.email == email))
+        user = result.scalars().first()
+        if user is None:
+            return None
+
+        principal = UserPrincipal.model_validate(user)
+        cache_principal(token, principal, payload.get("exp"), started_at)
+        return principal
     except jwt.JWTError as e:
         logger.error(f"JWT error: {e}")
         return None
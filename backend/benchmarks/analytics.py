@@ -0,0 +1,138 @@
+"""
+Benchmark for GET /expenses/analytics on a single large account.
+
+Seeds one account with --expenses rows spread over three years, then reports the endpoint's latency over
+ASGI along with a breakdown of one run: the columnar query, building the arrays, the NumPy computation
+and JSON encoding. For comparison it also times the daily/weekly/monthly series and category percentiles
+computed with plain Python loops over the same rows.
+
+    cd backend
+    python -m benchmarks.analytics --expenses 1000000 --requests 10
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import logging
+import argparse
+import tempfile
+import statistics
+from datetime import timedelta
+
+from benchmarks.api import BENCH_PASSWORD, BenchRequest, call_asgi, insert_accounts, insert_categories, \
+    insert_expenses, insert_users, percentile
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--expenses", type=int, default=1_000_000, help="expenses in the benchmarked account")
+    parser.add_argument("--categories", type=int, default=12)
+    parser.add_argument("--requests", type=int, default=10, help="sequential requests to the endpoint")
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args()
+
+
+def python_reference(rows: list) -> dict:
+    """
+    The same series and category percentiles as compute_expense_analytics, with dicts and sorted lists.
+    """
+    from apps.expenses.utils import UNIX_EPOCH, ROLLING_WINDOWS, PERCENTILES
+
+    daily, weekly, monthly, by_category = {}, {}, {}, {}
+    for day, cents, category_id in rows:
+        daily[day] = daily.get(day, 0) + cents
+        weekly[(day + 3) // 7] = weekly.get((day + 3) // 7, 0) + cents
+        month = (UNIX_EPOCH + timedelta(days=day)).strftime("%Y-%m")
+        monthly[month] = monthly.get(month, 0) + cents
+        by_category.setdefault(category_id, []).append(cents)
+
+    first, last = min(daily), max(daily)
+    series = [daily.get(day, 0) for day in range(first, last + 1)]
+    rolling = {window: [sum(series[max(0, i - window + 1):i + 1]) / min(i + 1, window) for i in range(len(series))]
+               for window in ROLLING_WINDOWS}
+    percentiles = {}
+    for category_id, amounts in by_category.items():
+        quantiles = statistics.quantiles(sorted(amounts), n=100, method="inclusive")
+        percentiles[category_id] = [quantiles[p - 1] for p in PERCENTILES]
+    return {"daily": series, "rolling": rolling, "weekly": weekly, "monthly": monthly, "percentiles": percentiles}
+
+
+async def breakdown(account_id: str) -> dict:
+    from sqlalchemy import select
+    from core.db import AsyncSessionLocal
+    from core.responses import dumps
+    from apps.expenses.models import Expense
+    from apps.expenses.utils import epoch_day_expr, cents_expr, to_analytics_columns, compute_expense_analytics
+
+    timings = {}
+    async with AsyncSessionLocal() as db:
+        started = time.perf_counter()
+        result = await db.execute(select(epoch_day_expr(db), cents_expr(), Expense.category_id)
+                                  .filter(Expense.account_id == account_id))
+        rows = result.all()
+        timings["query"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    days, cents, category_codes, category_ids = to_analytics_columns(rows)
+    timings["arrays"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    analytics = compute_expense_analytics(days, cents, category_codes, category_ids, int(days.min()),
+                                          int(days.max()))
+    timings["numpy"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    dumps(analytics)
+    timings["encode"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    python_reference(rows)
+    timings["python_reference"] = time.perf_counter() - started
+    return timings
+
+
+async def main() -> int:
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix="devotion-analytics-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'analytics.db')}"
+
+    from main import create_app
+    from core.db import Base, engine, import_all_db_models
+    from apps.user.utils import hash_password
+
+    logging.disable(logging.CRITICAL)
+    import_all_db_models()
+    Base.metadata.create_all(bind=engine)
+    app = create_app()
+
+    async with app.router.lifespan_context(app):
+        started = time.perf_counter()
+        user = insert_users(hash_password(BENCH_PASSWORD), 1, "analytics")[0]
+        accounts = insert_accounts([user], 1)
+        categories = [category_id for _, _, category_id in insert_categories(accounts, args.categories)]
+        insert_expenses(random.Random(args.seed), accounts, {accounts[0][1]: categories}, args.expenses)
+        print(f"Seeded {args.expenses} expenses in {time.perf_counter() - started:.1f} s")
+
+        account_id = accounts[0][1]
+        request = BenchRequest("GET", "/expenses/analytics", user, query={"account_id": account_id})
+        latencies = []
+        for _ in range(args.requests):
+            started = time.perf_counter()
+            status_code = await call_asgi(app, request)
+            latencies.append(time.perf_counter() - started)
+            if status_code != 200:
+                print(f"GET /expenses/analytics answered {status_code}")
+                return 1
+
+        latencies.sort()
+        print(f"GET /expenses/analytics: p50 {percentile(latencies, 0.50) * 1000:.0f} ms, "
+              f"p95 {percentile(latencies, 0.95) * 1000:.0f} ms over {args.requests} requests")
+
+        for stage, seconds in (await breakdown(account_id)).items():
+            print(f"  {stage:<18}{seconds * 1000:>10.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
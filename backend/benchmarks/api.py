@@ -0,0 +1,456 @@
+"""
+In-process load benchmark for every API endpoint.
+
+Builds the app with main.create_app() against a temporary SQLite file, seeds users, accounts,
+categories and expenses with bulk inserts, then drives each endpoint over ASGI (no sockets, no
+HTTP client) at a fixed concurrency and reports p50/p95/p99 latency and req/s per endpoint.
+
+    cd backend
+    python -m benchmarks.api --expenses 100000 --concurrency 20 --requests 200 --output bench.json
+    python -m benchmarks.api --only expenses. --baseline bench.json --tolerance 0.25
+
+With --baseline the run exits non-zero when an endpoint's p95 grew, or its throughput dropped,
+by more than the tolerance.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import asyncio
+import logging
+import argparse
+import platform
+import tempfile
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Optional
+from urllib.parse import urlencode
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BENCH_PASSWORD = "bench-password"
+EXPENSE_WORDS = ("coffee", "groceries", "rent", "fuel", "cinema", "pharmacy", "restaurant", "books", "gym", "taxi",
+                 "electricity", "internet", "flowers", "bakery", "parking", "insurance")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--accounts-per-user", type=int, default=2)
+    parser.add_argument("--categories-per-account", type=int, default=6)
+    parser.add_argument("--expenses", type=int, default=50_000, help="expenses spread over all accounts")
+    parser.add_argument("--concurrency", type=int, default=20, help="concurrent in-flight requests")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    parser.add_argument("--only", action="append", default=[], help="only endpoints whose name contains this")
+    parser.add_argument("--log-level", default="ERROR", help="application log level during the run")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="compare against a JSON file written by --output")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed relative regression of p95 latency and req/s against the baseline")
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args()
+
+
+@dataclass
+class BenchUser:
+    id: str
+    email: str
+    token: str
+    accounts: list[str] = field(default_factory=list)
+    categories: list[str] = field(default_factory=list)
+    expenses: list[str] = field(default_factory=list)
+
+
+@dataclass
+class BenchContext:
+    users: list[BenchUser]
+    password_hash: str
+    rng: random.Random
+    victims: dict[str, list] = field(default_factory=dict)
+
+    def user(self, i: int) -> BenchUser:
+        return self.users[i % len(self.users)]
+
+    def victim(self, endpoint: str, i: int):
+        """
+        The i-th record created for a destructive endpoint by its prepare step.
+        """
+        return self.victims[endpoint][i]
+
+
+@dataclass
+class BenchRequest:
+    method: str
+    path: str
+    user: Optional[BenchUser] = None
+    json: object = None
+    body: Optional[bytes] = None
+    content_type: Optional[str] = None
+    query: Optional[dict] = None
+
+
+@dataclass
+class Endpoint:
+    name: str
+    build: Callable[[BenchContext, int], BenchRequest]
+    prepare: Optional[Callable[[BenchContext, int], list]] = None
+
+
+def _token_for(user_id: str, email: str) -> str:
+    from apps.user.utils import create_access_token
+    return create_access_token(data={"sub": email, "user_id": user_id, "role": "user"})
+
+
+def insert_users(ctx_hash: str, count: int, prefix: str) -> list[BenchUser]:
+    from sqlalchemy import insert
+    from core.db import engine
+    from apps.user.models import User
+
+    users = []
+    for _ in range(count):
+        user_id = str(uuid.uuid4())
+        email = f"{prefix}-{user_id[:8]}@devotion.local"
+        users.append(BenchUser(id=user_id, email=email, token=_token_for(user_id, email)))
+
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"id": user.id, "username": user.email.split("@")[0], "email": user.email,
+                                     "hashed_password": ctx_hash, "role": "user"} for user in users])
+    return users
+
+
+def insert_accounts(owners: list[BenchUser], per_owner: int) -> list[tuple[BenchUser, str]]:
+    from sqlalchemy import insert
+    from core.db import engine
+    from apps.accounts.models import Account, AccountOpeningBalance
+
+    rows = [(owner, str(uuid.uuid4())) for owner in owners for _ in range(per_owner)]
+    with engine.begin() as conn:
+        conn.execute(insert(Account), [{"id": account_id, "user_id": owner.id, "account_type": "spending",
+                                        "name": f"Bench {account_id[:8]}", "balance": 2000, "currency": "EUR"}
+                                       for owner, account_id in rows])
+        conn.execute(insert(AccountOpeningBalance), [{"account_id": account_id, "amount": 2000}
+                                                     for _, account_id in rows])
+    return rows
+
+
+def insert_categories(accounts: list[tuple[BenchUser, str]], per_account: int) -> list[tuple[BenchUser, str, str]]:
+    from sqlalchemy import insert
+    from core.db import engine
+    from apps.categories.models import Category
+
+    rows = [(owner, account_id, str(uuid.uuid4())) for owner, account_id in accounts for _ in range(per_account)]
+    with engine.begin() as conn:
+        conn.execute(insert(Category), [{"id": category_id, "user_id": owner.id, "account_id": account_id,
+                                         "name": f"Category {category_id[:8]}", "is_active": True}
+                                        for owner, account_id, category_id in rows])
+    return rows
+
+
+def insert_expenses(rng: random.Random, accounts: list[tuple[BenchUser, str]], categories: dict[str, list[str]],
+                    count: int, chunk_size: int = 10_000) -> list[tuple[BenchUser, str]]:
+    from sqlalchemy import insert
+    from core.db import engine
+    from apps.expenses.models import Expense
+
+    start = date.today() - timedelta(days=3 * 365)
+    created = []
+    with engine.begin() as conn:
+        for offset in range(0, count, chunk_size):
+            rows = []
+            for i in range(offset, min(offset + chunk_size, count)):
+                owner, account_id = accounts[i % len(accounts)]
+                expense_id = str(uuid.uuid4())
+                account_categories = categories.get(account_id)
+                rows.append({"id": expense_id, "account_id": account_id,
+                             "category_id": rng.choice(account_categories) if account_categories else None,
+                             "amount": rng.randint(100, 20_000) / 100,
+                             "name": f"{rng.choice(EXPENSE_WORDS)} {i}",
+                             "timestamp": start + timedelta(days=rng.randrange(3 * 365))})
+                created.append((owner, expense_id))
+            conn.execute(insert(Expense), rows)
+    return created
+
+
+async def seed(args) -> BenchContext:
+    from core.db import AsyncSessionLocal
+    from apps.user.utils import hash_password
+    from apps.expenses.utils import rebuild_rollups
+
+    rng = random.Random(args.seed)
+    password_hash = hash_password(BENCH_PASSWORD)
+    users = insert_users(password_hash, args.users, "bench")
+    accounts = insert_accounts(users, args.accounts_per_user)
+    for owner, account_id in accounts:
+        owner.accounts.append(account_id)
+
+    categories_by_account: dict[str, list[str]] = {}
+    for owner, account_id, category_id in insert_categories(accounts, args.categories_per_account):
+        owner.categories.append(category_id)
+        categories_by_account.setdefault(account_id, []).append(category_id)
+
+    for owner, expense_id in insert_expenses(rng, accounts, categories_by_account, args.expenses):
+        owner.expenses.append(expense_id)
+
+    async with AsyncSessionLocal() as db:
+        await rebuild_rollups(db)
+        await db.commit()
+
+    return BenchContext(users=users, password_hash=password_hash, rng=rng)
+
+
+def prepare_users(ctx: BenchContext, n: int) -> list[BenchUser]:
+    return insert_users(ctx.password_hash, n, "victim")
+
+
+def prepare_accounts(ctx: BenchContext, n: int) -> list[tuple[BenchUser, str]]:
+    return insert_accounts([ctx.user(i) for i in range(n)], 1)
+
+
+def prepare_categories(ctx: BenchContext, n: int) -> list[tuple[BenchUser, str, str]]:
+    return insert_categories([(owner, owner.accounts[0]) for owner in map(ctx.user, range(n))], 1)
+
+
+def prepare_expenses(ctx: BenchContext, n: int) -> list[tuple[BenchUser, str]]:
+    return [created for owner in map(ctx.user, range(n))
+            for created in insert_expenses(ctx.rng, [(owner, owner.accounts[0])], {}, 1)]
+
+
+def _expense_payload(ctx: BenchContext, user: BenchUser) -> dict:
+    return {"account_id": user.accounts[0], "name": "bench", "amount": f"{ctx.rng.randint(100, 5000) / 100:.2f}",
+            "timestamp": date.today().isoformat(), "category_id": user.categories[0] if user.categories else None}
+
+
+def _expense_of(ctx: BenchContext, i: int) -> str:
+    expenses = ctx.user(i).expenses
+    return expenses[(i // len(ctx.users)) % len(expenses)]
+
+
+def _bulk_body(ctx: BenchContext, user: BenchUser, rows: int = 100) -> bytes:
+    return "\n".join(json.dumps(_expense_payload(ctx, user)) for _ in range(rows)).encode()
+
+
+ENDPOINTS = [
+    Endpoint("user.me", lambda ctx, i: BenchRequest("GET", "/user/me", ctx.user(i))),
+    Endpoint("user.update", lambda ctx, i: BenchRequest("PUT", "/user/me", ctx.user(i),
+                                                        json={"first_name": f"Bench {i}"})),
+    Endpoint("user.login", lambda ctx, i: BenchRequest("POST", "/user/login", json={
+        "email": ctx.user(i).email, "password": BENCH_PASSWORD})),
+    Endpoint("user.register", lambda ctx, i: BenchRequest("POST", "/user/register", json={
+        "username": f"new{i}", "email": f"new-{uuid.uuid4().hex[:12]}@devotion.local", "password": BENCH_PASSWORD})),
+    Endpoint("user.change_password", lambda ctx, i: BenchRequest(
+        "PUT", "/user/me/password", ctx.victim("user.change_password", i),
+        json={"current_password": BENCH_PASSWORD, "new_password": f"{BENCH_PASSWORD}-{i}"}), prepare_users),
+    Endpoint("accounts.list", lambda ctx, i: BenchRequest("GET", "/accounts/", ctx.user(i))),
+    Endpoint("accounts.get", lambda ctx, i: BenchRequest("GET", f"/accounts/{ctx.user(i).accounts[0]}",
+                                                         ctx.user(i))),
+    Endpoint("accounts.balance", lambda ctx, i: BenchRequest("GET", f"/accounts/{ctx.user(i).accounts[0]}/balance",
+                                                             ctx.user(i))),
+    Endpoint("accounts.create", lambda ctx, i: BenchRequest("POST", "/accounts/", ctx.user(i), json={
+        "user_id": ctx.user(i).id, "name": f"New {i}", "account_type": "saving"})),
+    Endpoint("accounts.update", lambda ctx, i: BenchRequest("PUT", f"/accounts/{ctx.user(i).accounts[-1]}",
+                                                            ctx.user(i), json={"name": f"Renamed {i}"})),
+    Endpoint("categories.list", lambda ctx, i: BenchRequest("GET", "/categories/", ctx.user(i))),
+    Endpoint("categories.create", lambda ctx, i: BenchRequest("POST", "/categories/", ctx.user(i),
+                                                              json={"name": f"New {i}"})),
+    Endpoint("categories.update", lambda ctx, i: BenchRequest("PUT", f"/categories/{ctx.user(i).categories[-1]}",
+                                                              ctx.user(i), json={"name": f"Renamed {i}"})),
+    Endpoint("expenses.list", lambda ctx, i: BenchRequest("GET", "/expenses/", ctx.user(i), json={
+        "per_page": 50, "filters": {"account_id": ctx.user(i).accounts[i % 2 % len(ctx.user(i).accounts)]}})),
+    Endpoint("expenses.list_total", lambda ctx, i: BenchRequest("GET", "/expenses/", ctx.user(i), json={
+        "page": 1 + i % 10, "per_page": 50, "include_total": True,
+        "filters": {"account_id": ctx.user(i).accounts[0], "min_amount": i % 50}})),
+    Endpoint("expenses.summary", lambda ctx, i: BenchRequest("GET", "/expenses/summary", ctx.user(i),
+                                                             query={"account_id": ctx.user(i).accounts[0]})),
+    Endpoint("expenses.export", lambda ctx, i: BenchRequest("GET", "/expenses/export", ctx.user(i), query={
+        "account_id": ctx.user(i).accounts[0], "format": "ndjson"})),
+    Endpoint("expenses.search", lambda ctx, i: BenchRequest("GET", "/expenses/search", ctx.user(i), query={
+        "account_id": ctx.user(i).accounts[0], "q": EXPENSE_WORDS[i % len(EXPENSE_WORDS)][:3 + i % 3]})),
+    Endpoint("expenses.get", lambda ctx, i: BenchRequest("GET", f"/expenses/{_expense_of(ctx, i)}", ctx.user(i))),
+    Endpoint("expenses.create", lambda ctx, i: BenchRequest("POST", "/expenses/", ctx.user(i),
+                                                            json=_expense_payload(ctx, ctx.user(i)))),
+    Endpoint("expenses.bulk", lambda ctx, i: BenchRequest("POST", "/expenses/bulk", ctx.user(i),
+                                                          body=_bulk_body(ctx, ctx.user(i)),
+                                                          content_type="application/x-ndjson")),
+    Endpoint("expenses.update", lambda ctx, i: BenchRequest("PUT", f"/expenses/{_expense_of(ctx, i)}", ctx.user(i),
+                                                            json={"id": _expense_of(ctx, i), "name": f"updated {i}",
+                                                                  "account_id": ctx.user(i).accounts[0],
+                                                                  "amount": "12.34"})),
+    Endpoint("dashboard", lambda ctx, i: BenchRequest("GET", "/dashboard", ctx.user(i))),
+    Endpoint("batch.expenses", lambda ctx, i: BenchRequest("POST", "/batch", ctx.user(i), json={"operations": [
+        {"method": "POST", "path": "/expenses/", "body": _expense_payload(ctx, ctx.user(i))} for _ in range(10)]})),
+    Endpoint("metrics", lambda ctx, i: BenchRequest("GET", "/metrics")),
+    Endpoint("expenses.delete", lambda ctx, i: BenchRequest(
+        "DELETE", f"/expenses/{ctx.victim('expenses.delete', i)[1]}", ctx.victim("expenses.delete", i)[0]),
+        prepare_expenses),
+    Endpoint("categories.delete", lambda ctx, i: BenchRequest(
+        "DELETE", f"/categories/{ctx.victim('categories.delete', i)[2]}", ctx.victim("categories.delete", i)[0]),
+        prepare_categories),
+    Endpoint("accounts.delete", lambda ctx, i: BenchRequest(
+        "DELETE", f"/accounts/{ctx.victim('accounts.delete', i)[1]}", ctx.victim("accounts.delete", i)[0]),
+        prepare_accounts),
+    Endpoint("user.delete", lambda ctx, i: BenchRequest("DELETE", "/user/me", ctx.victim("user.delete", i)),
+             prepare_users),
+]
+
+
+async def call_asgi(app, request: BenchRequest) -> int:
+    """
+    Sends one request straight into the ASGI app and drains the response, returning its status code.
+    """
+    body = request.body if request.body is not None else (
+        json.dumps(request.json).encode() if request.json is not None else b"")
+    headers = [(b"host", b"bench")]
+    if request.user is not None:
+        headers.append((b"authorization", f"Bearer {request.user.token}".encode()))
+    if body:
+        headers.append((b"content-type", (request.content_type or "application/json").encode()))
+        headers.append((b"content-length", str(len(body)).encode()))
+
+    path = "/api" + request.path
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": request.method,
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": urlencode(request.query or {}).encode(), "headers": headers,
+        "client": ("127.0.0.1", 50000), "server": ("bench", 80),
+    }
+    received, finished = False, asyncio.Event()
+    status_code = 0
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status_code
+        if message["type"] == "http.response.start":
+            status_code = message["status"]
+
+    try:
+        await app(scope, receive, send)
+    finally:
+        finished.set()
+    return status_code
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))]
+
+
+async def run_endpoint(app, ctx: BenchContext, endpoint: Endpoint, requests: int, concurrency: int) -> dict:
+    if endpoint.prepare is not None:
+        ctx.victims[endpoint.name] = endpoint.prepare(ctx, requests)
+
+    built = [endpoint.build(ctx, i) for i in range(requests)]
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    statuses: dict[str, int] = {}
+
+    async def one(request: BenchRequest):
+        async with semaphore:
+            started = time.perf_counter()
+            status_code = await call_asgi(app, request)
+            latencies.append(time.perf_counter() - started)
+            statuses[str(status_code)] = statuses.get(str(status_code), 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(request) for request in built))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": sum(count for status_code, count in statuses.items() if int(status_code) >= 400),
+        "statuses": statuses,
+        "req_per_s": requests / elapsed,
+        "mean_ms": sum(latencies) / len(latencies) * 1000,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for name, current in results["endpoints"].items():
+        previous = baseline.get("endpoints", {}).get(name)
+        if previous is None:
+            continue
+        if current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {previous['p95_ms']:.2f} -> {current['p95_ms']:.2f} ms")
+        if current["req_per_s"] < previous["req_per_s"] * (1 - tolerance):
+            regressions.append(f"{name}: {previous['req_per_s']:.1f} -> {current['req_per_s']:.1f} req/s")
+        if current["errors"] > previous["errors"]:
+            regressions.append(f"{name}: errors {previous['errors']} -> {current['errors']}")
+    return regressions
+
+
+def print_results(results: dict):
+    meta = results["meta"]
+    print(f"{meta['users']} users, {meta['expenses']} expenses, {meta['requests']} requests per endpoint, "
+          f"concurrency {meta['concurrency']}")
+    print(f"{'endpoint':<24}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for name, r in results["endpoints"].items():
+        print(f"{name:<24}{r['req_per_s']:>10.1f}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}"
+              f"{r['errors']:>8}")
+
+
+async def main() -> int:
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix="devotion-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.setdefault("METRICS_ENABLED", "true")
+
+    from main import create_app
+    from core.db import Base, engine, import_all_db_models
+
+    logging.disable(logging.getLevelName(args.log_level.upper()) - 1)
+    import_all_db_models()
+    Base.metadata.create_all(bind=engine)
+
+    app = create_app()
+    endpoints = [endpoint for endpoint in ENDPOINTS
+                 if not args.only or any(part in endpoint.name for part in args.only)]
+
+    results = {"meta": {"users": args.users, "accounts_per_user": args.accounts_per_user,
+                        "categories_per_account": args.categories_per_account, "expenses": args.expenses,
+                        "requests": args.requests, "concurrency": args.concurrency,
+                        "python": platform.python_version(),
+                        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds")},
+               "endpoints": {}}
+
+    async with app.router.lifespan_context(app):
+        seeding_started = time.perf_counter()
+        ctx = await seed(args)
+        results["meta"]["seed_seconds"] = time.perf_counter() - seeding_started
+
+        for endpoint in endpoints:
+            results["endpoints"][endpoint.name] = await run_endpoint(app, ctx, endpoint, args.requests,
+                                                                     args.concurrency)
+
+    print_results(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regressions beyond {args.tolerance:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print(f"\nNo regressions beyond {args.tolerance:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
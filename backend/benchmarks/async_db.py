@@ -0,0 +1,135 @@
+"""
+Concurrent-request benchmark for the database layer.
+
+Runs the expense listing query (page + count) from many concurrent coroutines, once through the
+blocking Session (how the routers used to call the database) and once through the AsyncSession,
+while a heartbeat task measures how late the event loop wakes it up.
+
+    cd backend
+    python -m benchmarks.async_db --expenses 50000 --concurrency 50 --requests 500
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import statistics
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--expenses", type=int, default=50_000, help="expenses seeded into the account")
+    parser.add_argument("--concurrency", type=int, default=50, help="concurrent in-flight requests")
+    parser.add_argument("--requests", type=int, default=500, help="total requests per scenario")
+    parser.add_argument("--per-page", type=int, default=50)
+    return parser.parse_args()
+
+
+def seed(engine, expenses: int) -> str:
+    import uuid
+    from datetime import date, timedelta
+    from sqlalchemy import insert
+    from apps.user.models import User
+    from apps.accounts.models import Account
+    from apps.expenses.models import Expense
+
+    user_id, account_id = str(uuid.uuid4()), str(uuid.uuid4())
+    with engine.begin() as conn:
+        conn.execute(insert(User).values(id=user_id, username="bench", email="bench@devotion.local",
+                                         hashed_password="x", role="user"))
+        conn.execute(insert(Account).values(id=account_id, user_id=user_id, account_type="spending",
+                                            name="Bench", balance=0, currency="EUR"))
+        start = date(2015, 1, 1)
+        conn.execute(insert(Expense), [
+            {"id": str(uuid.uuid4()), "account_id": account_id, "amount": i % 200 + 1,
+             "name": f"expense {i}", "timestamp": start + timedelta(days=i % 3650)}
+            for i in range(expenses)
+        ])
+    return account_id
+
+
+async def run_scenario(name: str, handler, requests: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, lags = [], []
+    done = asyncio.Event()
+
+    async def heartbeat():
+        while not done.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(0.005)
+            lags.append(time.perf_counter() - started - 0.005)
+
+    async def one_request():
+        async with semaphore:
+            started = time.perf_counter()
+            await handler()
+            latencies.append(time.perf_counter() - started)
+
+    ticker = asyncio.create_task(heartbeat())
+    started = time.perf_counter()
+    await asyncio.gather(*(one_request() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await ticker
+
+    latencies.sort()
+    lags.sort()
+    return {
+        "scenario": name,
+        "req_per_s": requests / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "loop_lag_p95_ms": lags[int(len(lags) * 0.95) - 1] * 1000 if lags else 0.0,
+        "loop_lag_max_ms": lags[-1] * 1000 if lags else 0.0,
+    }
+
+
+async def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix="devotion-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+
+    from sqlalchemy import select, func, desc
+    from core.db import Base, engine, async_engine, SessionLocal, AsyncSessionLocal, import_all_db_models
+    from apps.expenses.models import Expense
+
+    import_all_db_models()
+    Base.metadata.create_all(bind=engine)
+    account_id = seed(engine, args.expenses)
+
+    def listing():
+        filters = [Expense.account_id == account_id]
+        page = (select(Expense).filter(*filters).order_by(desc(Expense.timestamp))
+                .offset(args.per_page * 20).limit(args.per_page))
+        return page, select(func.count()).select_from(Expense).filter(*filters)
+
+    async def blocking_handler():
+        page, count = listing()
+        with SessionLocal() as db:
+            db.execute(page).scalars().all()
+            db.scalar(count)
+
+    async def async_handler():
+        page, count = listing()
+        async with AsyncSessionLocal() as db:
+            (await db.execute(page)).scalars().all()
+            await db.scalar(count)
+
+    results = [
+        await run_scenario("blocking Session", blocking_handler, args.requests, args.concurrency),
+        await run_scenario("AsyncSession", async_handler, args.requests, args.concurrency),
+    ]
+    await async_engine.dispose()
+
+    print(f"{args.expenses} expenses, {args.requests} requests, concurrency {args.concurrency}")
+    print(f"{'scenario':<18}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'lag p95 ms':>12}{'lag max ms':>12}")
+    for r in results:
+        print(f"{r['scenario']:<18}{r['req_per_s']:>10.1f}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}"
+              f"{r['loop_lag_p95_ms']:>12.2f}{r['loop_lag_max_ms']:>12.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
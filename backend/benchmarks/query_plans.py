@@ -0,0 +1,219 @@
+"""
+Query-plan check for every API endpoint.
+
+Seeds a temporary SQLite database like benchmarks.api, drives each endpoint over ASGI while recording
+the SQL it sends, then runs EXPLAIN QUERY PLAN on every recorded statement. A statement fails the
+check when SQLite plans a full scan of a table (SCAN <table>, with or without an index) or sorts
+through a temporary B-tree (USE TEMP B-TREE), unless the pair is listed in ACCEPTED_PLANS.
+
+    cd backend
+    python -m benchmarks.query_plans
+    python -m benchmarks.query_plans --only expenses. --verbose
+
+Exits non-zero when any statement fails, so it can gate index and query changes. tests/test_query_plans.py
+runs the same check against the test database.
+"""
+import os
+import re
+import sys
+import asyncio
+import logging
+import argparse
+import tempfile
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from types import SimpleNamespace
+from typing import Optional
+
+from benchmarks.api import ENDPOINTS, BenchContext, BenchRequest, Endpoint, call_asgi, seed
+
+FULL_SCAN = re.compile(r"^SCAN (?!CONSTANT ROW)\S+(?!.* VIRTUAL TABLE)")
+TEMP_SORT = re.compile(r"USE TEMP B-TREE")
+
+# (endpoint, plan detail fragment) -> why the plan is acceptable
+ACCEPTED_PLANS = {
+    ("expenses.search", "USE TEMP B-TREE FOR ORDER BY"):
+        "matches are ordered by bm25 rank, which only exists once FTS5 has found them",
+    ("categories.delete", "USE TEMP B-TREE FOR GROUP BY"):
+        "rebuilding one account's rollups groups by calendar month, which no index on timestamp can provide",
+    ("categories.delete", "USE TEMP B-TREE FOR DISTINCT"):
+        "the accounts to rebuild are deduplicated from the deleted category's expenses, found through their index",
+    ("accounts.create_spending", "SCAN category_templates"):
+        "every template is copied to the new account, and there are only a handful of them",
+}
+
+
+def parse_args(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--accounts-per-user", type=int, default=2)
+    parser.add_argument("--categories-per-account", type=int, default=6)
+    parser.add_argument("--expenses", type=int, default=20_000, help="expenses spread over all accounts")
+    parser.add_argument("--requests", type=int, default=2, help="requests per endpoint")
+    parser.add_argument("--only", action="append", default=[], help="only endpoints whose name contains this")
+    parser.add_argument("--verbose", action="store_true", help="print the plan of every statement")
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args(argv)
+
+
+def _cursor_for(ctx: BenchContext, i: int, direction: str) -> str:
+    from apps.expenses.utils import encode_cursor
+
+    anchor = SimpleNamespace(timestamp=date.today() - timedelta(days=365), id=ctx.user(i).expenses[0])
+    return encode_cursor(anchor, direction)
+
+
+def _listing(ctx: BenchContext, i: int, **filters) -> dict:
+    return {"per_page": 50, "filters": {"account_id": ctx.user(i).accounts[0], **filters}}
+
+
+# Listing shapes that the load benchmark does not exercise but that the filters and cursors allow
+PLAN_ENDPOINTS = [
+    Endpoint("expenses.list_category", lambda ctx, i: BenchRequest("GET", "/expenses/", ctx.user(i), json=_listing(
+        ctx, i, category_id=ctx.user(i).categories[0]))),
+    Endpoint("expenses.list_dates", lambda ctx, i: BenchRequest("GET", "/expenses/", ctx.user(i), json={
+        **_listing(ctx, i, start_date=(date.today() - timedelta(days=90)).isoformat(),
+                   end_date=date.today().isoformat()), "sort_order": "asc"})),
+    Endpoint("expenses.list_category_total", lambda ctx, i: BenchRequest("GET", "/expenses/", ctx.user(i), json={
+        **_listing(ctx, i, category_id=ctx.user(i).categories[0]), "include_total": True})),
+    Endpoint("expenses.list_next", lambda ctx, i: BenchRequest("GET", "/expenses/", ctx.user(i), json={
+        **_listing(ctx, i), "cursor": _cursor_for(ctx, i, "next")})),
+    Endpoint("expenses.list_prev", lambda ctx, i: BenchRequest("GET", "/expenses/", ctx.user(i), json={
+        **_listing(ctx, i), "cursor": _cursor_for(ctx, i, "prev")})),
+    Endpoint("expenses.summary_range", lambda ctx, i: BenchRequest("GET", "/expenses/summary", ctx.user(i), query={
+        "account_id": ctx.user(i).accounts[0], "start_date": (date.today() - timedelta(days=180)).isoformat()})),
+    Endpoint("expenses.export_category", lambda ctx, i: BenchRequest("GET", "/expenses/export", ctx.user(i), query={
+        "account_id": ctx.user(i).accounts[0], "category_id": ctx.user(i).categories[0], "format": "csv"})),
+    Endpoint("accounts.create_spending", lambda ctx, i: BenchRequest("POST", "/accounts/", ctx.user(i), json={
+        "user_id": ctx.user(i).id, "name": f"Spending {i}", "account_type": "spending"})),
+    Endpoint("expenses.analytics", lambda ctx, i: BenchRequest("GET", "/expenses/analytics", ctx.user(i), query={
+        "account_id": ctx.user(i).accounts[0], "start_date": (date.today() - timedelta(days=365)).isoformat()})),
+]
+
+_endpoint_name: ContextVar[Optional[str]] = ContextVar("endpoint_name", default=None)
+
+
+@dataclass
+class PlanCheck:
+    endpoint: str
+    statement: str
+    parameters: tuple
+    plan: list[str] = field(default_factory=list)
+    problems: list[str] = field(default_factory=list)
+    accepted: list[str] = field(default_factory=list)
+
+
+def record_statements(engines, captured: dict):
+    from sqlalchemy import event
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        name = _endpoint_name.get()
+        if name is None or executemany:
+            return
+        if statement.lstrip().split(None, 1)[0].upper() not in ("SELECT", "WITH", "UPDATE", "DELETE", "INSERT"):
+            return
+        captured.setdefault((name, statement), tuple(parameters or ()))
+
+    for target in {getattr(engine, "sync_engine", engine) for engine in engines}:
+        event.listen(target, "before_cursor_execute", before_cursor_execute)
+
+
+def explain(connection, statement: str, parameters: tuple) -> list[str]:
+    """
+    EXPLAIN QUERY PLAN rendered as indented lines, one per plan node.
+    """
+    rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+    depth = {0: -1}
+    lines = []
+    for node_id, parent_id, _, detail in rows:
+        depth[node_id] = depth.get(parent_id, -1) + 1
+        lines.append("  " * depth[node_id] + detail)
+    return lines
+
+
+def check_plan(check: PlanCheck):
+    for line in check.plan:
+        detail = line.strip()
+        if not (FULL_SCAN.match(detail) or TEMP_SORT.search(detail)):
+            continue
+        accepted = next((reason for (endpoint, fragment), reason in ACCEPTED_PLANS.items()
+                         if endpoint == check.endpoint and fragment in detail), None)
+        if accepted is None:
+            check.problems.append(detail)
+        else:
+            check.accepted.append(f"{detail} ({accepted})")
+
+
+def print_checks(checks: list[PlanCheck], verbose: bool):
+    for check in checks:
+        if not (verbose or check.problems):
+            continue
+        print(f"[{'FAIL' if check.problems else 'ok'}] {check.endpoint}")
+        print(f"    {' '.join(check.statement.split())}")
+        for line in check.plan:
+            print(f"      {line}")
+        for accepted in check.accepted:
+            print(f"    accepted: {accepted}")
+        print()
+
+    failed = [check for check in checks if check.problems]
+    endpoints = len({check.endpoint for check in checks})
+    print(f"{len(checks)} statements from {endpoints} endpoints checked, {len(failed)} with full scans "
+          f"or temp B-tree sorts")
+
+
+async def run_checks(args) -> list[PlanCheck]:
+    """
+    Seeds the configured database, drives the selected endpoints and checks the plan of every statement they sent.
+    """
+    from main import create_app
+    from core.db import Base, engine, async_engine, read_engine, import_all_db_models
+
+    import_all_db_models()
+    Base.metadata.create_all(bind=engine)
+
+    app = create_app()
+    endpoints = [endpoint for endpoint in ENDPOINTS + PLAN_ENDPOINTS
+                 if not args.only or any(part in endpoint.name for part in args.only)]
+
+    captured: dict[tuple[str, str], tuple] = {}
+    async with app.router.lifespan_context(app):
+        ctx = await seed(args)
+        record_statements((async_engine, read_engine), captured)
+
+        for endpoint in endpoints:
+            if endpoint.prepare is not None:
+                ctx.victims[endpoint.name] = endpoint.prepare(ctx, args.requests)
+            token = _endpoint_name.set(endpoint.name)
+            try:
+                for i in range(args.requests):
+                    status_code = await call_asgi(app, endpoint.build(ctx, i))
+                    if status_code >= 400:
+                        print(f"warning: {endpoint.name} answered {status_code}, its plans may be incomplete")
+            finally:
+                _endpoint_name.reset(token)
+
+    checks = [PlanCheck(name, statement, parameters) for (name, statement), parameters in captured.items()]
+    with engine.connect() as connection:
+        for check in checks:
+            check.plan = explain(connection, check.statement, check.parameters)
+            check_plan(check)
+    engine.dispose()
+    return checks
+
+
+async def main() -> int:
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix="devotion-plans-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'plans.db')}"
+
+    logging.disable(logging.CRITICAL)
+    checks = await run_checks(args)
+
+    print_checks(checks, args.verbose)
+    return 1 if any(check.problems for check in checks) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
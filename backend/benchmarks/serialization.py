@@ -0,0 +1,147 @@
+"""
+Micro-benchmark for serializing a page of expenses, without HTTP or the database in the timed loop.
+
+Loads the same expenses once as ORM objects and once as Core rows from a temporary SQLite file, then
+times only the step that turns them into a JSON body:
+
+    orm_fastapi        ExpenseResponse.model_validate per ORM object, then FastAPI's response_model
+                       validation and JSONResponse (how the list endpoints used to respond)
+    rows_type_adapter  Core rows validated in one pass by a TypeAdapter(list[ExpenseResponse]) built once,
+                       then encoded by the same adapter
+    rows_orjson        Core rows trusted as they come from the database and encoded with orjson
+                       (what the list endpoints do now)
+
+    cd backend
+    python -m benchmarks.serialization --rows 50 --rows 500 --repeat 200
+"""
+import os
+import time
+import argparse
+import tempfile
+import statistics
+from datetime import date, timedelta
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, action="append", help="page sizes to serialize (default 50 and 500)")
+    parser.add_argument("--repeat", type=int, default=200, help="timed serializations per variant and page size")
+    return parser.parse_args()
+
+
+def seed(count: int) -> str:
+    import uuid
+    from sqlalchemy import insert
+    from core.db import engine
+    from apps.user.models import User
+    from apps.accounts.models import Account
+    from apps.expenses.models import Expense
+
+    user_id, account_id = str(uuid.uuid4()), str(uuid.uuid4())
+    with engine.begin() as conn:
+        conn.execute(insert(User).values(id=user_id, username="bench", email="bench@devotion.local",
+                                         hashed_password="-", role="user"))
+        conn.execute(insert(Account).values(id=account_id, user_id=user_id, account_type="spending", name="Bench",
+                                            balance=2000, currency="EUR"))
+        conn.execute(insert(Expense), [{"account_id": account_id, "amount": (i % 9000 + 100) / 100,
+                                        "name": f"expense {i}", "description": f"bench row {i}" if i % 3 else None,
+                                        "timestamp": date(2024, 1, 1) + timedelta(days=i % 700)}
+                                       for i in range(count)])
+    return account_id
+
+
+def _run_inline(coroutine):
+    # serialize_response never awaits for async endpoints, so it can be driven without an event loop
+    try:
+        coroutine.send(None)
+    except StopIteration as stop:
+        return stop.value
+    raise RuntimeError("serialize_response suspended unexpectedly")
+
+
+# App modules are imported inside functions: core.db binds its engine to DATABASE_URL on import, and main()
+# points that at a scratch database first
+
+
+def orm_fastapi(expenses, response_field) -> bytes:
+    from apps.expenses.schema import ExpenseResponse
+
+    content = [ExpenseResponse.model_validate(expense) for expense in expenses]
+    serialized = _run_inline(serialize_response(field=response_field, response_content=content))
+    return JSONResponse(serialized).body
+
+
+def rows_type_adapter(rows, adapter) -> bytes:
+    from core.responses import rows_to_dicts
+
+    return adapter.dump_json(adapter.validate_python(rows_to_dicts(rows)))
+
+
+def rows_orjson(rows) -> bytes:
+    from core.responses import dumps, rows_to_dicts
+
+    return dumps(rows_to_dicts(rows))
+
+
+def measure(serialize, repeat: int) -> dict:
+    serialize()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        serialize()
+        timings.append(time.perf_counter() - started)
+    return {"mean_ms": statistics.fmean(timings) * 1000, "p95_ms": sorted(timings)[int(0.95 * (repeat - 1))] * 1000}
+
+
+def main():
+    args = parse_args()
+    page_sizes = args.rows or [50, 500]
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='devotion-ser-'), 'ser.db')}"
+
+    import orjson
+    from pydantic import TypeAdapter
+    from sqlalchemy import select
+    from fastapi.utils import create_model_field
+    from core.db import Base, engine, SessionLocal, import_all_db_models
+    from core.responses import response_columns
+    from apps.expenses.models import Expense
+    from apps.expenses.schema import ExpenseResponse
+
+    import_all_db_models()
+    Base.metadata.create_all(bind=engine)
+    account_id = seed(max(page_sizes))
+
+    adapter = TypeAdapter(list[ExpenseResponse])
+    response_field = create_model_field(name="Response_get_expenses", type_=list[ExpenseResponse],
+                                        mode="serialization")
+
+    print(f"{'rows':>6}  {'variant':<20}{'mean ms':>10}{'p95 ms':>10}{'speedup':>9}")
+    with SessionLocal() as db:
+        for size in page_sizes:
+            query = select(Expense).filter(Expense.account_id == account_id).order_by(Expense.timestamp).limit(size)
+            expenses = db.scalars(query).all()
+            rows = db.execute(select(*response_columns(Expense, ExpenseResponse)).filter(
+                Expense.account_id == account_id).order_by(Expense.timestamp).limit(size)).all()
+
+            variants = {
+                "orm_fastapi": lambda: orm_fastapi(expenses, response_field),
+                "rows_type_adapter": lambda: rows_type_adapter(rows, adapter),
+                "rows_orjson": lambda: rows_orjson(rows),
+            }
+            bodies = {name: orjson.loads(serialize()) for name, serialize in variants.items()}
+            if any(body != bodies["orm_fastapi"] for body in bodies.values()):
+                raise SystemExit(f"Serializers disagree on a page of {size} rows")
+
+            results = {name: measure(serialize, args.repeat) for name, serialize in variants.items()}
+            baseline = results["orm_fastapi"]["mean_ms"]
+            for name, result in results.items():
+                print(f"{size:>6}  {name:<20}{result['mean_ms']:>10.3f}{result['p95_ms']:>10.3f}"
+                      f"{baseline / result['mean_ms']:>8.1f}x")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
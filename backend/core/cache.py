@@ -0,0 +1,283 @@
+import time
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+from .db import defer_until_commit
+from .settings import CACHE_BACKEND, CACHE_URL, CACHE_TTL_SECONDS, CACHE_MAX_ENTRIES, WEB_CONCURRENCY
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """
+    Bounded in-process cache with per-entry expiry and least-recently-used eviction.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        if self.maxsize <= 0:
+            return
+
+        expires_at = time.monotonic() + (self.ttl if ttl is None else min(ttl, self.ttl))
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def discard_where(self, predicate: Callable[[Any], bool]) -> int:
+        with self._lock:
+            stale = [key for key, (_, value) in self._data.items() if predicate(value)]
+            for key in stale:
+                del self._data[key]
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._data), "maxsize": self.maxsize}
+
+
+class CacheBackend(ABC):
+    """
+    Interface for response caches. Values are encoded response bodies; versions are monotonically increasing
+    counters that are never evicted, so bumping one makes every key derived from the old value unreachable.
+    Counters restart when the backend loses its state, which also changes its epoch (the time counting
+    started), so (epoch, version) pairs are never reused. `shared` tells whether every worker process sees
+    the same counters.
+    """
+
+    shared = True
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        ...
+
+    @abstractmethod
+    async def get_version(self, key: str) -> int:
+        ...
+
+    @abstractmethod
+    async def bump_version(self, key: str) -> int:
+        ...
+
+    @abstractmethod
+    async def get_modified(self, key: str) -> Optional[float]:
+        """
+        When the version was last bumped, or None if it hasn't been in this epoch.
+        """
+
+    @abstractmethod
+    async def get_epoch(self) -> float:
+        ...
+
+    @abstractmethod
+    def stats(self) -> dict:
+        """
+        Counters for /metrics: always "backend", "hits" and "misses", plus "size" and "maxsize" when known.
+        """
+
+
+class MemoryCacheBackend(CacheBackend):
+    shared = False
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._versions: dict[str, int] = {}
+        self._modified: dict[str, float] = {}
+        self._epoch = time.time()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return self._entries.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        self._entries.set(key, value, ttl=ttl)
+
+    async def get_version(self, key: str) -> int:
+        return self._versions.get(key, 0)
+
+    async def bump_version(self, key: str) -> int:
+        self._versions[key] = self._versions.get(key, 0) + 1
+        self._modified[key] = time.time()
+        return self._versions[key]
+
+    async def get_modified(self, key: str) -> Optional[float]:
+        return self._modified.get(key)
+
+    async def get_epoch(self) -> float:
+        return self._epoch
+
+    def stats(self) -> dict:
+        return {"backend": "memory", **self._entries.stats()}
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Talks to anything that speaks the Redis protocol. Pass `client` to use an existing (or fake) asyncio
+    client, otherwise one is created from `url` with the optional `redis` package.
+    """
+
+    def __init__(self, url: Optional[str] = None, ttl: float = 300, prefix: str = "devotion:", client=None):
+        if client is None:
+            try:
+                import redis.asyncio as redis
+            except ImportError as e:
+                raise RuntimeError("CACHE_BACKEND=redis requires the 'redis' package") from e
+            client = redis.from_url(url)
+
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key: str) -> Optional[bytes]:
+        value = await self.client.get(self.prefix + key)
+        if value is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        # Clients created with decode_responses=True hand back str
+        return value.encode() if isinstance(value, str) else value
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        # Redis rejects a zero expiry
+        await self.client.set(self.prefix + key, value, px=max(1, int((self.ttl if ttl is None else ttl) * 1000)))
+
+    async def get_version(self, key: str) -> int:
+        return int(await self.client.get(self.prefix + key) or 0)
+
+    async def bump_version(self, key: str) -> int:
+        version = await self.client.incr(self.prefix + key)
+        await self.client.set(f"{self.prefix}{key}:modified", repr(time.time()))
+        return version
+
+    async def get_modified(self, key: str) -> Optional[float]:
+        value = await self.client.get(f"{self.prefix}{key}:modified")
+        return float(value) if value is not None else None
+
+    async def get_epoch(self) -> float:
+        # Created on first use; a flushed or restarted Redis gets a new one along with fresh counters
+        key = self.prefix + "epoch"
+        await self.client.set(key, repr(time.time()), nx=True)
+        return float(await self.client.get(key))
+
+    def stats(self) -> dict:
+        return {"backend": "redis", "hits": self.hits, "misses": self.misses}
+
+
+_cache_backend: Optional[CacheBackend] = None
+
+
+def get_cache() -> CacheBackend:
+    global _cache_backend
+    if _cache_backend is None:
+        if CACHE_BACKEND == "redis":
+            _cache_backend = RedisCacheBackend(url=CACHE_URL, ttl=CACHE_TTL_SECONDS)
+        elif CACHE_BACKEND == "memory":
+            _cache_backend = MemoryCacheBackend(maxsize=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS)
+        else:
+            raise ValueError(f"Unknown CACHE_BACKEND {CACHE_BACKEND!r}, expected 'memory' or 'redis'")
+        if not response_caching_enabled():
+            logger.warning(f"CACHE_BACKEND={CACHE_BACKEND} is per process but WEB_CONCURRENCY={WEB_CONCURRENCY}, "
+                           f"responses are sent without ETags or listing caching; use CACHE_BACKEND=redis")
+    return _cache_backend
+
+
+def response_caching_enabled() -> bool:
+    """
+    Whether responses may be cached and validated against version counters. A write bumps the counters of the
+    worker that handled it only, unless the backend is shared, so with several workers the others would keep
+    answering 304 and serving cached pages for data that changed.
+    """
+    return get_cache().shared or WEB_CONCURRENCY <= 1
+
+
+def set_cache(backend: Optional[CacheBackend]):
+    global _cache_backend
+    _cache_backend = backend
+
+
+def account_version_key(account_id: str) -> str:
+    return f"accounts:{account_id}:version"
+
+
+def user_version_key(user_id: str, listing: str) -> str:
+    return f"users:{user_id}:{listing}:version"
+
+
+async def bump_account_versions(*account_ids: Optional[str]):
+    """
+    Invalidates everything derived from the accounts' expenses. Inside a batch, waits until it commits.
+    """
+    if defer_until_commit(bump_account_versions, *account_ids):
+        return
+    for account_id in {account_id for account_id in account_ids if account_id}:
+        try:
+            await get_cache().bump_version(account_version_key(account_id))
+        except Exception as e:
+            logger.error(f"Failed to bump cache version for account {account_id}: {e}")
+
+
+async def bump_user_versions(user_id: str, *listings: str):
+    """
+    Invalidates the user's per-user listings ("accounts", "categories"). Inside a batch, waits until it commits.
+    """
+    if defer_until_commit(bump_user_versions, user_id, *listings):
+        return
+    for listing in set(listings):
+        try:
+            await get_cache().bump_version(user_version_key(user_id, listing))
+        except Exception as e:
+            logger.error(f"Failed to bump {listing} version for user {user_id}: {e}")
+
+
+def collect_cache_stats() -> list:
+    if _cache_backend is None:
+        return []
+
+    stats = _cache_backend.stats()
+    labels = {"backend": stats["backend"]}
+    families = [
+        ("devotion_response_cache_hits_total", "counter", "Cached listing pages served.", [(labels, stats["hits"])]),
+        ("devotion_response_cache_misses_total", "counter", "Listing pages not found in the cache.",
+         [(labels, stats["misses"])]),
+    ]
+    if "size" in stats:
+        families.append(("devotion_response_cache_entries", "gauge", "Listing pages currently cached.",
+                         [(labels, stats["size"])]))
+    return families
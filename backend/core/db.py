@@ -1,19 +1,187 @@
 import os
+import time
 import importlib
 import logging
-from sqlalchemy import create_engine
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Optional
+from fastapi import Depends
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession, AsyncTransaction, create_async_engine, \
+    async_sessionmaker
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
 
-from .settings import DATABASE_URL
+from .settings import DATABASE_URL, ASYNC_DATABASE_URL, READ_DATABASE_URL, READ_DATABASE_SYNCHRONOUS, \
+    DATABASE_PROFILES, DATABASE_PROFILE
 
 logger = logging.getLogger("db")
 
-engine = create_engine(DATABASE_URL)
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+
+def get_async_database_url(database_url: str) -> str:
+    """
+    Map a sync database URL onto its asyncio driver, e.g. sqlite:// -> sqlite+aiosqlite://.
+    URLs that already name a driver are returned unchanged.
+    """
+    url = make_url(database_url)
+    if "+" in url.drivername or url.drivername not in ASYNC_DRIVERS:
+        return database_url
+    return url.set(drivername=ASYNC_DRIVERS[url.drivername]).render_as_string(hide_password=False)
+
+
+def get_read_database_url(database_url: str) -> Optional[str]:
+    """
+    Returns a read-only URL for file-backed SQLite databases (opened as a file: URI with mode=ro),
+    or None when the backend has no such mode and a replica has to be configured explicitly.
+    """
+    url = make_url(database_url)
+    if url.get_backend_name() != "sqlite" or url.database in (None, "", ":memory:") or url.query.get("uri"):
+        return None
+    return url.set(database=f"file:{os.path.abspath(url.database)}",
+                   query={"mode": "ro", "uri": "true"}).render_as_string(hide_password=False)
+
+
+POOL_OPTIONS = ("pool_size", "max_overflow", "pool_timeout", "pool_recycle", "pool_pre_ping")
+
+
+class PoolMetrics:
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record(self, waited: float, timed_out: bool = False):
+        self.checkouts += 1
+        self.timeouts += timed_out
+        self.wait_seconds_total += waited
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+
+class TimedPoolMixin:
+    """
+    Measures how long each checkout waits for a pooled connection, including the time spent opening one.
+    """
+    metrics: PoolMetrics
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.metrics.record(time.perf_counter() - started, timed_out=True)
+            raise
+        self.metrics.record(time.perf_counter() - started)
+        return connection
+
+
+def _sqlite_pragma_listener(pragmas: dict):
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+    return set_sqlite_pragmas
+
+
+_engines: dict = {}
+
+
+def create_profiled_engine(name: str, url: str, profile: str = DATABASE_PROFILE, is_async: bool = False,
+                           read_only: bool = False):
+    """
+    Creates an engine configured from DATABASE_PROFILES and registers it for get_pool_stats().
+    Read-only engines skip journal_mode, which SQLite refuses to change without write access.
+    """
+    if profile not in DATABASE_PROFILES:
+        raise ValueError(f"Unknown DATABASE_PROFILE {profile!r}, expected one of {', '.join(DATABASE_PROFILES)}")
+
+    options = DATABASE_PROFILES[profile]
+    parsed_url = make_url(url)
+    is_sqlite = parsed_url.get_backend_name() == "sqlite"
+    metrics = PoolMetrics()
+    kwargs = {}
+
+    # In-memory SQLite databases live on a single connection, so they keep SQLAlchemy's own pool
+    if not (is_sqlite and parsed_url.database in (None, "", ":memory:")):
+        base_pool = AsyncAdaptedQueuePool if is_async else QueuePool
+        kwargs["poolclass"] = type(f"Timed{base_pool.__name__}", (TimedPoolMixin, base_pool),
+                                   {"metrics": metrics, "__module__": base_pool.__module__})
+        kwargs.update({key: options[key] for key in POOL_OPTIONS if key in options})
+
+    new_engine = (create_async_engine if is_async else create_engine)(url, **kwargs)
+
+    pragmas = options.get("sqlite_pragmas") or {}
+    if read_only:
+        pragmas = {key: value for key, value in pragmas.items() if key != "journal_mode"}
+    if is_sqlite and pragmas:
+        event.listen(new_engine.sync_engine if is_async else new_engine, "connect", _sqlite_pragma_listener(pragmas))
+
+    _engines[name] = (new_engine, metrics)
+    logger.debug(f"Created {name} engine with profile {profile!r}")
+    return new_engine
+
+
+def get_pool_stats() -> dict:
+    stats = {}
+    for name, (registered_engine, metrics) in _engines.items():
+        pool = registered_engine.pool
+        stats[name] = {
+            "pool": type(pool).__name__,
+            "size": pool.size() if hasattr(pool, "size") else None,
+            "checked_in": pool.checkedin() if hasattr(pool, "checkedin") else None,
+            "checked_out": pool.checkedout() if hasattr(pool, "checkedout") else None,
+            "overflow": pool.overflow() if hasattr(pool, "overflow") else None,
+            "checkouts": metrics.checkouts,
+            "timeouts": metrics.timeouts,
+            "wait_seconds_total": metrics.wait_seconds_total,
+            "wait_seconds_max": metrics.wait_seconds_max,
+        }
+    return stats
+
+
+engine = create_profiled_engine("primary", DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+async_engine = create_profiled_engine("async", ASYNC_DATABASE_URL or get_async_database_url(DATABASE_URL),
+                                      is_async=True)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+_read_database_url = (get_async_database_url(READ_DATABASE_URL) if READ_DATABASE_URL
+                      else get_read_database_url(get_async_database_url(DATABASE_URL)))
+read_engine = (create_profiled_engine("read", _read_database_url, is_async=True, read_only=True)
+               if _read_database_url else async_engine)
+AsyncReadSessionLocal = async_sessionmaker(bind=read_engine, autoflush=False, expire_on_commit=False)
+# The mode=ro connection reads the primary's own file, so only a separate replica can lag behind it
+read_engine_synchronous = not READ_DATABASE_URL or READ_DATABASE_SYNCHRONOUS
+
 Base = declarative_base()
 
 
+@event.listens_for(Base.metadata, "after_create")
+def _create_missing_indexes(target, connection, **kw):
+    """
+    create_all() only indexes the tables it creates, so indexes declared after a table already existed
+    are added here.
+    """
+    for table in target.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+
 def import_all_db_models():
     apps_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "apps")
     apps_dir = os.path.abspath(apps_dir)
@@ -27,9 +195,173 @@ def import_all_db_models():
                 logger.error(f"Failed to import models from {app_name}: {e}")
 
 
+def dialect_insert(db: AsyncSession):
+    """
+    The dialect's insert() construct, for ON CONFLICT clauses. PostgreSQL's, or SQLite's for everything else.
+    """
+    return postgresql.insert if db.bind.dialect.name == "postgresql" else sqlite.insert
+
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+class BatchTransaction:
+    """
+    One transaction shared by every session dependency resolved in the current task. The session joins it
+    through savepoints, so an endpoint's commit() and rollback() only cover its own work, and the
+    transaction itself is committed once by whoever opened it.
+    """
+
+    def __init__(self, connection: AsyncConnection, transaction: AsyncTransaction):
+        self.transaction = transaction
+        self.session = AsyncSession(bind=connection, autoflush=False, expire_on_commit=False,
+                                    join_transaction_mode="create_savepoint")
+        self.committed = False
+        self._after_commit: list = []
+
+    def after_commit(self, function, *args):
+        self._after_commit.append((function, args))
+
+    async def end_operation(self):
+        """
+        Discards whatever the last operation left uncommitted and forgets its objects, as closing its own
+        session would have.
+        """
+        if self.session.in_transaction():
+            await self.session.rollback()
+        self.session.expunge_all()
+
+    async def commit(self):
+        await self.transaction.commit()
+        self.committed = True
+        callbacks, self._after_commit = self._after_commit, []
+        for function, args in callbacks:
+            await function(*args)
+
+    async def rollback(self):
+        await self.transaction.rollback()
+        self._after_commit.clear()
+
+
+_batch: ContextVar[Optional[BatchTransaction]] = ContextVar("batch_transaction", default=None)
+
+
+def get_batch() -> Optional[BatchTransaction]:
+    return _batch.get()
+
+
+@asynccontextmanager
+async def batch_transaction():
+    """
+    Opens a BatchTransaction for the current task. It is rolled back on exit unless committed.
+    """
+    async with async_engine.connect() as connection:
+        transaction = await connection.begin()
+        if connection.dialect.name == "sqlite":
+            # pysqlite only opens a transaction before DML, so the first SAVEPOINT would open one instead,
+            # and releasing it would commit
+            await connection.exec_driver_sql("BEGIN")
+
+        batch = BatchTransaction(connection, transaction)
+        token = _batch.set(batch)
+        try:
+            yield batch
+        finally:
+            _batch.reset(token)
+            await batch.session.close()
+            if transaction.is_active:
+                await transaction.rollback()
+
+
+def defer_until_commit(function, *args) -> bool:
+    """
+    Inside an open batch, queues function(*args) to run once the batch commits and returns True.
+    For side effects that must not be seen before the data is, such as cache invalidation.
+    """
+    batch = _batch.get()
+    if batch is None or batch.committed:
+        return False
+    batch.after_commit(function, *args)
+    return True
+
+
+async def get_async_db():
+    batch = _batch.get()
+    if batch is not None:
+        yield batch.session
+        return
+
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+WRITE_MARKER = "has_written"
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_flush(session, flush_context):
+    session.info[WRITE_MARKER] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_dml(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info[WRITE_MARKER] = True
+
+
+class ReadRoutingSession:
+    """
+    Sends queries to the read-only session until the request's write session has flushed or executed
+    DML, then to the write session so the request reads its own writes.
+    """
+
+    def __init__(self, read_session: AsyncSession, write_session: AsyncSession):
+        self.read_session = read_session
+        self.write_session = write_session
+
+    @property
+    def target(self) -> AsyncSession:
+        if self.write_session.sync_session.info.get(WRITE_MARKER):
+            return self.write_session
+        return self.read_session
+
+    def __getattr__(self, name):
+        return getattr(self.target, name)
+
+
+@asynccontextmanager
+async def _read_session(write_db: AsyncSession):
+    if read_engine is async_engine or _batch.get() is not None:
+        yield write_db
+        return
+
+    async with AsyncReadSessionLocal() as read_db:
+        yield ReadRoutingSession(read_db, write_db)
+
+
+async def get_read_db(write_db: AsyncSession = Depends(get_async_db)):
+    """
+    Session for endpoints that only read. Shares the request's write session through FastAPI's
+    dependency cache, so a mutation earlier in the same request is visible to later reads.
+    """
+    async with _read_session(write_db) as db:
+        yield db
+
+
+async def get_versioned_read_db(write_db: AsyncSession = Depends(get_async_db)):
+    """
+    get_read_db for listings that are cached or given an ETag under a version counter. The counter is bumped
+    after the primary commits, so the rows must not be older than the primary's: a replica that may lag is
+    skipped in favour of the write session.
+    """
+    if not read_engine_synchronous:
+        yield write_db
+        return
+
+    async with _read_session(write_db) as db:
+        yield db
@@ -1,5 +1,13 @@
+import re
 import sys
+import json
+import time
+import queue
+import atexit
+import random
 import logging
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
 
 class ColorFormatter(logging.Formatter):
     LEVEL_COLORS = {
@@ -30,4 +38,135 @@ class BelowErrorFilter(logging.Filter):
 class EscapeNewlines(logging.Filter):
     def filter(self, rec: logging.LogRecord) -> bool:
         rec.msg = str(rec.msg).replace('\n', '\\n').replace('\r', '\\r')
-        return True
\ No newline at end of file
+        return True
+
+
+class RedactCredentials(logging.Filter):
+    """
+    Masks bearer tokens and credential query parameters, which uvicorn logs along with WebSocket requests.
+    """
+    PATTERN = re.compile(r'(?i)(bearer\s+|[?&](?:ticket|token|access_token)=)[^\s&"\']+')
+
+    def filter(self, rec: logging.LogRecord) -> bool:
+        message = rec.getMessage()
+        redacted = self.PATTERN.sub(r'\1[REDACTED]', message)
+        if redacted != message:
+            rec.msg, rec.args = redacted, None
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, self.datefmt),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+_request_sampled: ContextVar[bool] = ContextVar('log_request_sampled', default=True)
+
+
+class RequestSampler:
+    """
+    Decides per request whether its INFO and DEBUG lines are kept. Once more than `min_rps` requests
+    arrived in the last second, only `rate` of requests are sampled; below that everything is logged.
+    """
+
+    def __init__(self, rate: float, min_rps: float = 0):
+        self.rate = rate
+        self.min_rps = min_rps
+        self._second = 0
+        self._count = 0
+        self._previous_count = 0
+
+    def sample(self) -> bool:
+        if self.rate >= 1:
+            return True
+
+        second = int(time.monotonic())
+        if second != self._second:
+            self._previous_count = self._count if second == self._second + 1 else 0
+            self._second, self._count = second, 0
+        self._count += 1
+
+        if max(self._count, self._previous_count) <= self.min_rps:
+            return True
+        return random.random() < self.rate
+
+
+def sampling_middleware(sampler: RequestSampler):
+    async def log_sampling_middleware(request, call_next):
+        token = _request_sampled.set(sampler.sample())
+        try:
+            return await call_next(request)
+        finally:
+            _request_sampled.reset(token)
+
+    return log_sampling_middleware
+
+
+class RequestSampledFilter(logging.Filter):
+    def filter(self, rec: logging.LogRecord) -> bool:
+        if rec.levelno > logging.INFO:
+            return True
+        sampled = getattr(rec, 'sampled', None)
+        return _request_sampled.get() if sampled is None else sampled
+
+
+class BackgroundQueueHandler(QueueHandler):
+    """
+    Hands records to a QueueListener thread. Only the message is rendered here, so later changes to
+    its args can't alter it; formatting, filters and stream writes all happen on the listener thread.
+    """
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        record.sampled = _request_sampled.get()
+        return record
+
+
+_listeners: list[QueueListener] = []
+_replaced_handlers: list[tuple[logging.Logger, list[logging.Handler]]] = []
+
+
+def start_queue_logging() -> list[QueueListener]:
+    """
+    Moves the handlers configured by dictConfig behind queues: each logger keeps a single
+    BackgroundQueueHandler and one listener thread per distinct handler set does the actual output.
+    """
+    loggers = [logging.getLogger()] + [logger for logger in logging.Logger.manager.loggerDict.values()
+                                       if isinstance(logger, logging.Logger)]
+    queue_handlers = {}
+    for logger in loggers:
+        if not logger.handlers or any(isinstance(handler, QueueHandler) for handler in logger.handlers):
+            continue
+
+        key = tuple(logger.handlers)
+        if key not in queue_handlers:
+            log_queue = queue.SimpleQueue()
+            listener = QueueListener(log_queue, *key, respect_handler_level=True)
+            listener.start()
+            _listeners.append(listener)
+            queue_handlers[key] = BackgroundQueueHandler(log_queue)
+        _replaced_handlers.append((logger, logger.handlers))
+        logger.handlers = [queue_handlers[key]]
+
+    atexit.register(stop_queue_logging)
+    return list(_listeners)
+
+
+def stop_queue_logging():
+    """
+    Drains the queues and puts the original handlers back.
+    """
+    while _replaced_handlers:
+        logger, handlers = _replaced_handlers.pop()
+        logger.handlers = handlers
+    while _listeners:
+        _listeners.pop().stop()
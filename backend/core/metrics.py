@@ -0,0 +1,193 @@
+import time
+import logging
+import threading
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Iterable, Optional
+
+from fastapi import Request
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import event
+
+from .settings import DB_SLOW_QUERY_SECONDS
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    def __init__(self, buckets: Iterable[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> list[tuple[str, int]]:
+        total, samples = 0, []
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            samples.append(("+Inf" if bound == float("inf") else repr(float(bound)), total))
+        return samples
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class MetricsRegistry:
+    """
+    Request latency and per-request database accounting, rendered in the Prometheus text format.
+    Collectors are callables returning extra (name, type, help, [(labels, value)]) families, used for
+    stats that already live elsewhere such as the connection pools.
+    """
+
+    def __init__(self):
+        self.request_latency: dict[tuple, Histogram] = {}
+        self.request_queries: dict[tuple, Histogram] = {}
+        self.request_db_seconds: dict[tuple, float] = {}
+        self.slow_queries = 0
+        self.collectors: list[Callable[[], list]] = []
+        self._lock = threading.Lock()
+
+    def observe_request(self, method: str, route: str, status_code: int, seconds: float, stats: RequestStats):
+        with self._lock:
+            key = (method, route, str(status_code))
+            self.request_latency.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(seconds)
+            key = (method, route)
+            self.request_queries.setdefault(key, Histogram(QUERY_COUNT_BUCKETS)).observe(stats.queries)
+            self.request_db_seconds[key] = self.request_db_seconds.get(key, 0.0) + stats.db_seconds
+
+    def add_collector(self, collector: Callable[[], list]):
+        # create_app() may run more than once per process, and each run registers the same collectors
+        if collector not in self.collectors:
+            self.collectors.append(collector)
+
+    def _render_histograms(self, lines: list, name: str, help_text: str, label_names: tuple, histograms: dict):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        for label_values, histogram in sorted(histograms.items()):
+            for bound, count in histogram.cumulative():
+                bucket_labels = _labels(label_names, label_values, 'le="' + bound + '"')
+                lines.append(f"{name}_bucket{bucket_labels} {count}")
+            lines.append(f"{name}_sum{_labels(label_names, label_values)} {histogram.sum}")
+            lines.append(f"{name}_count{_labels(label_names, label_values)} {histogram.count}")
+
+    def render(self) -> str:
+        lines: list[str] = []
+        with self._lock:
+            self._render_histograms(lines, "devotion_http_request_duration_seconds", "Request latency by route.",
+                                    ("method", "route", "status"), self.request_latency)
+            self._render_histograms(lines, "devotion_db_queries_per_request", "SQL statements executed per request.",
+                                    ("method", "route"), self.request_queries)
+            lines.append("# HELP devotion_db_request_seconds_total Time spent executing SQL, by route.")
+            lines.append("# TYPE devotion_db_request_seconds_total counter")
+            for label_values, seconds in sorted(self.request_db_seconds.items()):
+                lines.append(f"devotion_db_request_seconds_total{_labels(('method', 'route'), label_values)} "
+                             f"{seconds}")
+            lines.append("# HELP devotion_db_slow_queries_total Statements slower than DB_SLOW_QUERY_SECONDS.")
+            lines.append("# TYPE devotion_db_slow_queries_total counter")
+            lines.append(f"devotion_db_slow_queries_total {self.slow_queries}")
+
+        for collector in self.collectors:
+            for name, metric_type, help_text, samples in collector():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in samples:
+                    label_names, label_values = tuple(labels), tuple(labels.values())
+                    lines.append(f"{name}{_labels(label_names, label_values)} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+def collect_pool_stats() -> list:
+    from .db import get_pool_stats
+
+    pools = get_pool_stats()
+    families = (
+        ("devotion_db_pool_checked_out", "gauge", "Connections currently checked out.", "checked_out"),
+        ("devotion_db_pool_checkouts_total", "counter", "Connection checkouts.", "checkouts"),
+        ("devotion_db_pool_timeouts_total", "counter", "Checkouts that timed out.", "timeouts"),
+        ("devotion_db_pool_wait_seconds_total", "counter", "Time spent waiting for a connection.",
+         "wait_seconds_total"),
+    )
+    return [(name, metric_type, help_text,
+             [({"engine": engine_name}, stats[key]) for engine_name, stats in pools.items()
+              if stats[key] is not None])
+            for name, metric_type, help_text, key in families]
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._query_started
+
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+
+    if elapsed >= DB_SLOW_QUERY_SECONDS:
+        metrics.slow_queries += 1
+        logger.warning(f"Slow query ({elapsed * 1000:.1f} ms): {' '.join(statement.split())[:500]}")
+
+
+def instrument_engine(engine):
+    """
+    Counts statements and database time against the current request, and logs slow statements.
+    Async engines are instrumented through their sync_engine.
+    """
+    target = getattr(engine, "sync_engine", engine)
+    if not event.contains(target, "before_cursor_execute", _before_cursor_execute):
+        event.listen(target, "before_cursor_execute", _before_cursor_execute)
+        event.listen(target, "after_cursor_execute", _after_cursor_execute)
+
+
+async def metrics_middleware(request: Request, call_next):
+    stats = RequestStats()
+    token = _request_stats.set(stats)
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        _request_stats.reset(token)
+        route = request.scope.get("route")
+        metrics.observe_request(request.method, getattr(route, "path", "<unmatched>"), status_code,
+                                time.perf_counter() - started, stats)
+
+
+async def metrics_endpoint() -> PlainTextResponse:
+    return PlainTextResponse(metrics.render(), media_type=PROMETHEUS_CONTENT_TYPE)
@@ -0,0 +1,90 @@
+import asyncio
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """
+    One subscriber's bounded queue of messages. get() returns None once the subscriber has been dropped
+    for falling behind, after which it receives nothing more.
+    """
+
+    def __init__(self, topic: str, queue_size: int):
+        self.topic = topic
+        self.dropped = False
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+    def _offer(self, message: str) -> bool:
+        try:
+            self._queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def _drop(self):
+        # Make room for the sentinel, the undelivered messages are lost anyway
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._queue.put_nowait(None)
+        self.dropped = True
+
+    async def get(self) -> Optional[str]:
+        return await self._queue.get()
+
+
+class PubSubHub:
+    """
+    In-process publish/subscribe by topic. publish() never waits: a subscriber whose queue of
+    `queue_size` messages is full is dropped instead of slowing down the publisher or the other
+    subscribers. Only subscribers in the same process are reached.
+    """
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self.published = 0
+        self.dropped = 0
+        self._subscribers: dict[str, set[Subscription]] = {}
+
+    def subscribe(self, topic: str) -> Subscription:
+        subscription = Subscription(topic, self.queue_size)
+        self._subscribers.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscribers.get(subscription.topic)
+        if subscribers is None:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self._subscribers[subscription.topic]
+
+    def has_subscribers(self, topic: str) -> bool:
+        return topic in self._subscribers
+
+    def publish(self, topic: str, message: str) -> int:
+        """
+        Queues message for every subscriber of topic and returns how many received it.
+        """
+        delivered = 0
+        for subscription in list(self._subscribers.get(topic, ())):
+            if subscription._offer(message):
+                delivered += 1
+                continue
+
+            logger.warning(f"Dropping slow subscriber to {topic} after {self.queue_size} undelivered messages")
+            subscription._drop()
+            self.unsubscribe(subscription)
+            self.dropped += 1
+
+        self.published += 1
+        return delivered
+
+    def stats(self) -> dict:
+        return {
+            "topics": len(self._subscribers),
+            "subscribers": sum(len(subscribers) for subscribers in self._subscribers.values()),
+            "published": self.published,
+            "dropped": self.dropped,
+        }
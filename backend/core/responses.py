@@ -0,0 +1,131 @@
+import hashlib
+import logging
+from decimal import Decimal
+from email.utils import formatdate
+from typing import Any, Iterable, Optional
+
+import orjson
+from fastapi import HTTPException, Query, Request, status
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
+
+from .cache import get_cache, response_caching_enabled, user_version_key
+
+logger = logging.getLogger(__name__)
+
+
+def _orjson_default(value: Any):
+    # Pydantic writes Decimals as strings in JSON mode, so the fast path does too
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_orjson_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class ORJSONResponse(JSONResponse):
+    """
+    JSON response encoded with orjson. Dates and datetimes are written natively, Decimals as strings.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def response_columns(model, schema: type[BaseModel], fields: Optional[Iterable[str]] = None) -> list:
+    """
+    The model's columns named like the schema's fields, for selecting rows that serialize as that schema.
+    With fields, only those columns are selected, still in schema order.
+    """
+    names = schema.model_fields if fields is None else [name for name in schema.model_fields if name in set(fields)]
+    return [getattr(model, name) for name in names]
+
+
+def rows_to_dicts(rows: Iterable, fields: Optional[Iterable[str]] = None) -> list[dict]:
+    """
+    Rows selected with response_columns(), as plain dicts. The rows are trusted as they come from the
+    database and are not validated against the schema. With fields, other selected columns are left out.
+    """
+    if fields is None:
+        return [row._asdict() for row in rows]
+    fields = tuple(fields)
+    return [{name: getattr(row, name) for name in fields} for row in rows]
+
+
+def sparse_fields(schema: type[BaseModel]):
+    """
+    Dependency reading a `fields=id,name` query parameter into the schema fields a list endpoint should
+    return, in schema order. Without the parameter every field is returned.
+    """
+    allowed = tuple(schema.model_fields)
+
+    def get_fields(fields: Optional[str] = Query(
+            None, description=f"Comma-separated subset of: {', '.join(allowed)}")) -> tuple[str, ...]:
+        if fields is None:
+            return allowed
+
+        requested = {name.strip() for name in fields.split(",") if name.strip()}
+        unknown = requested.difference(allowed)
+        if unknown or not requested:
+            problem = f"Unknown fields: {', '.join(sorted(unknown))}" if unknown else "No fields given"
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail=f"{problem}; expected a subset of {', '.join(allowed)}")
+        return tuple(name for name in allowed if name in requested)
+
+    return get_fields
+
+
+async def get_validators(version_keys: Iterable[str], variant: str = "") -> Optional[dict]:
+    """
+    ETag and Last-Modified headers for a response that only changes when one of the version counters is
+    bumped. variant tells apart representations of the same data (user, query, fields). Returns None when
+    the cache can't be reached or isn't shared by all workers, and the response is then sent without validators.
+    """
+    if not response_caching_enabled():
+        return None
+    cache = get_cache()
+    try:
+        epoch = await cache.get_epoch()
+        versions, modified = [], [epoch]
+        for key in version_keys:
+            versions.append(await cache.get_version(key))
+            modified.append(await cache.get_modified(key) or epoch)
+    except Exception as e:
+        logger.warning(f"Response validators unavailable: {e}")
+        return None
+
+    digest = hashlib.sha256(f"{epoch!r}|{versions}|{variant}".encode()).hexdigest()[:32]
+    return {
+        "ETag": f'W/"{digest}"',
+        "Last-Modified": formatdate(max(modified), usegmt=True),
+        "Cache-Control": "private, no-cache",
+    }
+
+
+async def get_user_listing_validators(user_id: str, listing: str, fields: Iterable[str] = ()) -> Optional[dict]:
+    """
+    Validators for a per-user listing ("accounts" or "categories"), which changes whenever
+    bump_user_versions() is called for it.
+    """
+    return await get_validators([user_version_key(user_id, listing)], variant=f"{user_id}|{','.join(fields)}")
+
+
+def is_not_modified(request: Request, validators: Optional[dict]) -> bool:
+    """
+    Whether If-None-Match names the current ETag (weak comparison, as RFC 9110 requires for GET).
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if validators is None or not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    current = validators["ETag"].removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == current for tag in if_none_match.split(","))
+
+
+def not_modified(validators: dict) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=validators)
@@ -1,10 +1,18 @@
 from environs import Env
 
-from .loggers import ColorFormatter
+from .loggers import ColorFormatter, JsonFormatter
 
 env = Env()
 env.read_env()
 
+# "text" or "json"
+LOG_FORMAT = env.str('LOG_FORMAT', 'text')
+# Format and write log records on a background thread instead of the event loop
+LOG_QUEUE_ENABLED = env.bool('LOG_QUEUE_ENABLED', True)
+# Share of requests whose INFO/DEBUG lines are kept once traffic exceeds LOG_SAMPLE_MIN_RPS
+LOG_INFO_SAMPLE_RATE = env.float('LOG_INFO_SAMPLE_RATE', 1.0)
+LOG_SAMPLE_MIN_RPS = env.float('LOG_SAMPLE_MIN_RPS', 0)
+
 LOGGING: dict = env.json('LOGGING', None) or {
     'version': 1,
     'disable_existing_loggers': False,
@@ -13,6 +21,9 @@ LOGGING: dict = env.json('LOGGING', None) or {
             '()': ColorFormatter,
             'format': '%(levelname)s: %(name)s | [%(asctime)s.%(msecs)03d] | %(message)s',
             'datefmt': '%Y-%m-%d %H:%M:%S'
+        },
+        'json': {
+            '()': JsonFormatter,
         }
     },
     'filters': {
@@ -21,22 +32,28 @@ LOGGING: dict = env.json('LOGGING', None) or {
         },
         'escapeNewlines': {
             '()': 'core.loggers.EscapeNewlines'
+        },
+        'redactCredentials': {
+            '()': 'core.loggers.RedactCredentials'
+        },
+        'requestSampled': {
+            '()': 'core.loggers.RequestSampledFilter'
         }
     },
     'handlers': {
         'stdout': {
             'level': 'DEBUG',
             'class': 'logging.StreamHandler',
-            'formatter': 'simple',
+            'formatter': 'json' if LOG_FORMAT == 'json' else 'simple',
             'stream': 'ext://sys.stdout',
-            'filters': ['belowError', 'escapeNewlines']
+            'filters': ['belowError', 'redactCredentials', 'escapeNewlines', 'requestSampled']
         },
         'stderr': {
             'level': 'ERROR',
             'class': 'logging.StreamHandler',
-            'formatter': 'simple',
+            'formatter': 'json' if LOG_FORMAT == 'json' else 'simple',
             'stream': 'ext://sys.stderr',
-            'filters': ['escapeNewlines'],
+            'filters': ['redactCredentials', 'escapeNewlines'],
         }
     },
     'loggers': {
@@ -55,6 +72,11 @@ LOGGING: dict = env.json('LOGGING', None) or {
             'level': 'DEBUG',
             'propagate': False
         },
+        'manage': {
+            'handlers': ['stdout', 'stderr'],
+            'level': 'DEBUG',
+            'propagate': False
+        },
         'uvicorn': {
             'handlers': ['stdout', 'stderr'],
             'level': 'DEBUG',
@@ -68,7 +90,70 @@ LOGGING: dict = env.json('LOGGING', None) or {
 }
 
 DATABASE_URL: str = env.str('DATABASE_URL', 'sqlite:///./devotion.db')
+ASYNC_DATABASE_URL: str = env.str('ASYNC_DATABASE_URL', None)
+# Replica used by read-only endpoints. File-backed SQLite defaults to a mode=ro connection on DATABASE_URL.
+READ_DATABASE_URL: str = env.str('READ_DATABASE_URL', None)
+# Whether READ_DATABASE_URL always has every committed write. Versioned listings (cached pages, ETags) read from
+# the primary otherwise, since a lagging replica would get an old page stored under the new version.
+READ_DATABASE_SYNCHRONOUS = env.bool('READ_DATABASE_SYNCHRONOUS', False)
 ENVIRONMENT = env.str('ENVIRONMENT', 'development')
+
+# Engine profiles: SQLite pragmas applied on every new connection plus pool sizing. "default" keeps the
+# SQLAlchemy/SQLite defaults (rollback journal, full fsync, no busy timeout).
+DATABASE_PROFILES: dict = env.json('DATABASE_PROFILES', None) or {
+    'default': {},
+    'development': {
+        'sqlite_pragmas': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'busy_timeout': 5000,
+        },
+        'pool_size': 5,
+        'max_overflow': 10,
+        'pool_timeout': 30,
+    },
+    'production': {
+        'sqlite_pragmas': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'mmap_size': 256 * 1024 * 1024,
+            'cache_size': -64 * 1024,
+            'busy_timeout': 5000,
+            'temp_store': 'MEMORY',
+        },
+        'pool_size': 10,
+        'max_overflow': 20,
+        'pool_timeout': 10,
+        'pool_recycle': 3600,
+        'pool_pre_ping': True,
+    },
+}
+DATABASE_PROFILE = env.str('DATABASE_PROFILE', 'production' if ENVIRONMENT == 'production' else 'development')
+DB_SLOW_QUERY_SECONDS = env.float('DB_SLOW_QUERY_SECONDS', 0.5)
 SECRET_KEY = env.str("AUTH_SECRET_KEY", "devotion_secret_key")
 ALGORITHM = env.str("AUTH_ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = env.int("AUTH_ACCESS_TOKEN_EXPIRE_MINUTES", 24 * 60 * 60)
+AUTH_PRINCIPAL_CACHE_SIZE = env.int("AUTH_PRINCIPAL_CACHE_SIZE", 1024)
+AUTH_PRINCIPAL_CACHE_TTL_SECONDS = env.float("AUTH_PRINCIPAL_CACHE_TTL_SECONDS", 60)
+AUTH_BCRYPT_ROUNDS = env.int("AUTH_BCRYPT_ROUNDS", 12)
+AUTH_HASH_EXECUTOR = env.str("AUTH_HASH_EXECUTOR", "thread")
+AUTH_HASH_WORKERS = env.int("AUTH_HASH_WORKERS", 4)
+AUTH_HASH_QUEUE_TIMEOUT_SECONDS = env.float("AUTH_HASH_QUEUE_TIMEOUT_SECONDS", 5)
+ACTIVITY_FLUSH_INTERVAL_SECONDS = env.float("ACTIVITY_FLUSH_INTERVAL_SECONDS", 30)
+EXPENSE_BULK_CHUNK_SIZE = env.int("EXPENSE_BULK_CHUNK_SIZE", 1000)
+EXPENSE_BULK_MAX_ROW_SIZE = env.int("EXPENSE_BULK_MAX_ROW_SIZE", 64 * 1024)
+EXPENSE_BULK_MAX_ERRORS = env.int("EXPENSE_BULK_MAX_ERRORS", 100)
+EXPENSE_EXPORT_BATCH_SIZE = env.int("EXPENSE_EXPORT_BATCH_SIZE", 1000)
+EXPENSE_ANALYTICS_MAX_DAYS = env.int("EXPENSE_ANALYTICS_MAX_DAYS", 3660)
+BATCH_MAX_OPERATIONS = env.int("BATCH_MAX_OPERATIONS", 100)
+DASHBOARD_EXPENSES_PER_ACCOUNT = env.int("DASHBOARD_EXPENSES_PER_ACCOUNT", 5)
+NOTIFY_QUEUE_SIZE = env.int("NOTIFY_QUEUE_SIZE", 100)
+NOTIFY_TICKET_TTL_SECONDS = env.int("NOTIFY_TICKET_TTL_SECONDS", 30)
+BALANCE_LOW_THRESHOLD = env.decimal("BALANCE_LOW_THRESHOLD", None)
+CACHE_BACKEND = env.str("CACHE_BACKEND", "memory")
+CACHE_URL = env.str("CACHE_URL", None)
+CACHE_TTL_SECONDS = env.float("CACHE_TTL_SECONDS", 300)
+CACHE_MAX_ENTRIES = env.int("CACHE_MAX_ENTRIES", 2048)
+# Worker processes serving the app; uvicorn and gunicorn default their worker count to the same variable
+WEB_CONCURRENCY = env.int("WEB_CONCURRENCY", 1)
+METRICS_ENABLED = env.bool("METRICS_ENABLED", True)
@@ -0,0 +1,60 @@
+import asyncio
+import logging
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerPoolBusy(Exception):
+    pass
+
+
+class BoundedExecutor:
+    """
+    Runs blocking callables on a thread or process pool without letting callers pile up behind it.
+    At most `max_workers` jobs are in flight; everyone else waits for a slot for up to
+    `queue_timeout` seconds and is then rejected with WorkerPoolBusy.
+    """
+
+    def __init__(self, name: str, kind: str = "thread", max_workers: int = 4, queue_timeout: float = 5.0):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown executor kind {kind!r}, expected 'thread' or 'process'")
+
+        self.name = name
+        self.kind = kind
+        self.max_workers = max_workers
+        self.queue_timeout = queue_timeout
+        self.rejected = 0
+        self._executor: Optional[Executor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+        return self._executor
+
+    async def run(self, fn: Callable[..., Any], *args) -> Any:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_workers)
+
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            logger.warning(f"{self.name} pool busy, rejected job after waiting {self.queue_timeout}s")
+            raise WorkerPoolBusy(f"{self.name} pool is busy")
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self._slots.release()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        self._slots = None
@@ -2,13 +2,20 @@ import sys
 import os
 import uvicorn
 import logging
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from core.db import import_all_db_models, Base, engine
-from core.settings import LOGGING, ENVIRONMENT
-from apps.user.utils import user_activity_middleware
+from core.db import import_all_db_models, Base, engine, async_engine, read_engine
+from core.cache import collect_cache_stats
+from core.metrics import metrics, metrics_middleware, metrics_endpoint, instrument_engine, collect_pool_stats
+from core.loggers import RequestSampler, sampling_middleware, start_queue_logging, stop_queue_logging
+from core.settings import LOGGING, ENVIRONMENT, METRICS_ENABLED, LOG_QUEUE_ENABLED, LOG_INFO_SAMPLE_RATE, \
+    LOG_SAMPLE_MIN_RPS
+from apps.user.utils import user_activity_middleware, password_executor, activity_buffer, \
+    collect_principal_cache_stats, collect_activity_stats
+from apps.notifications.utils import collect_notification_stats
 
 logging.config.dictConfig(LOGGING)
 
@@ -17,6 +24,20 @@ logger = logging.getLogger(__name__)
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if LOG_QUEUE_ENABLED:
+        start_queue_logging()
+    activity_buffer.start()
+    yield
+    await activity_buffer.stop()
+    password_executor.shutdown()
+    await async_engine.dispose()
+    if read_engine is not async_engine:
+        await read_engine.dispose()
+    stop_queue_logging()
+
+
 def create_app() -> FastAPI:
     origins = [
         "http://localhost:5173",
@@ -30,6 +51,9 @@ def create_app() -> FastAPI:
         "apps.accounts",
         "apps.categories",
         "apps.expenses",
+        "apps.batch",
+        "apps.dashboard",
+        "apps.notifications",
     ]
 
     api_app = FastAPI(
@@ -38,6 +62,20 @@ def create_app() -> FastAPI:
     )
     api_app.middleware("http")(user_activity_middleware)
 
+    if LOG_INFO_SAMPLE_RATE < 1:
+        api_app.middleware("http")(sampling_middleware(RequestSampler(LOG_INFO_SAMPLE_RATE, LOG_SAMPLE_MIN_RPS)))
+
+    if METRICS_ENABLED:
+        for instrumented_engine in (engine, async_engine, read_engine):
+            instrument_engine(instrumented_engine)
+        metrics.add_collector(collect_pool_stats)
+        metrics.add_collector(collect_principal_cache_stats)
+        metrics.add_collector(collect_activity_stats)
+        metrics.add_collector(collect_cache_stats)
+        metrics.add_collector(collect_notification_stats)
+        api_app.middleware("http")(metrics_middleware)
+        api_app.add_api_route("/metrics", metrics_endpoint, methods=["GET"], include_in_schema=False)
+
     for app_name in apps:
         try:
             module = __import__(f"{app_name}.router", fromlist=["router"])
@@ -46,7 +84,7 @@ def create_app() -> FastAPI:
         except ImportError as e:
             logger.error(f"Failed to import router for {app_name}: {e}")
 
-    fastapi_app = FastAPI()
+    fastapi_app = FastAPI(lifespan=lifespan)
 
     fastapi_app.add_middleware(
         CORSMiddleware,
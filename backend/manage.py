@@ -0,0 +1,114 @@
+import os
+import sys
+import asyncio
+import argparse
+import logging.config
+
+from sqlalchemy import select
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from core.db import AsyncSessionLocal, async_engine, import_all_db_models  # noqa: E402
+from core.settings import LOGGING  # noqa: E402
+
+logger = logging.getLogger("manage")
+
+
+async def bump_accounts(db, account_ids=None):
+    """
+    Invalidates cached responses derived from the accounts, or from every account when account_ids is None,
+    so API workers sharing the cache backend stop serving what the command just rewrote.
+    """
+    from core.cache import bump_account_versions, bump_user_versions
+    from apps.accounts.models import Account
+
+    query = select(Account.id, Account.user_id)
+    if account_ids is not None:
+        if not account_ids:
+            return
+        query = query.filter(Account.id.in_(account_ids))
+    rows = (await db.execute(query)).all()
+
+    await bump_account_versions(*(row.id for row in rows))
+    for user_id in {row.user_id for row in rows}:
+        await bump_user_versions(user_id, "accounts")
+
+
+async def rebuild_rollups_command(args):
+    from apps.expenses.utils import rebuild_rollups
+
+    async with AsyncSessionLocal() as db:
+        rows = await rebuild_rollups(db, args.account)
+        await db.commit()
+        await bump_accounts(db, [args.account] if args.account else None)
+    logger.info(f"Rebuilt {rows} expense rollups")
+
+
+async def reconcile_balances_command(args):
+    from apps.accounts.utils import reconcile_balances
+
+    async with AsyncSessionLocal() as db:
+        drifts, missing = await reconcile_balances(db, args.account, fix=args.fix)
+        await db.commit()
+        if args.fix:
+            await bump_accounts(db, [drift["account_id"] for drift in drifts])
+
+    for drift in drifts:
+        logger.warning(f"Account {drift['account_id']} balance {drift['balance']} expected {drift['expected']} "
+                       f"(drift {drift['drift']:+})")
+    if missing:
+        logger.warning(f"{len(missing)} accounts have no opening balance"
+                       f"{', adopted their current balance' if args.fix else ', run with --fix to adopt it'}")
+    logger.info(f"{len(drifts)} accounts drifted{', fixed' if args.fix and drifts else ''}")
+    return 1 if drifts and not args.fix else 0
+
+
+async def rebuild_search_index_command(args):
+    from apps.expenses.models import create_expense_search_index
+
+    async with async_engine.begin() as conn:
+        if not await conn.run_sync(create_expense_search_index, True):
+            logger.warning("Expense search index requires SQLite, searches use LIKE matching on this database")
+            return
+    async with AsyncSessionLocal() as db:
+        await bump_accounts(db)
+    logger.info("Rebuilt expense search index")
+
+
+COMMANDS = {
+    "rebuild-rollups": rebuild_rollups_command,
+    "reconcile-balances": reconcile_balances_command,
+    "rebuild-search-index": rebuild_search_index_command,
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="devotion maintenance commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    rebuild = subparsers.add_parser("rebuild-rollups", help="recompute expense rollups from the expenses table")
+    rebuild.add_argument("--account", help="only rebuild this account")
+
+    reconcile = subparsers.add_parser("reconcile-balances",
+                                      help="recompute balances from opening balances and expenses, report drift")
+    reconcile.add_argument("--account", help="only reconcile this account")
+    reconcile.add_argument("--fix", action="store_true",
+                           help="overwrite drifted balances and adopt missing opening balances")
+
+    subparsers.add_parser("rebuild-search-index", help="create the expense full-text index and reindex all expenses")
+
+    return parser.parse_args()
+
+
+async def main():
+    args = parse_args()
+    import_all_db_models()
+    try:
+        return await COMMANDS[args.command](args)
+    finally:
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.config.dictConfig(LOGGING)
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,56 @@
+import os
+import sys
+import tempfile
+import uuid
+
+import httpx
+import pytest
+
+# Point the engines at a scratch database before any app module is imported
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def client():
+    from main import app
+    from core.db import async_engine, read_engine
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test/api") as c:
+        yield c
+    # Each test runs on its own event loop, so pooled aiosqlite connections must not outlive it
+    await async_engine.dispose()
+    if read_engine is not async_engine:
+        await read_engine.dispose()
+
+
+@pytest.fixture
+async def user(client):
+    """
+    Registers and logs in a fresh user; returns its id, credentials and bearer headers.
+    """
+    email = f"{uuid.uuid4().hex}@example.com"
+    response = await client.post("/user/register", json={"username": email[:12], "email": email, "password": "pw"})
+    assert response.status_code in (200, 201), response.text
+    response = await client.post("/user/login", json={"email": email, "password": "pw"})
+    assert response.status_code == 200, response.text
+    body = response.json()
+    return {
+        "id": body["user_data"]["id"],
+        "email": email,
+        "password": "pw",
+        "headers": {"Authorization": f"Bearer {body['access_token']}"},
+    }
+
+
+@pytest.fixture
+async def account(client, user):
+    response = await client.post("/accounts/", headers=user["headers"],
+                                 json={"user_id": user["id"], "name": "Main", "balance": "1000.00"})
+    assert response.status_code == 201, response.text
+    return response.json()
@@ -0,0 +1,42 @@
+import asyncio
+from decimal import Decimal
+
+import pytest
+
+from apps.accounts.utils import adjust_account_balance, reconcile_balances
+from core.db import AsyncSessionLocal
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_concurrent_adjustments_lose_nothing(account):
+    deltas = [Decimal("-1.25")] * 40 + [Decimal("0.50")] * 20
+
+    async def adjust(delta: Decimal):
+        async with AsyncSessionLocal() as db:
+            balance = await adjust_account_balance(db, account["id"], delta)
+            await db.commit()
+            return balance
+
+    balances = await asyncio.gather(*(adjust(delta) for delta in deltas))
+
+    final = Decimal(account["balance"]) + sum(deltas)
+    # Whichever writer committed last saw every other update applied before its own
+    assert final in balances
+    async with AsyncSessionLocal() as db:
+        assert await adjust_account_balance(db, account["id"], Decimal("0")) == final
+
+
+async def test_concurrent_expenses_keep_the_balance_reconciled(client, user, account):
+    async def spend(i: int):
+        response = await client.post("/expenses/", headers=user["headers"], json={
+            "account_id": account["id"], "name": f"coffee {i}", "amount": "2.10", "timestamp": "2024-01-01"})
+        assert response.status_code == 201, response.text
+
+    await asyncio.gather(*(spend(i) for i in range(25)))
+
+    response = await client.get(f"/accounts/{account['id']}/balance", headers=user["headers"])
+    assert Decimal(response.json()["balance"]) == Decimal(account["balance"]) - Decimal("52.50")
+    async with AsyncSessionLocal() as db:
+        drifts, missing = await reconcile_balances(db, account["id"])
+    assert drifts == [] and missing == []
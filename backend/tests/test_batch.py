@@ -0,0 +1,68 @@
+import asyncio
+import json
+from decimal import Decimal
+
+import pytest
+
+from apps.notifications.utils import hub
+from tests.test_rollups import rollups
+
+pytestmark = pytest.mark.anyio
+
+
+async def next_message(subscription):
+    try:
+        return json.loads(await asyncio.wait_for(subscription.get(), timeout=0.1))
+    except asyncio.TimeoutError:
+        return None
+
+
+async def balance(client, user, account_id: str) -> Decimal:
+    response = await client.get(f"/accounts/{account_id}/balance", headers=user["headers"])
+    return Decimal(response.json()["balance"])
+
+
+def operations(account_id: str) -> list[dict]:
+    return [
+        {"method": "POST", "path": "/expenses/", "body": {
+            "account_id": account_id, "name": "rent", "amount": "400.00", "timestamp": "2024-05-01"}},
+        {"method": "POST", "path": "/expenses/", "body": {
+            "account_id": "missing", "name": "rent", "amount": "1.00", "timestamp": "2024-05-01"}},
+    ]
+
+
+async def test_failed_atomic_batch_rolls_back_balances_rollups_and_publishes(client, user, account):
+    subscription = hub.subscribe(user["id"])
+    listing = await client.get("/accounts/", headers=user["headers"])
+    try:
+        response = await client.post("/batch", headers=user["headers"],
+                                     json={"operations": operations(account["id"]), "atomic": True})
+
+        assert response.status_code == 200, response.text
+        body = response.json()
+        assert body["committed"] is False
+        assert [result["status"] for result in body["results"]] == [201, 404]
+        assert await balance(client, user, account["id"]) == Decimal(account["balance"])
+        assert rollups(account["id"]) == {}
+        # The first operation's notification and version bumps were deferred, then dropped with the batch
+        assert await next_message(subscription) is None
+        response = await client.get("/accounts/", headers={**user["headers"],
+                                                           "If-None-Match": listing.headers["ETag"]})
+        assert response.status_code == 304
+    finally:
+        hub.unsubscribe(subscription)
+
+
+async def test_non_atomic_batch_commits_the_operations_that_succeeded(client, user, account):
+    subscription = hub.subscribe(user["id"])
+    try:
+        response = await client.post("/batch", headers=user["headers"],
+                                     json={"operations": operations(account["id"]), "atomic": False})
+
+        assert response.json()["committed"] is True
+        assert await balance(client, user, account["id"]) == Decimal(account["balance"]) - Decimal("400.00")
+        assert rollups(account["id"]) == {("", "2024-05"): (Decimal("400.00"), 1)}
+        message = await next_message(subscription)
+        assert message["account_id"] == account["id"] and Decimal(message["delta"]) == Decimal("-400.00")
+    finally:
+        hub.unsubscribe(subscription)
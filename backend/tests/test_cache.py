@@ -0,0 +1,152 @@
+import asyncio
+import time
+from typing import Optional
+
+import pytest
+
+from core import cache
+from core.cache import CacheBackend, RedisCacheBackend, MemoryCacheBackend, collect_cache_stats, set_cache
+from core.responses import get_validators
+
+
+class FakeRedis:
+    """
+    The subset of redis.asyncio.Redis the cache uses. Like a client without decode_responses, every value
+    comes back as bytes whatever type it was stored as, or as str with decode_responses.
+    """
+
+    def __init__(self, decode_responses: bool = False):
+        self.decode_responses = decode_responses
+        self._data: dict[str, tuple[bytes, Optional[float]]] = {}
+
+    @staticmethod
+    def _encode(value) -> bytes:
+        return value if isinstance(value, bytes) else str(value).encode()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._data.get(key)
+        if entry is None or (entry[1] is not None and entry[1] <= time.monotonic()):
+            self._data.pop(key, None)
+            return None
+        return entry[0].decode() if self.decode_responses else entry[0]
+
+    async def set(self, key: str, value, px: Optional[int] = None, nx: bool = False) -> Optional[bool]:
+        if nx and await self.get(key) is not None:
+            return None
+        self._data[key] = (self._encode(value), time.monotonic() + px / 1000 if px is not None else None)
+        return True
+
+    async def incr(self, key: str) -> int:
+        value = int(await self.get(key) or 0) + 1
+        self._data[key] = (self._encode(value), self._data.get(key, (None, None))[1])
+        return value
+
+
+@pytest.fixture(params=[False, True], ids=["bytes", "decoded"])
+def backend(request):
+    backend = RedisCacheBackend(client=FakeRedis(decode_responses=request.param), prefix="test:")
+    set_cache(backend)
+    yield backend
+    set_cache(None)
+
+
+def test_cache_backend_is_abstract():
+    with pytest.raises(TypeError):
+        CacheBackend()
+
+
+def test_redis_payloads_are_returned_as_bytes(backend):
+    async def scenario():
+        assert await backend.get("page") is None
+        await backend.set("page", b'{"items": []}')
+        return await backend.get("page")
+
+    assert asyncio.run(scenario()) == b'{"items": []}'
+    assert backend.stats() == {"backend": "redis", "hits": 1, "misses": 1}
+
+
+def test_redis_payloads_expire(backend):
+    async def scenario():
+        await backend.set("page", b"{}", ttl=0.001)
+        await asyncio.sleep(0.01)
+        return await backend.get("page")
+
+    assert asyncio.run(scenario()) is None
+
+
+def test_redis_versions_are_ints_and_epoch_is_stable(backend):
+    async def scenario():
+        assert await backend.get_version("accounts:a1:version") == 0
+        assert await backend.get_modified("accounts:a1:version") is None
+        assert await backend.bump_version("accounts:a1:version") == 1
+        assert await backend.bump_version("accounts:a1:version") == 2
+        return (await backend.get_version("accounts:a1:version"), await backend.get_modified("accounts:a1:version"),
+                await backend.get_epoch(), await backend.get_epoch())
+
+    version, modified, epoch, epoch_again = asyncio.run(scenario())
+    assert version == 2
+    assert isinstance(modified, float) and modified <= time.time()
+    assert isinstance(epoch, float) and epoch == epoch_again
+
+
+def test_redis_validators_change_with_the_version(backend):
+    async def scenario():
+        before = await get_validators(["accounts:a1:version"], "u1")
+        unchanged = await get_validators(["accounts:a1:version"], "u1")
+        await backend.bump_version("accounts:a1:version")
+        after = await get_validators(["accounts:a1:version"], "u1")
+        return before, unchanged, after
+
+    before, unchanged, after = asyncio.run(scenario())
+    assert before is not None and before == unchanged
+    assert after["ETag"] != before["ETag"]
+
+
+def test_cache_stats_are_collected():
+    set_cache(MemoryCacheBackend(maxsize=10, ttl=60))
+    try:
+        families = {name: samples for name, _, _, samples in collect_cache_stats()}
+    finally:
+        set_cache(None)
+    assert families["devotion_response_cache_hits_total"] == [({"backend": "memory"}, 0)]
+    assert families["devotion_response_cache_entries"] == [({"backend": "memory"}, 0)]
+
+
+def test_per_process_cache_is_refused_with_several_workers(monkeypatch):
+    monkeypatch.setattr(cache, "WEB_CONCURRENCY", 2)
+    set_cache(MemoryCacheBackend(maxsize=10, ttl=60))
+    try:
+        assert asyncio.run(get_validators(["accounts:a1:version"], "u1")) is None
+        # A shared backend keeps validators whatever the worker count
+        set_cache(RedisCacheBackend(client=FakeRedis(), prefix="test:"))
+        assert asyncio.run(get_validators(["accounts:a1:version"], "u1")) is not None
+    finally:
+        set_cache(None)
+
+
+@pytest.mark.anyio
+async def test_matching_etag_is_not_modified_until_a_write(client, user, account):
+    async def listing(etag=None):
+        headers = {**user["headers"], **({"If-None-Match": etag} if etag else {})}
+        accounts = await client.get("/accounts/", headers=headers)
+        expenses = await client.request("GET", "/expenses/", headers=headers,
+                                        json={"filters": {"account_id": account["id"]}})
+        return accounts, expenses
+
+    accounts, expenses = await listing()
+    assert accounts.status_code == expenses.status_code == 200
+    accounts_etag, expenses_etag = accounts.headers["ETag"], expenses.headers["ETag"]
+
+    accounts, _ = await listing(accounts_etag)
+    _, expenses = await listing(expenses_etag)
+    assert accounts.status_code == expenses.status_code == 304
+
+    response = await client.post("/expenses/", headers=user["headers"], json={
+        "account_id": account["id"], "name": "coffee", "amount": "2.00", "timestamp": "2024-01-01"})
+    assert response.status_code == 201, response.text
+
+    accounts, _ = await listing(accounts_etag)
+    _, expenses = await listing(expenses_etag)
+    assert accounts.status_code == expenses.status_code == 200
+    assert accounts.headers["ETag"] != accounts_etag
+    assert expenses.headers["ETag"] != expenses_etag
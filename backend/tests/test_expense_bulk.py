@@ -0,0 +1,98 @@
+import asyncio
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+
+from apps.expenses import router, utils
+from apps.expenses.utils import BulkFormatError, EXPORT_COLUMNS, export_header, iter_bulk_rows, \
+    serialize_export_rows
+
+
+async def _chunks(body: bytes, size: int):
+    for offset in range(0, len(body), size):
+        yield body[offset:offset + size]
+
+
+def _import(body: bytes, chunk_size: int, body_format: str = "csv") -> list:
+    async def collect():
+        return [row async for _, row in iter_bulk_rows(_chunks(body, chunk_size), body_format)]
+    return asyncio.run(collect())
+
+
+EXPORTED = [
+    ("e1", "a1", None, "rent", Decimal("950.00"), 'line one\nline two, with "quotes"', date(2024, 2, 1),
+     datetime(2024, 2, 1, 9, 30), datetime(2024, 2, 1, 9, 30)),
+    ("e2", "a1", "c1", "coffee", Decimal("3.50"), "", date(2024, 2, 2),
+     datetime(2024, 2, 2, 8, 0), datetime(2024, 2, 2, 8, 0)),
+]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+def test_csv_export_round_trips_through_bulk_import(chunk_size):
+    body = (export_header("csv") + serialize_export_rows(EXPORTED, "csv")).encode()
+
+    rows = _import(body, chunk_size)
+
+    keys = [column.key for column in EXPORT_COLUMNS]
+    assert len(rows) == len(EXPORTED)
+    assert rows[0]["description"] == 'line one\nline two, with "quotes"'
+    assert rows[0]["name"] == "rent"
+    assert "category_id" not in rows[0]
+    assert rows[1] == {key: str(value) if not hasattr(value, "isoformat") else value.isoformat()
+                       for key, value in zip(keys, EXPORTED[1]) if value not in (None, "")}
+
+
+def test_csv_unterminated_quote_is_rejected():
+    with pytest.raises(BulkFormatError):
+        _import(b'name,description\nrent,"never closed\n', 4096)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 4096])
+def test_json_array_elements_split_across_chunks(chunk_size):
+    body = b'[{"name": "rent", "amount": "950.00"}, {"name": "coffee"} ,{"name": "tea"}]'
+
+    assert [row["name"] for row in _import(body, chunk_size, "json")] == ["rent", "coffee", "tea"]
+
+
+def test_json_malformed_element_fails_within_the_row_size_limit(monkeypatch):
+    monkeypatch.setattr(utils, "EXPENSE_BULK_MAX_ROW_SIZE", 64)
+    seen = []
+
+    async def chunks():
+        yield b'[{"name": "rent"}, {"name": oops'
+        for _ in range(1000):
+            seen.append(None)
+            yield b" " * 16
+
+    async def collect():
+        return [row async for _, row in iter_bulk_rows(chunks(), "json")]
+
+    with pytest.raises(BulkFormatError):
+        asyncio.run(collect())
+    # Gave up as soon as the pending element outgrew the limit instead of re-parsing the whole body
+    assert len(seen) < 10
+
+
+@pytest.mark.anyio
+async def test_bulk_reports_capped_errors_and_checks_categories(client, user, account, monkeypatch):
+    monkeypatch.setattr(router, "EXPENSE_BULK_MAX_ERRORS", 2)
+    response = await client.get("/categories/", headers=user["headers"])
+    category_id = response.json()[0]["id"]
+    row = {"account_id": account["id"], "name": "coffee", "amount": "2.00", "timestamp": "2024-01-01"}
+    rows = [
+        {**row, "category_id": category_id},
+        {**row, "category_id": "someone-elses"},
+        {**row, "account_id": "missing"},
+        {"name": "no amount"},
+        {"name": "no amount either"},
+    ]
+
+    response = await client.post("/expenses/bulk", headers=user["headers"], json=rows)
+
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["inserted"] == 1
+    assert body["failed"] == 4
+    assert [error["index"] for error in body["errors"]] == [1, 2]
+    assert body["errors"][0]["errors"] == ["category_id: Category not found or doesn't belong to user"]
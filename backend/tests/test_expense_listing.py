@@ -0,0 +1,79 @@
+import base64
+import json
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def seed_expenses(client, user, account_id: str, n: int) -> list[dict]:
+    # Three expenses a day, so pages have to break ties on id
+    rows = [{"account_id": account_id, "name": f"expense {i}", "amount": "1.00",
+             "timestamp": f"2024-01-{i // 3 + 1:02d}"} for i in range(n)]
+    response = await client.post("/expenses/bulk", headers=user["headers"], json=rows)
+    assert response.status_code == 200 and response.json()["inserted"] == n, response.text
+
+    response = await client.request("GET", "/expenses/", headers=user["headers"], json={
+        "per_page": n, "filters": {"account_id": account_id}})
+    return response.json()["items"]
+
+
+async def page(client, user, account_id: str, sort_order: str, cursor=None, per_page: int = 4):
+    response = await client.request("GET", "/expenses/", headers=user["headers"], json={
+        "per_page": per_page, "sort_order": sort_order, "cursor": cursor, "filters": {"account_id": account_id}})
+    return response
+
+
+@pytest.mark.parametrize("sort_order", ["desc", "asc"])
+async def test_cursors_walk_forward_and_back_over_every_expense(client, user, account, sort_order):
+    expenses = await seed_expenses(client, user, account["id"], 14)
+    expected = sorted(((expense["timestamp"], expense["id"]) for expense in expenses),
+                      reverse=sort_order == "desc")
+
+    pages, cursor = [], None
+    while True:
+        body = (await page(client, user, account["id"], sort_order, cursor)).json()
+        pages.append([(expense["timestamp"], expense["id"]) for expense in body["items"]])
+        assert (body["prev_cursor"] is None) == (len(pages) == 1)
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    assert [key for keys in pages for key in keys] == expected
+
+    # Walking back from the last page with prev cursors returns the same pages in reverse
+    cursor = body["prev_cursor"]
+    for expected_page in reversed(pages[:-1]):
+        body = (await page(client, user, account["id"], sort_order, cursor)).json()
+        assert [(expense["timestamp"], expense["id"]) for expense in body["items"]] == expected_page
+        cursor = body["prev_cursor"]
+    assert cursor is None
+
+
+def forge(payload) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+@pytest.mark.parametrize("cursor", [
+    "not a cursor",
+    forge(["2024-01-01", "e1", "next"]),
+    forge({"ts": "2024-13-01", "id": "e1", "dir": "next"}),
+    forge({"ts": "2024-01-01", "id": "e1"}),
+    forge({"ts": "2024-01-01", "id": "e1", "dir": "sideways"}),
+])
+async def test_tampered_cursors_are_rejected(client, user, account, cursor):
+    response = await page(client, user, account["id"], "desc", cursor)
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+
+async def test_forged_cursor_stays_within_the_account(client, user, account):
+    expenses = await seed_expenses(client, user, account["id"], 6)
+    response = await client.post("/accounts/", headers=user["headers"], json={"user_id": user["id"], "name": "Other"})
+    other = response.json()
+    await seed_expenses(client, user, other["id"], 6)
+
+    # A well-formed cursor is only a seek position; the account filter still applies
+    cursor = forge({"ts": "2099-01-01", "id": "zzz", "dir": "next"})
+    body = (await page(client, user, account["id"], "desc", cursor, per_page=50)).json()
+    assert sorted(expense["id"] for expense in body["items"]) == sorted(expense["id"] for expense in expenses)
@@ -0,0 +1,12 @@
+from core.metrics import metrics
+
+
+def test_creating_the_app_again_does_not_duplicate_collectors():
+    from main import create_app
+
+    create_app()
+    collectors = list(metrics.collectors)
+    create_app()
+
+    assert metrics.collectors == collectors
+    assert len(set(collectors)) == len(collectors)
@@ -0,0 +1,72 @@
+import pytest
+
+from apps.user import utils as user_utils
+from apps.user.schema import UserPrincipal
+from apps.user.utils import cache_principal, get_cached_principal, invalidate_user_principal, principal_cache
+
+pytestmark = pytest.mark.anyio
+
+
+def _cached(user: dict):
+    return get_cached_principal(user["headers"]["Authorization"].split()[1])
+
+
+async def test_update_me_drops_cached_principal(client, user):
+    response = await client.get("/user/me", headers=user["headers"])
+    assert response.json()["username"] == user["email"][:12]
+    assert _cached(user) is not None
+
+    response = await client.put("/user/me", headers=user["headers"], json={"username": "renamed"})
+    assert response.status_code == 200, response.text
+
+    response = await client.get("/user/me", headers=user["headers"])
+    assert response.json()["username"] == "renamed"
+
+
+async def test_password_change_drops_cached_principal(client, user):
+    await client.get("/user/me", headers=user["headers"])
+    assert _cached(user) is not None
+
+    response = await client.put("/user/me/password", headers=user["headers"],
+                                json={"current_password": user["password"], "new_password": "changed"})
+    assert response.status_code == 200, response.text
+    assert _cached(user) is None
+
+
+async def test_delete_me_drops_cached_principal(client, user):
+    await client.get("/user/me", headers=user["headers"])
+
+    response = await client.delete("/user/me", headers=user["headers"])
+    assert response.status_code == 200, response.text
+    assert _cached(user) is None
+
+    response = await client.get("/user/me", headers=user["headers"])
+    assert response.status_code == 401
+
+
+def _principal(user_id: str, username: str = "someone") -> UserPrincipal:
+    return UserPrincipal(id=user_id, username=username, email=f"{user_id}@example.com", role="user")
+
+
+def test_lookup_racing_an_invalidation_is_not_cached():
+    started_at = user_utils._principal_clock
+    # The user changes while the lookup is still reading the old row
+    invalidate_user_principal("racing-user")
+    cache_principal("racing-token", _principal("racing-user"), None, started_at)
+
+    assert get_cached_principal("racing-token") is None
+
+
+def test_entry_from_an_older_generation_is_ignored():
+    cache_principal("stale-token", _principal("stale-user"), None, user_utils._principal_clock)
+    assert get_cached_principal("stale-token") is not None
+
+    # An entry written under a generation that has since moved on is never served
+    principal_cache.set("stale-token", (_principal("stale-user", "old name"), -1))
+    assert get_cached_principal("stale-token") is None
+
+    started_at = user_utils._principal_clock
+    cache_principal("fresh-token", _principal("fresh-user"), None, started_at)
+    invalidate_user_principal("other-user")
+    cache_principal("fresh-token-2", _principal("fresh-user"), None, started_at)
+    assert get_cached_principal("fresh-token-2") is not None
@@ -0,0 +1,12 @@
+import pytest
+
+from benchmarks import query_plans
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_no_endpoint_plans_a_full_scan_or_temp_sort():
+    checks = await query_plans.run_checks(query_plans.parse_args(["--expenses", "2000", "--users", "2"]))
+
+    assert checks
+    assert [(check.endpoint, check.statement, check.problems) for check in checks if check.problems] == []
@@ -0,0 +1,88 @@
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import select
+
+from apps.expenses.models import ExpenseRollup
+from core.db import engine
+
+pytestmark = pytest.mark.anyio
+
+
+def rollups(account_id: str) -> dict:
+    """
+    The account's non-empty rollups as {(category_id, year_month): (total, count)}.
+    """
+    with engine.connect() as conn:
+        rows = conn.execute(select(ExpenseRollup.category_id, ExpenseRollup.year_month, ExpenseRollup.total,
+                                   ExpenseRollup.count).filter(ExpenseRollup.account_id == account_id,
+                                                               ExpenseRollup.count != 0))
+        return {(row[0], row[1]): (Decimal(row[2]), row[3]) for row in rows}
+
+
+async def add_account(client, user, name: str) -> dict:
+    response = await client.post("/accounts/", headers=user["headers"], json={"user_id": user["id"], "name": name})
+    assert response.status_code == 201, response.text
+    return response.json()
+
+
+async def add_expense(client, user, account_id: str, amount: str, timestamp: str, category_id=None) -> dict:
+    response = await client.post("/expenses/", headers=user["headers"], json={
+        "account_id": account_id, "name": "coffee", "amount": amount, "timestamp": timestamp,
+        "category_id": category_id})
+    assert response.status_code == 201, response.text
+    return response.json()
+
+
+async def first_category(client, user) -> str:
+    response = await client.get("/categories/", headers=user["headers"])
+    return response.json()[0]["id"]
+
+
+async def test_rollups_follow_add_update_and_delete(client, user, account):
+    category_id = await first_category(client, user)
+    other = await add_account(client, user, "Savings")
+
+    first = await add_expense(client, user, account["id"], "10.50", "2024-01-05", category_id)
+    await add_expense(client, user, account["id"], "4.50", "2024-01-20", category_id)
+    await add_expense(client, user, account["id"], "7.00", "2024-02-01")
+    assert rollups(account["id"]) == {
+        (category_id, "2024-01"): (Decimal("15.00"), 2),
+        ("", "2024-02"): (Decimal("7.00"), 1),
+    }
+
+    response = await client.put(f"/expenses/{first['id']}", headers=user["headers"], json={
+        "id": first["id"], "account_id": account["id"], "amount": "20.00", "timestamp": "2024-02-10"})
+    assert response.status_code == 200, response.text
+    assert rollups(account["id"]) == {
+        (category_id, "2024-01"): (Decimal("4.50"), 1),
+        (category_id, "2024-02"): (Decimal("20.00"), 1),
+        ("", "2024-02"): (Decimal("7.00"), 1),
+    }
+
+    # Moving the expense to another account moves its spend between the accounts' rollups
+    response = await client.put(f"/expenses/{first['id']}", headers=user["headers"], json={
+        "id": first["id"], "account_id": other["id"]})
+    assert response.status_code == 200, response.text
+    assert rollups(account["id"]) == {
+        (category_id, "2024-01"): (Decimal("4.50"), 1),
+        ("", "2024-02"): (Decimal("7.00"), 1),
+    }
+    assert rollups(other["id"]) == {(category_id, "2024-02"): (Decimal("20.00"), 1)}
+
+    response = await client.delete(f"/expenses/{first['id']}", headers=user["headers"])
+    assert response.status_code == 204, response.text
+    assert rollups(other["id"]) == {}
+
+
+async def test_deleting_category_uncategorizes_every_account(client, user, account):
+    category_id = await first_category(client, user)
+    other = await add_account(client, user, "Savings")
+    await add_expense(client, user, account["id"], "3.00", "2024-03-01", category_id)
+    await add_expense(client, user, other["id"], "5.00", "2024-03-02", category_id)
+
+    response = await client.delete(f"/categories/{category_id}", headers=user["headers"])
+    assert response.status_code == 204, response.text
+
+    assert rollups(account["id"]) == {("", "2024-03"): (Decimal("3.00"), 1)}
+    assert rollups(other["id"]) == {("", "2024-03"): (Decimal("5.00"), 1)}
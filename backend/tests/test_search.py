@@ -0,0 +1,48 @@
+import pytest
+
+from apps.expenses.models import create_expense_search_index
+from core.db import engine
+
+pytestmark = pytest.mark.anyio
+
+
+async def search(client, user, account_id: str, q: str) -> list:
+    response = await client.get("/expenses/search", headers=user["headers"], params={"account_id": account_id, "q": q})
+    assert response.status_code == 200, response.text
+    return [expense["name"] for expense in response.json()["items"]]
+
+
+async def test_search_survives_renumbered_expense_rowids(client, user, account):
+    ids = {}
+    for name in ("alpha", "bravo", "charlie", "delta"):
+        response = await client.post("/expenses/", headers=user["headers"], json={
+            "account_id": account["id"], "name": name, "amount": "1.00", "timestamp": "2024-01-01"})
+        assert response.status_code == 201, response.text
+        ids[name] = response.json()["id"]
+    for name in ("alpha", "bravo"):
+        response = await client.delete(f"/expenses/{ids[name]}", headers=user["headers"])
+        assert response.status_code == 204, response.text
+
+    # The expenses table has no INTEGER PRIMARY KEY, so VACUUM is free to renumber its rowids; do it explicitly,
+    # since whether VACUUM actually does depends on the SQLite build
+    with engine.begin() as conn:
+        conn.exec_driver_sql("UPDATE expenses SET rowid = rowid + 1000000")
+
+    assert await search(client, user, account["id"], "charlie") == ["charlie"]
+    assert await search(client, user, account["id"], "delta") == ["delta"]
+    assert await search(client, user, account["id"], "alpha") == []
+
+
+async def test_rebuild_replaces_a_legacy_rowid_keyed_index(client, user, account):
+    response = await client.post("/expenses/", headers=user["headers"], json={
+        "account_id": account["id"], "name": "legacy", "amount": "1.00", "timestamp": "2024-01-01"})
+    assert response.status_code == 201, response.text
+
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP TABLE expense_search_keys")
+        conn.exec_driver_sql("DROP TABLE expenses_fts")
+        conn.exec_driver_sql("CREATE VIRTUAL TABLE expenses_fts USING fts5(name, description, account_id, "
+                             "content='expenses', content_rowid='rowid')")
+        assert create_expense_search_index(conn)
+
+    assert await search(client, user, account["id"], "legacy") == ["legacy"]